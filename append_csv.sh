@@ -11,8 +11,8 @@ csv_line=`$script_dir/scrape_fto.py`
 
 # Exit early if there is no data from the server / scrape_fto script
 if [ -z "$csv_line" ]; then
-    echo "Could not get data from fto server"
-    exit
+    echo "Could not get data from fto server" >&2
+    exit 1
 fi
 
 # Output header if the file is initially non-existent
@@ -24,5 +24,6 @@ fi
 # Append new data to bottom of csv
 echo "$csv_line" >> $output_csv
 
-# Run truncation script for last 6 months
-$script_dir/truncate_csv.sh $output_csv ${output_csv%.csv}_6months.csv 6
+# Write the last 6 months to a separate csv
+PYTHONPATH="$script_dir${PYTHONPATH:+:$PYTHONPATH}" \
+    python -m fto window "$output_csv" "6m=${output_csv%.csv}_6months.csv"
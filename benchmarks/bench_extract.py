@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Benchmark extracting the scraped values from saved html fixtures.
+
+Compares the beautiful soup path against the targeted byte pattern
+extractor in fto.scrape_fto.
+"""
+
+import argparse
+import os
+import timeit
+
+from fto import scrape_fto
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "fixtures")
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this benchmark"""
+    vargs = parse_args()
+    for name, seconds in run(**vargs):
+        print("%-8s %10.1f us/scrape" % (name, seconds * 1e6))
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=200,
+                        help='scrapes per timing run')
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR,
+                        help='directory holding main.html and signup.html')
+    return vars(parser.parse_args())
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    # type: (str) -> Tuple[bytes, bytes]
+    """Read the main and signup page fixtures as raw bytes."""
+    with open(os.path.join(fixture_dir, "main.html"), "rb") as main_fh:
+        main_content = main_fh.read()
+    with open(os.path.join(fixture_dir, "signup.html"), "rb") as signup_fh:
+        signup_content = signup_fh.read()
+    return main_content, signup_content
+
+
+def extract_soup(main_content, signup_content):
+    # type: (bytes, bytes) -> Tuple[str, str, str]
+    """Extract the values by building full soup trees."""
+    main_soup = scrape_fto.parse_soup(main_content)
+    signup_soup = scrape_fto.parse_soup(signup_content)
+    return (scrape_fto.get_population(main_soup),
+            scrape_fto.get_birth_queue_size(signup_soup),
+            scrape_fto.get_pregnant_mothers(signup_soup))
+
+
+def extract_fast(main_content, signup_content):
+    # type: (bytes, bytes) -> Tuple[str, str, str]
+    """Extract the values with the targeted byte patterns."""
+    return ((scrape_fto.extract_population(main_content),) +
+            scrape_fto.extract_signup_values(signup_content))
+
+
+def run(number=200, fixture_dir=FIXTURE_DIR):
+    # type: (int, str) -> List[Tuple[str, float]]
+    """Time both extraction paths over the fixtures.
+
+    Returns:
+        A list of (name, best seconds per scrape) tuples.
+
+    Raises:
+        AssertionError if the two paths disagree on the extracted values.
+    """
+    contents = load_fixtures(fixture_dir)
+    assert extract_soup(*contents) == extract_fast(*contents)
+    results = []
+    for name, func in (("soup", extract_soup), ("fast", extract_fast)):
+        timings = timeit.repeat(lambda: func(*contents),  # pylint: disable=cell-var-from-loop
+                                number=number, repeat=5)
+        results.append((name, min(timings) / number))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Benchmark the cold start import time of the scraper.
+
+Each import runs in a fresh interpreter. The scraper import is compared
+against importing the plotting module, which is what importing the
+package used to cost before submodules were loaded lazily.
+"""
+
+import argparse
+import subprocess
+import sys
+import timeit
+
+
+STATEMENTS = (
+    ("scraper", "import fto.scrape_fto"),
+    ("graph", "import fto.fto_graph"),
+)
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this benchmark"""
+    vargs = parse_args()
+    max_ratio = vargs.pop('max_ratio')
+    results = run(**vargs)
+    for name, seconds in results:
+        print("%-8s %8.1f ms" % (name, seconds * 1e3))
+    ratio = results[0][1] / results[1][1]
+    print("ratio    %8.2f" % ratio)
+    if max_ratio is not None and ratio > max_ratio:
+        print("scraper cold start exceeds %.2f of graph import" % max_ratio)
+        sys.exit(1)
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='interpreter launches per statement')
+    parser.add_argument('--max-ratio', type=float, default=None,
+                        help='fail if scraper/graph import time is larger')
+    return vars(parser.parse_args())
+
+
+def time_import(statement, repeat=5):
+    # type: (str, int) -> float
+    """Best wall time of running `statement` in a new interpreter."""
+    command = [sys.executable, "-c", statement]
+    timings = timeit.repeat(lambda: subprocess.check_call(command),
+                            number=1, repeat=repeat)
+    return min(timings)
+
+
+def run(repeat=5):
+    # type: (int) -> List[Tuple[str, float]]
+    """Time each import statement in `STATEMENTS`.
+
+    Returns:
+        A list of (name, best seconds) tuples. The interpreter startup
+        time is subtracted from each.
+    """
+    baseline = time_import("pass", repeat)
+    return [(name, time_import(statement, repeat) - baseline)
+            for name, statement in STATEMENTS]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Benchmark loading a synthetic 10 year hourly fto csv.
+
+Compares the generic pandas parser (read_csv_frame + adjust_from_csv)
+against the vectorized parser in fto.ingest, reporting the best wall
+time, the peak memory traced by python and the peak resident memory of
+a fresh process loading the file (linux only). The pandas C parser
+allocates outside of tracemalloc, so only the resident memory compares
+the two fairly.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from fto import fto_graph
+from fto import ingest
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this benchmark"""
+    vargs = parse_args()
+    for name, seconds, peak, rss in run(**vargs):
+        print("%-8s %8.1f ms %8.1f MiB traced %8s MiB rss" % (
+            name, seconds * 1e3, peak / float(1 << 20),
+            "n/a" if rss is None else "%.1f" % (rss / float(1 << 20))))
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10,
+                        help='years of hourly samples to generate')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timing runs per parser')
+    return vars(parser.parse_args())
+
+
+def write_synthetic_csv(path, years=10, seed=0):
+    # type: (str, int, int) -> int
+    """Write `years` of hourly samples to `path`. Returns the row count."""
+    rng = np.random.RandomState(seed)
+    rows = years * 365 * 24
+    start = int(time.mktime((2016, 2, 15, 0, 0, 0, 0, 0, 0)))
+    population = 300 + np.cumsum(rng.randint(-1, 2, rows)).clip(-250, 5000)
+    birth_queue = 150 + np.cumsum(rng.randint(-1, 2, rows)).clip(-140, 5000)
+    mothers = rng.randint(1, 6, rows)
+    with open(path, "w") as csv_fh:
+        csv_fh.write("Date,Population,Birth Queue,Pregnant Mothers\n")
+        for row in range(rows):
+            csv_fh.write("%s,%d,%d,%d\n" % (
+                time.strftime("%m/%d/%y-%H", time.gmtime(start + 3600 * row)),
+                population[row], birth_queue[row], mothers[row]))
+    return rows
+
+
+def load_pandas(path):
+    # type: (str) -> Any
+    """Load through the generic pandas path."""
+    return fto_graph.adjust_from_csv(fto_graph.read_csv_frame(path))
+
+
+def load_ingest(path):
+    # type: (str) -> Any
+    """Load through the vectorized path."""
+    return fto_graph.adjust_pregnant_mothers(ingest.read_csv(path))
+
+
+def peak_memory(func, *args):
+    # type: (Callable, *Any) -> int
+    """Return the peak traced allocation in bytes while calling func."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss(name, path):
+    # type: (str, str) -> Optional[int]
+    """Return the peak resident bytes a new process needs to load `path`.
+
+    The peak is reset after the imports through /proc/self/clear_refs, so
+    this is only supported on linux. Returns None elsewhere.
+    """
+    if not os.path.exists("/proc/self/clear_refs"):
+        return None
+    script = (
+        "import sys\n"
+        "sys.path[:0] = %r\n"
+        "import bench_ingest\n"
+        "def status(key):\n"
+        "    for line in open('/proc/self/status'):\n"
+        "        if line.startswith(key):\n"
+        "            return int(line.split()[1]) * 1024\n"
+        "with open('/proc/self/clear_refs', 'w') as refs_fh:\n"
+        "    refs_fh.write('5')\n"
+        "before = status('VmRSS:')\n"
+        "bench_ingest.load_%s(%r)\n"
+        "print(status('VmHWM:') - before)\n" % (sys.path, name, path))
+    return int(subprocess.check_output(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(years=10, repeat=3):
+    # type: (int, int) -> List[Tuple[str, float, int, int]]
+    """Time both parsers on a synthetic csv.
+
+    Returns:
+        A list of (name, best seconds, peak traced bytes, peak resident
+        bytes) tuples.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "fto-stats.csv")
+        write_synthetic_csv(path, years)
+        assert (load_pandas(path).values == load_ingest(path).values).all()
+        results = []
+        for name, func in (("pandas", load_pandas), ("ingest", load_ingest)):
+            seconds = min(timeit.repeat(lambda: func(path),  # pylint: disable=cell-var-from-loop
+                                        number=1, repeat=repeat))
+            results.append((name, seconds, peak_memory(func, path),
+                            peak_rss(name, path)))
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
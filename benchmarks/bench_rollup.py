@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Benchmark rolling up synthetic fto samples into periods.
+
+Compares the previous approach of `fto.stats`, which grouped each of the
+births, deaths and pregnancies deltas separately, concatenated them and
+formatted the labels row by row, against the single resample and bulk
+label formatting of `stats.rollup`. Both are timed on hourly and on
+minute samples, for daily, weekly and monthly periods.
+"""
+
+import argparse
+import timeit
+
+# pylint: disable=unused-import
+from typing import Any, List, Tuple  # NOQA
+import numpy as np
+import pandas as pd
+
+from fto import stats
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this benchmark"""
+    vargs = parse_args()
+    for density, rows, freq, before, after in run(**vargs):
+        print("%-6s %8d rows %-3s %9.1f ms per delta %9.1f ms rollup "
+              "%6.1fx" % (density, rows, freq, before * 1e3, after * 1e3,
+                          before / after))
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=float, default=10,
+                        help='years of hourly samples to generate')
+    parser.add_argument('--minute-years', type=float, default=1,
+                        help='years of minute samples to generate')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timing runs per approach')
+    return vars(parser.parse_args())
+
+
+def synthetic_frame(rows, step, seed=0):
+    # type: (int, str, int) -> pd.DataFrame
+    """Return `rows` random walk samples `step` apart, like fto data."""
+    rng = np.random.RandomState(seed)
+    index = pd.date_range("2016-02-15", periods=rows, freq=step, name="Date")
+    return pd.DataFrame({
+        "Population": 300 + np.cumsum(rng.randint(-1, 2, rows)).clip(-250),
+        "Birth Queue": 150 + np.cumsum(rng.randint(-1, 2, rows)).clip(-140),
+        "Pregnant Mothers": rng.randint(1, 6, rows),
+    }, index=index)
+
+
+def rollup_per_delta(fto_df, freq):
+    # type: (pd.DataFrame, str) -> pd.DataFrame
+    """Roll up as fto.stats used to: one groupby per delta and row-wise
+    labels."""
+    label_format = stats.rollup_label_format(freq)
+    population_delta = stats.create_delta(fto_df["Population"])
+    mother_delta = stats.create_delta(fto_df["Pregnant Mothers"])
+    deltas = (
+        (population_delta[population_delta > 0], "Births"),
+        (population_delta[population_delta < 0].abs(), "Deaths"),
+        (mother_delta[mother_delta > 0], "Pregnancies"),
+    )
+    rolled = []
+    for delta, name in deltas:
+        per_period = delta.groupby(pd.Grouper(freq=freq)).sum().iloc[1:]
+        per_period.index = per_period.index.to_series().apply(
+            lambda date: date.strftime(label_format))
+        per_period.name = name
+        rolled.append(per_period)
+    return pd.concat(rolled, axis=1)
+
+
+def run(years=10, minute_years=1, repeat=3):
+    # type: (float, float, int) -> List[Tuple[str, int, str, float, float]]
+    """Time both approaches.
+
+    Returns:
+        A list of (sampling, rows, frequency, best seconds per delta, best
+        seconds with rollup) tuples.
+    """
+    frames = (
+        ("hourly", synthetic_frame(int(years * 365 * 24), "h")),
+        ("minute", synthetic_frame(int(minute_years * 365 * 24 * 60), "min")),
+    )
+    results = []
+    for density, fto_df in frames:
+        for freq in ("D", "W", "MS"):
+            timings = [
+                min(timeit.repeat(lambda: func(fto_df, freq),  # pylint: disable=cell-var-from-loop
+                                  number=1, repeat=repeat))
+                for func in (rollup_per_delta, stats.rollup)]
+            results.append((density, len(fto_df), freq) + tuple(timings))
+    return results
+
+
+if __name__ == "__main__":
+    main()
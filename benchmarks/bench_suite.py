@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+"""Time the hot paths of fto on synthetic datasets and record the results.
+
+Each case runs on synthetic csvs (see synthetic.py) of every requested
+span and granularity, and reports the best wall time of several runs and
+the peak memory traced by python during one more run. Results are written
+as json, and a previous result file can be given to report the cases
+which became slower:
+
+    PYTHONPATH=. python benchmarks/bench_suite.py --spans 1m 1y 10y \
+        --output results.json
+    PYTHONPATH=. python benchmarks/bench_suite.py --spans 1m 1y 10y \
+        --compare results.json
+
+Cases whose dependencies are missing, such as bokeh for fto_web, are
+recorded as skipped. truncate_csv.sh runs in bash, so its memory is the
+peak resident memory of its processes instead, and it only runs on
+hourly data since it reads a line per loop in bash.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+# pylint: disable=unused-import
+from typing import Any, Callable, Dict, List, Optional, Tuple  # NOQA
+import numpy as np
+import pandas as pd
+
+import synthetic
+from fto import fto_graph
+from fto import scrape_fto
+from fto import stats
+
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRUNCATE_SCRIPT = os.path.join(REPOSITORY, "truncate_csv.sh")
+
+# Results format, change when the meaning of a field changes
+RESULTS_VERSION = 1
+
+# Slowdown over the compared results reported as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Cases which are only run on hourly datasets
+HOURLY_ONLY = ("truncate_csv.sh",)
+
+
+class Skip(Exception):
+    """A case cannot run here"""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this benchmark"""
+    vargs = parse_args()
+    output, compare = vargs.pop('output'), vargs.pop('compare')
+    tolerance = vargs.pop('tolerance')
+    results = run(**vargs)
+    for result in results['results']:
+        print(format_result(result))
+    if output is not None:
+        with open(output, "w") as output_fh:
+            json.dump(results, output_fh, indent=2, sort_keys=True)
+    if compare is not None:
+        with open(compare) as compare_fh:
+            regressions = compare_results(json.load(compare_fh), results,
+                                          tolerance)
+        for name, dataset, before, after in regressions:
+            print("slower: %s on %s %.1f ms -> %.1f ms" % (
+                name, dataset, before * 1e3, after * 1e3))
+        if regressions:
+            sys.exit(1)
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--spans', nargs='+', type=synthetic.parse_span,
+        default=['1m', '1y', '10y'],
+        help='lengths of history to generate. Default: 1m 1y 10y')
+    parser.add_argument(
+        '--granularities', nargs='+', choices=sorted(synthetic.GRANULARITIES),
+        default=['hour'], help='time between samples. Default: hour')
+    parser.add_argument(
+        '--cases', nargs='+', choices=sorted(CASES), default=None,
+        help='cases to run. Default: all')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timing runs per case')
+    parser.add_argument('--output', default=None,
+                        help='json file to write the results to')
+    parser.add_argument('--compare', default=None,
+                        help='json results to compare with. Exits with 1 '
+                             'if a case became slower')
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='relative slowdown reported by --compare. Default: %g'
+             % DEFAULT_TOLERANCE)
+    return vars(parser.parse_args())
+
+
+def run(spans=('1m', '1y', '10y'),  # type: Tuple[str, ...]
+        granularities=('hour',),    # type: Tuple[str, ...]
+        cases=None,                 # type: Optional[List[str]]
+        repeat=3                    # type: int
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> Dict[str, Any]
+    """Run `cases` on a dataset of each span and granularity.
+
+    Returns:
+        The results as a json serializable dict, with the environment
+        under "environment" and one dict per case and dataset under
+        "results".
+    """
+    if cases is None:
+        cases = sorted(CASES)
+    temp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        synthetic.write_pages(temp_dir, 316, 146, 2)
+        for granularity in granularities:
+            for span in spans:
+                name = synthetic.dataset_name(span, granularity)
+                path = os.path.join(temp_dir, name + ".csv")
+                rows = synthetic.write_csv(path, span, granularity)
+                dataset = Dataset(name, path, rows, granularity, temp_dir)
+                for case in cases:
+                    results.append(run_case(case, dataset, repeat))
+    finally:
+        shutil.rmtree(temp_dir)
+    return {
+        'version': RESULTS_VERSION,
+        'environment': environment(),
+        'results': results,
+    }
+
+
+class Dataset(object):
+    """A synthetic csv and the page fixtures next to it."""
+    # pylint: disable=too-many-arguments,too-few-public-methods
+    def __init__(self, name, path, rows, granularity, fixture_dir):
+        # type: (str, str, int, str, str) -> None
+        self.name = name
+        self.path = path
+        self.rows = rows
+        self.granularity = granularity
+        self.fixture_dir = fixture_dir
+        self._frame = None  # type: Optional[pd.DataFrame]
+
+    @property
+    def frame(self):
+        # type: () -> pd.DataFrame
+        """The loaded csv, loaded once."""
+        if self._frame is None:
+            self._frame = fto_graph.load_dataframe(self.path)
+        return self._frame
+
+
+def run_case(case, dataset, repeat=3):
+    # type: (str, Dataset, int) -> Dict[str, Any]
+    """Time `case` on `dataset` and measure its peak memory."""
+    result = {
+        'case': case,
+        'dataset': dataset.name,
+        'rows': dataset.rows,
+        'seconds': None,
+        'peak_bytes': None,
+        'skipped': None,
+    }  # type: Dict[str, Any]
+    try:
+        if case in HOURLY_ONLY and dataset.granularity != 'hour':
+            raise Skip("only run on hourly data")
+        func = CASES[case](dataset)
+        result['seconds'] = min(timeit.repeat(func, number=1, repeat=repeat))
+        result['peak_bytes'] = getattr(func, 'peak_bytes', None)
+        if result['peak_bytes'] is None:
+            result['peak_bytes'] = peak_memory(func)
+    except Skip as e:
+        result['skipped'] = str(e)
+    return result
+
+
+def peak_memory(func):
+    # type: (Callable[[], Any]) -> int
+    """Return the peak traced allocation in bytes while calling func."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def case_scrape(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Extract the values from the page fixtures, as each sample does."""
+    pages = []
+    for name in ("main.html", "signup.html"):
+        with open(os.path.join(dataset.fixture_dir, name), "rb") as page_fh:
+            pages.append(page_fh.read())
+
+    def scrape():
+        # type: () -> Tuple[str, ...]
+        """Extract the population, birth queue and pregnant mothers."""
+        return ((scrape_fto.extract_population(pages[0]),) +
+                scrape_fto.extract_signup_values(pages[1]))
+    return scrape
+
+
+def case_load_dataframe(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Load the csv."""
+    return lambda: fto_graph.load_dataframe(dataset.path)
+
+
+def case_generate_figure(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Build the png graph and render it to memory."""
+    fto_df = dataset.frame
+
+    def render():
+        # type: () -> None
+        """Build and save the figure."""
+        figure = fto_graph.generate_figure(fto_df)
+        try:
+            figure.savefig(io.BytesIO(), format="png")
+        finally:
+            fto_graph.plt.close(figure)
+    return render
+
+
+def case_fto_web(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Build the bokeh layout and serialize it as fto_web's html would."""
+    try:
+        from fto import fto_web
+    except ImportError as e:
+        raise Skip("fto_web cannot be imported: %s" % e)
+    fto_df = dataset.frame
+
+    def layout():
+        # type: () -> str
+        """Build and serialize the layout."""
+        import bokeh.embed
+        return bokeh.embed.json_item(fto_web.run(fto_df.copy()))
+    return layout
+
+
+def case_stats(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Compute the monthly statistics and the summary records."""
+    fto_df = dataset.frame
+
+    def summarize():
+        # type: () -> Tuple[Any, Any]
+        """Compute the statistics without a saved state."""
+        return (stats.generate_monthly_dataframe(fto_df),
+                stats.average_stats(fto_df))
+    return summarize
+
+
+def case_truncate_csv(dataset):
+    # type: (Dataset) -> Callable[[], Any]
+    """Write the last 6 months with truncate_csv.sh."""
+    if shutil.which("bash") is None or shutil.which("tac") is None:
+        raise Skip("bash and tac are needed")
+    output = dataset.path + ".6months.csv"
+
+    command = ["bash", TRUNCATE_SCRIPT, dataset.path, output, "6"]
+
+    def truncate():
+        # type: () -> None
+        """Run the script."""
+        subprocess.check_call(command)
+    truncate.peak_bytes = child_peak_rss(command)  # type: ignore
+    return truncate
+
+
+def child_peak_rss(command):
+    # type: (List[str]) -> Optional[int]
+    """Return the peak resident bytes of the processes of `command`.
+
+    The command is started from a small python process, since children
+    forked from this one would count its memory too.
+    """
+    script = (
+        "import resource, subprocess, sys\n"
+        "subprocess.check_call(%r)\n"
+        "print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)\n"
+        % (command,))
+    peak = int(subprocess.check_output([sys.executable, "-S", "-c", script]))
+    # ru_maxrss is in KiB on linux and in bytes on macos
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Case name -> function of a Dataset returning what to time, or raising Skip
+CASES = {
+    'scrape': case_scrape,
+    'load_dataframe': case_load_dataframe,
+    'generate_figure': case_generate_figure,
+    'fto_web': case_fto_web,
+    'stats': case_stats,
+    'truncate_csv.sh': case_truncate_csv,
+}  # type: Dict[str, Callable[[Dataset], Callable[[], Any]]]
+
+
+def environment():
+    # type: () -> Dict[str, Any]
+    """Return what the results depend on besides the code."""
+    return {
+        'date': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'commit': git_commit(),
+    }
+
+
+def git_commit():
+    # type: () -> Optional[str]
+    """Return the commit of the repository, or None outside of git."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY,
+            stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_result(result):
+    # type: (Dict[str, Any]) -> str
+    """Return a result as a line of text."""
+    prefix = "%-16s %-12s %9d rows" % (result['case'], result['dataset'],
+                                       result['rows'])
+    if result['skipped'] is not None:
+        return "%s skipped: %s" % (prefix, result['skipped'])
+    return "%s %10.3f ms %9.1f MiB" % (
+        prefix, result['seconds'] * 1e3,
+        result['peak_bytes'] / float(1 << 20))
+
+
+def compare_results(before, after, tolerance=DEFAULT_TOLERANCE):
+    # type: (Dict[str, Any], Dict[str, Any], float) -> List[Tuple[str, str, float, float]]
+    """Return the cases of `after` more than `tolerance` slower than before.
+
+    Returns:
+        A list of (case, dataset, seconds before, seconds after) tuples.
+    """
+    previous = dict(
+        ((result['case'], result['dataset']), result['seconds'])
+        for result in before['results'] if result['seconds'] is not None)
+    regressions = []
+    for result in after['results']:
+        key = (result['case'], result['dataset'])
+        if result['seconds'] is None or key not in previous:
+            continue
+        if result['seconds'] > previous[key] * (1 + tolerance):
+            regressions.append(key + (previous[key], result['seconds']))
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
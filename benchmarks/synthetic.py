@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""Generate synthetic fto csvs and page fixtures for the benchmarks.
+
+Csvs hold a random walk of the population and birth queue and a few
+pregnant mothers, sampled every hour or every minute for a span from a
+month to decades, and end at the current hour so that windows such as
+the last 6 months of truncate_csv.sh are not empty. Pages are the saved
+fixtures of the main and signup pages with other values filled in.
+
+    PYTHONPATH=. python benchmarks/synthetic.py /tmp/fto-bench 1m 1y 20y \
+        --granularity minute
+"""
+
+import argparse
+import os
+import re
+import time
+
+# pylint: disable=unused-import
+from typing import Any, List, Tuple  # NOQA
+import numpy as np
+import pandas as pd
+
+from fto import stats
+from fto.daemon import CSV_HEADER
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "fixtures")
+
+# Granularity -> (pandas frequency, csv date format)
+GRANULARITIES = {
+    'hour': ('h', '%m/%d/%y-%H'),
+    'minute': ('min', '%m/%d/%y-%H:%M'),
+}
+
+SPAN_DAYS = {'d': 1, 'm': 30, 'y': 365}
+
+# Rows written at once, which bounds the memory of long minute csvs
+CHUNK_ROWS = 1 << 20
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    vargs = parse_args()
+    for path, rows in run(**vargs):
+        print("%10d rows %s" % (rows, path))
+
+
+def parse_args():
+    # type: () -> dict
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output_dir', help='directory to write to')
+    parser.add_argument('spans', nargs='+', type=parse_span,
+                        help='lengths of history like 1m, 6m, 1y or 20y')
+    parser.add_argument('--granularity', choices=sorted(GRANULARITIES),
+                        default='hour', help='time between samples')
+    parser.add_argument('--seed', type=int, default=0)
+    return vars(parser.parse_args())
+
+
+def run(output_dir, spans, granularity='hour', seed=0):
+    # type: (str, List[str], str, int) -> List[Tuple[str, int]]
+    """Write a csv per span and the page fixtures to `output_dir`.
+
+    Returns:
+        A list of (csv path, row count) tuples.
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    written = []
+    for span in spans:
+        path = os.path.join(output_dir, dataset_name(span, granularity) + ".csv")
+        written.append((path, write_csv(path, span, granularity, seed)))
+    write_pages(output_dir, 316, 146, 2)
+    return written
+
+
+def parse_span(text):
+    # type: (str) -> str
+    """Check a span like 1m, 6m or 20y for argparse."""
+    if re.match(r"^\d+[dmy]$", text) is None:
+        raise argparse.ArgumentTypeError(
+            "Expected a number of days, months or years like 6m, not %r"
+            % text)
+    return text
+
+
+def dataset_name(span, granularity='hour'):
+    # type: (str, str) -> str
+    """Return the name of the dataset of `span` and `granularity`."""
+    return "%s-%s" % (granularity, span)
+
+
+def span_rows(span, granularity='hour'):
+    # type: (str, str) -> int
+    """Return the number of samples in `span`."""
+    days = int(span[:-1]) * SPAN_DAYS[span[-1]]
+    return days * {'hour': 24, 'minute': 24 * 60}[granularity]
+
+
+def synthetic_frame(rows, granularity='hour', seed=0, end=None):
+    # type: (int, str, int, Any) -> pd.DataFrame
+    """Return `rows` samples ending at `end`, like fto.load_dataframe.
+
+    The population is a random walk of a few births and deaths a day, the
+    birth queue a random walk between 0 and 300, and there are a few
+    pregnant mothers at a time.
+
+    Args:
+        end: Time of the last sample. Default: the start of this hour
+    """
+    freq = GRANULARITIES[granularity][0]
+    if end is None:
+        end = pd.Timestamp(int(time.time()) // 3600 * 3600, unit='s')
+    index = pd.date_range(end=end, periods=rows, freq=freq, name="Date")
+    rng = np.random.RandomState(seed)
+    # About as many births as deaths, a few per day
+    per_sample = 8.0 / (24 if granularity == 'hour' else 24 * 60)
+    steps = rng.poisson(per_sample, rows) - rng.poisson(per_sample, rows)
+    population = (300 + np.cumsum(steps)).clip(50)
+    # A random walk reflected to stay between 0 and 300
+    walk = (150 + np.cumsum(rng.randint(-1, 2, rows))) % 600
+    birth_queue = np.where(walk > 300, 600 - walk, walk)
+    mothers = rng.binomial(8, 0.3, rows)
+    return pd.DataFrame({
+        "Population": population.astype(np.uint32),
+        "Birth Queue": birth_queue.astype(np.uint32),
+        "Pregnant Mothers": mothers.astype(np.uint32),
+    }, index=index)[["Population", "Birth Queue", "Pregnant Mothers"]]
+
+
+def write_csv(path, span, granularity='hour', seed=0):
+    # type: (str, str, str, int) -> int
+    """Write a synthetic csv of `span` to `path`. Returns the row count."""
+    rows = span_rows(span, granularity)
+    fto_df = synthetic_frame(rows, granularity, seed)
+    date_format = GRANULARITIES[granularity][1]
+    with open(path, "w") as csv_fh:
+        csv_fh.write(CSV_HEADER + "\n")
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = fto_df.iloc[start:start + CHUNK_ROWS]
+            lines = stats.format_dates(chunk.index, date_format)
+            for column in ("Population", "Birth Queue", "Pregnant Mothers"):
+                lines = lines + "," + chunk[column].values.astype(str).astype(
+                    object)
+            csv_fh.write("\n".join(lines))
+            csv_fh.write("\n")
+    return rows
+
+
+def render_pages(population, birth_queue, pregnant_mothers,
+                 fixture_dir=FIXTURE_DIR):
+    # type: (int, int, int, str) -> Tuple[bytes, bytes]
+    """Return the main and signup page fixtures showing these values."""
+    with open(os.path.join(fixture_dir, "main.html"), "rb") as main_fh:
+        main_page = re.sub(br"(Population:\s*)[0-9,]+",
+                           br"\g<1>" + str(population).encode("ascii"),
+                           main_fh.read())
+    with open(os.path.join(fixture_dir, "signup.html"), "rb") as signup_fh:
+        signup_page = signup_fh.read()
+    for label, value in ((b"Current size of birth queue", birth_queue),
+                         (b"Number of pregnant mothers", pregnant_mothers)):
+        signup_page = re.sub(label + br"(:</td><td><b>)[0-9,]+",
+                             label + br"\g<1>" + str(value).encode("ascii"),
+                             signup_page)
+    return main_page, signup_page
+
+
+def write_pages(output_dir, population, birth_queue, pregnant_mothers):
+    # type: (str, int, int, int) -> None
+    """Write main.html and signup.html showing these values."""
+    pages = render_pages(population, birth_queue, pregnant_mothers)
+    for name, page in zip(("main.html", "signup.html"), pages):
+        with open(os.path.join(output_dir, name), "wb") as page_fh:
+            page_fh.write(page)
+
+
+if __name__ == "__main__":
+    main()
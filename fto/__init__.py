@@ -8,7 +8,42 @@
 
 - stats: generates statistic from the collected data (not finished)
 
+Submodules are imported lazily on first attribute access so that the
+scraper does not pay for importing the plotting stack.
 """
-from .scrape_fto import run as scrape
-from .fto_graph import run as graph
-from .fto_graph import load_dataframe
+import importlib
+
+__all__ = ['scrape', 'graph', 'load_dataframe']
+
+# Public name -> (submodule, attribute)
+_EXPORTS = {
+    'scrape': ('scrape_fto', 'run'),
+    'graph': ('fto_graph', 'run'),
+    'load_dataframe': ('fto_graph', 'load_dataframe'),
+}
+_SUBMODULES = ('scrape_fto', 'fto_graph', 'fto_web', 'stats', 'daemon',
+               'timeformat', 'window', 'binstore', 'incremental', 'ingest',
+               'partition', 'render', 'downsample', 'pyramid', 'zoom',
+               'live', 'hourly', 'metrics', 'pipeline',
+               'remote', 'serve', 'atomic')
+
+
+def __getattr__(name):
+    # type: (str) -> Any
+    """Import submodules and exported names on first access."""
+    if name in _EXPORTS:
+        module_name, attr_name = _EXPORTS[name]
+        module = importlib.import_module("." + module_name, __name__)
+        value = getattr(module, attr_name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    # type: () -> List[str]
+    return sorted(set(globals()) | set(_EXPORTS) | set(_SUBMODULES))
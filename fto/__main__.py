@@ -0,0 +1,41 @@
+"""Command-line entry point for the fto package.
+
+Usage: python -m fto <command> [args...]
+"""
+
+import importlib
+import sys
+
+
+# Command name -> submodule providing main()
+COMMANDS = {
+    'scrape': 'scrape_fto',
+    'graph': 'fto_graph',
+    'web': 'fto_web',
+    'daemon': 'daemon',
+    'binstore': 'binstore',
+    'window': 'window',
+    'partition': 'partition',
+    'zoom': 'zoom',
+    'live': 'live',
+    'pipeline': 'pipeline',
+    'serve': 'serve',
+}
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    """Dispatch to the main() of the submodule named by the first argument."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in COMMANDS:
+        print("Usage: python -m fto {%s} [args...]" % ",".join(sorted(COMMANDS)))
+        sys.exit(1)
+    command = argv[0]
+    module = importlib.import_module("." + COMMANDS[command], __package__)
+    sys.argv = ["fto " + command] + argv[1:]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Replace files atomically.
+
+Files which other processes read while they are rewritten, such as the
+window csvs, the statistics and the caches, are written to a temporary
+file next to them which is then renamed over them, so that readers see
+either the old or the new file and never a part:
+
+    with atomic.replacing(path, "wb") as output_fh:
+        pickle.dump(state, output_fh)
+
+Each write gets a temporary file of its own, so concurrent writers of
+the same path do not write into each other's. If writing fails, the
+temporary file is removed and the file is left as it was.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+
+# pylint: disable=unused-import
+from typing import Any, IO, Iterator  # NOQA
+
+
+# Suffix of the temporary files, which readers of a directory skip
+TEMP_SUFFIX = ".tmp"
+
+
+def _read_umask():
+    # type: () -> int
+    """Return the umask of the process."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once at import, as os.umask can only be read by changing it, which
+# is not safe while other threads create files
+_UMASK = _read_umask()
+
+
+@contextlib.contextmanager
+def replacing(path, mode="w"):
+    # type: (str, str) -> Iterator[IO[Any]]
+    """Open a temporary file which replaces `path` when the block ends.
+
+    The new file gets the permissions `open` would have given it, rather
+    than the private ones of `tempfile.mkstemp`.
+
+    Raises:
+        OSError/IOError if the file cannot be written or replaced.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(
+        dir=directory, prefix="." + name + ".", suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(handle, mode) as temp_fh:
+            yield temp_fh
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_text(path, text):
+    # type: (str, str) -> None
+    """Replace `path` with `text`."""
+    with replacing(path) as output_fh:
+        output_fh.write(text)
+
+
+def copy_file(source, destination):
+    # type: (str, str) -> None
+    """Replace `destination` with a copy of `source`."""
+    with open(source, "rb") as source_fh:
+        with replacing(destination, "wb") as destination_fh:
+            shutil.copyfileobj(source_fh, destination_fh)
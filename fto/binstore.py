@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""Append-only binary store for fto statistics.
+
+An alternative to the csv which can be memory mapped instead of parsed.
+The file starts with `MAGIC` followed by fixed-width little endian
+records of `RECORD_DTYPE`:
+
+    int64   UTC unix timestamp in seconds
+    uint32  Population
+    uint32  Birth Queue
+    uint32  Pregnant Mothers
+
+Timestamps are stored in seconds rather than hours so that minute and
+second resolution samples fit in the same format.
+"""
+
+import argparse
+import os
+
+# pylint: disable=unused-import
+from typing import Any, IO, Optional, Union  # NOQA
+import numpy as np
+
+from .timeformat import TIME_FORMATS, format_time, parse_time, resolution_of
+
+
+MAGIC = b"FTOBIN\x00\x01"
+
+# Conventional file extension of binary stores
+SUFFIX = ".bin"
+
+RECORD_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('population', '<u4'),
+    ('birth_queue', '<u4'),
+    ('pregnant_mothers', '<u4'),
+])
+
+# Record field -> DataFrame column, in csv order
+COLUMNS = (
+    ('population', 'Population'),
+    ('birth_queue', 'Birth Queue'),
+    ('pregnant_mothers', 'Pregnant Mothers'),
+)
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class InvalidStoreError(Error):
+    """Error when a file is not a valid binary store."""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to convert between csv and binary stores."""
+    vargs = parse_args()
+    command = vargs.pop('command')
+    count = command(**vargs)
+    print("%s => %s (%d rows)" % (vargs['source'], vargs['destination'], count))
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command_name')
+    subparsers.required = True
+    to_binary = subparsers.add_parser(
+        'to-binary', help='convert a csv into a binary store')
+    to_binary.set_defaults(command=csv_to_binary)
+    to_csv = subparsers.add_parser(
+        'to-csv', help='convert a binary store into a csv')
+    to_csv.set_defaults(command=binary_to_csv)
+    to_csv.add_argument(
+        '--resolution', choices=sorted(TIME_FORMATS), default=None,
+        help='timestamp precision. Default: the coarsest which fits')
+    for subparser in (to_binary, to_csv):
+        subparser.add_argument('source')
+        subparser.add_argument('destination')
+    vargs = vars(parser.parse_args())
+    del vargs['command_name']
+    return vargs
+
+
+def is_binary_store(path):
+    # type: (str) -> bool
+    """Return True if `path` is a local file starting with `MAGIC`."""
+    try:
+        with open(path, "rb") as store_fh:
+            return store_fh.read(len(MAGIC)) == MAGIC
+    except (OSError, IOError):
+        return False
+
+
+def append_records(path, records):
+    # type: (str, np.ndarray) -> None
+    """Append an array of `RECORD_DTYPE` records, creating the store."""
+    records = np.asarray(records, dtype=RECORD_DTYPE)
+    with open(path, "ab") as store_fh:
+        if store_fh.tell() == 0:
+            store_fh.write(MAGIC)
+        store_fh.write(records.tobytes())
+
+
+def append_sample(path, timestamp, population, birth_queue, pregnant_mothers):
+    # type: (str, int, int, int, int) -> None
+    """Append a single sample to the store at `path`."""
+    append_records(path, np.array(
+        [(timestamp, population, birth_queue, pregnant_mothers)],
+        dtype=RECORD_DTYPE))
+
+
+def append_csv_line(path, line):
+    # type: (str, str) -> None
+    """Append a `MM/DD/YY-HH,population,birth queue,mothers` csv line."""
+    date, population, birth_queue, pregnant_mothers = line.strip().split(",")
+    append_sample(path, parse_time(date), int(population), int(birth_queue),
+                  int(pregnant_mothers))
+
+
+def open_memmap(path):
+    # type: (str) -> np.ndarray
+    """Memory map the records of the store at `path` read-only.
+
+    A partially written trailing record is ignored.
+
+    Raises:
+        InvalidStoreError if `path` is not a binary store.
+    """
+    if not is_binary_store(path):
+        raise InvalidStoreError("%s is not a binary fto store" % path)
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD_DTYPE.itemsize
+    if count == 0:
+        # Empty files cannot be memory mapped
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r",
+                     offset=len(MAGIC), shape=(count,))
+
+
+def load_dataframe(path):
+    # type: (str) -> pd.DataFrame
+    """Build a DataFrame over the memory mapped records of `path`.
+
+    The count columns are a single block viewing the mapped file, so
+    they are not copied. Only the timestamps are converted, from seconds
+    to datetime64. No adjustments are made to the raw counts.
+
+    Returns:
+        A `pd.DataFrame` with the same columns and index as
+        `fto_graph.load_dataframe` returns for a csv.
+    """
+    import pandas as pd
+    records = open_memmap(path)
+    index = pd.DatetimeIndex(
+        records['time'].astype('datetime64[s]').astype('datetime64[ns]'),
+        name='Date')
+    # The count fields are adjacent in each record: view them as one 2d
+    # array striding over the records, which pandas keeps as is instead
+    # of copying each column into a block of its own
+    first_field = COLUMNS[0][0]
+    counts = np.lib.stride_tricks.as_strided(
+        records[first_field], shape=(len(records), len(COLUMNS)),
+        strides=(RECORD_DTYPE.itemsize, RECORD_DTYPE[first_field].itemsize),
+        writeable=False)
+    return pd.DataFrame(counts, index=index,
+                        columns=[column for _, column in COLUMNS], copy=False)
+
+
+def csv_to_binary(source, destination):
+    # type: (Union[str, IO], str) -> int
+    """Write the rows of the csv `source` to a new binary store.
+
+    Returns:
+        The number of records written.
+    """
+    # Imported here so that appending does not require pandas/matplotlib
+    from . import fto_graph
+    csv_df = fto_graph.read_csv_frame(source)
+    dates = fto_graph.parse_csv_dates(csv_df['Date'])
+    records = np.empty(len(csv_df), dtype=RECORD_DTYPE)
+    records['time'] = dates.values.astype('datetime64[s]').astype('int64')
+    for field, column in COLUMNS:
+        records[field] = csv_df[column].values
+    if os.path.exists(destination):
+        os.remove(destination)
+    append_records(destination, records)
+    return len(records)
+
+
+def binary_to_csv(source, destination, resolution=None):
+    # type: (str, str, Optional[str]) -> int
+    """Write the records of the binary store `source` to a csv.
+
+    Args:
+        source: Path to the binary store.
+        destination: Path of the csv to write.
+        resolution: Timestamp precision. Default: the coarsest resolution
+            which represents every record.
+
+    Returns:
+        The number of rows written.
+    """
+    records = open_memmap(source)
+    if resolution is None:
+        resolution = resolution_of(records['time'].tolist())
+    with open(destination, "w") as csv_fh:
+        csv_fh.write("Date,%s\n" % ",".join(column for _, column in COLUMNS))
+        for record in records.tolist():
+            csv_fh.write("%s,%d,%d,%d\n" % (
+                (format_time(record[0], resolution),) + record[1:]))
+    return len(records)
+
+
+if __name__ == "__main__":
+    main()
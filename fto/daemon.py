@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""Sample fto data on a schedule from one long-running process.
+
+Replaces the crontab + append_csv.sh pipeline. A single http session and
+page cache are kept between samples, each sample is appended to the output csv,
+and the derived outputs (the window csvs and optionally the graph)
+are refreshed in the same process.
+"""
+
+import argparse
+import logging
+import os
+import random
+import re
+import time
+
+# pylint: disable=unused-import
+from typing import Any, Callable, Iterable, List, Optional  # NOQA
+
+from . import binstore
+from . import metrics
+from . import partition
+from . import scrape_fto
+from .timeformat import TIME_FORMATS, resolution_for_interval
+from . import window
+
+
+CSV_HEADER = "Date,Population,Birth Queue,Pregnant Mothers"
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    vargs = parse_args()
+    if vargs.pop('verbose'):
+        log.setLevel(logging.DEBUG)
+        metrics.enable()
+    try:
+        run(**vargs)
+    except KeyboardInterrupt:
+        log.info("Stopped")
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'output_csv',
+        help='csv to append samples to, a binary store ending in %s or a '
+             'partitioned store directory' % binstore.SUFFIX)
+    parser.add_argument(
+        '--interval', type=parse_positive_interval, default=3600,
+        help='time between samples in seconds, or with a s/m/h/d suffix. '
+             'Samples are aligned to multiples of the interval. Default: 1h')
+    parser.add_argument(
+        '--jitter', type=parse_interval, default=0,
+        help='random delay of up to this long added to each sample time')
+    parser.add_argument(
+        '--resolution', choices=sorted(TIME_FORMATS), default=None,
+        help='timestamp precision. Default: derived from the interval')
+    parser.add_argument(
+        '--window', dest='windows', action='append', default=None,
+        metavar='SPEC[=PATH]',
+        help='window csv to rewrite after each sample, such as 7d, 6m or '
+             '1y. May be repeated. See python -m fto window. Default: 6m')
+    parser.add_argument(
+        '--no-windows', dest='windows', action='store_const', const=[],
+        help='do not write window csvs')
+    parser.add_argument(
+        '--graph', dest='graph_filename', default=None,
+        help='also render the graph png to this path after each sample')
+    scrape_fto.add_policy_args(parser)
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
+    vargs = vars(parser.parse_args())
+    if vargs['windows'] is None:
+        vargs['windows'] = ['6m']
+    vargs['policy'] = scrape_fto.policy_from_args(vargs)
+    return vargs
+
+
+def parse_interval(text):
+    # type: (str) -> float
+    """Parse a duration like '90', '15m' or '1h' into seconds."""
+    match = re.match(r"^\s*(\d+(?:\.\d*)?)\s*([smhd]?)\s*$", text)
+    if match is None:
+        raise argparse.ArgumentTypeError("invalid interval %r" % text)
+    number, unit = match.groups()
+    return float(number) * INTERVAL_UNITS[unit or 's']
+
+
+def parse_positive_interval(text):
+    # type: (str) -> float
+    """Parse a duration like `parse_interval` which must be above 0."""
+    seconds = parse_interval(text)
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(
+            "interval must be above 0, got %r" % text)
+    return seconds
+
+
+def run(output_csv,             # type: str
+        interval=3600,          # type: float
+        jitter=0,               # type: float
+        resolution=None,        # type: Optional[str]
+        windows=('6m',),        # type: Iterable[str]
+        graph_filename=None,    # type: Optional[str]
+        base_url="http://www.faerytaleonline.com",  # type: str
+        policy=None,            # type: Optional[scrape_fto.FetchPolicy]
+        iterations=None,        # type: Optional[int]
+        sleep=time.sleep        # type: Callable[[float], Any]
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> None
+    """Sample forever (or `iterations` times) on a fixed schedule.
+
+    Args:
+        output_csv: Path of the csv to append samples to. Created with a
+            header if it does not exist.
+        interval: Seconds between samples. Default: 3600
+        jitter: Up to this many seconds are randomly added to each
+            scheduled sample time. Default: 0
+        resolution: Timestamp precision. If None, the coarsest resolution
+            which distinguishes consecutive samples is used.
+        windows: Windows written after each sample as `SPEC[=PATH]`,
+            see `fto.window.run`. Default: the last 6 months
+        graph_filename: If given, render the graph png after each sample.
+        base_url: Url of the website to scrape.
+        policy: Timeouts, retries and hedging, kept between samples so
+            that hedging can use the observed latencies.
+        iterations: Stop after this many samples. Default: run forever
+        sleep: Function used to wait between samples.
+
+    Raises:
+        ValueError if `interval` is not above 0.
+    """
+    if interval <= 0:
+        raise ValueError("interval must be above 0, got %r" % interval)
+    if resolution is None:
+        resolution = resolution_for_interval(interval)
+    session = scrape_fto.create_session()
+    cache = scrape_fto.PageCache()
+    if policy is None:
+        policy = scrape_fto.FetchPolicy()
+    renderer = None
+    if graph_filename:
+        # Imported here so that only graphing daemons load matplotlib
+        from . import render
+        renderer = render.FigureRenderer()
+    count = 0
+    try:
+        while iterations is None or count < iterations:
+            delay = next_sample_time(interval, jitter) - time.time()
+            log.debug("Next sample in %.1f seconds", delay)
+            sleep(max(delay, 0))
+            sample(output_csv, session, base_url, resolution, cache, policy)
+            log.debug("Page cache hits: %d misses: %d",
+                      cache.hits, cache.misses)
+            refresh_outputs(output_csv, windows, graph_filename, renderer)
+            metrics.flush()
+            count += 1
+    finally:
+        session.close()
+        if renderer is not None:
+            renderer.close()
+
+
+def next_sample_time(interval, jitter=0, now=None):
+    # type: (float, float, Optional[float]) -> float
+    """Return the next multiple of `interval` after `now` plus jitter."""
+    if now is None:
+        now = time.time()
+    return (now // interval + 1) * interval + random.uniform(0, jitter)
+
+
+def sample(output_csv,   # type: str
+           session,      # type: Any
+           base_url,     # type: str
+           resolution,   # type: str
+           cache=None,   # type: Optional[scrape_fto.PageCache]
+           policy=None   # type: Optional[scrape_fto.FetchPolicy]
+           ):  # pylint: disable=bad-continuation
+    # type: (...) -> Optional[str]
+    """Scrape one sample and append it to `output_csv`.
+
+    Failures are logged and do not stop the daemon.
+
+    Returns:
+        The appended csv line or None if scraping failed.
+    """
+    records = []  # type: List[scrape_fto.FetchRecord]
+    try:
+        line = next(iter(scrape_fto.run(
+            base_url=base_url, output_csv=True, session=session,
+            policy=policy, time_resolution=resolution, cache=cache,
+            records=records)))
+    except scrape_fto.Error as e:
+        log.error("Could not get data from fto server: %s", str(e))
+        return None
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Could not get data from fto server")
+        return None
+    append_line(output_csv, line)
+    # Pages are fetched concurrently, the slowest one bounds the sample
+    log.info("Sampled %s in %.3fs with %d attempts", line,
+             max(record.latency for record in records),
+             sum(record.attempts for record in records))
+    return line
+
+
+def append_line(store, line):
+    # type: (str, str) -> None
+    """Append a csv `line` to `store`, a csv, binary or partitioned store.
+
+    Paths ending in `binstore.SUFFIX` or starting with the binary store
+    header are written as binary records. Partitioned stores and paths
+    ending in a path separator are written as partitioned stores.
+    """
+    if store.endswith(os.sep) or partition.is_partitioned_store(store):
+        partition.append_csv_line(store, line)
+    elif store.endswith(binstore.SUFFIX) or binstore.is_binary_store(store):
+        binstore.append_csv_line(store, line)
+    else:
+        append_csv_line(store, line)
+
+
+def append_csv_line(output_csv, line):
+    # type: (str, str) -> None
+    """Append `line` to `output_csv`, writing the header to a new file."""
+    write_header = not os.path.exists(output_csv)
+    with open(output_csv, "a") as csv_fh:
+        if write_header:
+            csv_fh.write(CSV_HEADER + "\n")
+        csv_fh.write(line + "\n")
+
+
+def refresh_outputs(output_csv,           # type: str
+                    windows=('6m',),      # type: Iterable[str]
+                    graph_filename=None,  # type: Optional[str]
+                    renderer=None         # type: Optional[Any]
+                    ):  # pylint: disable=bad-continuation
+    # type: (...) -> None
+    """Regenerate the files derived from `output_csv`.
+
+    The graph is drawn with `renderer`, a `fto.render.FigureRenderer`
+    kept between samples so that only the line data is replaced, from a
+    load which only parses the rows appended since the last sample.
+    Failures are logged and do not stop the daemon.
+    """
+    if not os.path.exists(output_csv):
+        return
+    if (windows and os.path.isfile(output_csv) and
+            not binstore.is_binary_store(output_csv)):
+        try:
+            window.run(output_csv, windows)
+        except (window.Error, OSError) as e:
+            log.error("Could not write windows: %s", str(e))
+    if graph_filename:
+        # Imported here so that only graphing daemons load matplotlib
+        from . import fto_graph
+        from . import render
+        owned = renderer is None
+        if owned:
+            renderer = render.FigureRenderer()
+        try:
+            renderer.render(
+                fto_graph.load_dataframe(output_csv, incremental=True),
+                graph_filename)
+        except (fto_graph.Error, OSError) as e:
+            log.error("Could not generate figure: %s", str(e))
+        finally:
+            if owned:
+                renderer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Reduce long series to about as many points as can be seen.
+
+Years of hourly (or minute) samples are far more points than a graph is
+pixels wide. Both the png graph and the bokeh graph plot downsampled
+data instead:
+
+- `minmax_indices` keeps the first, minimum, maximum and last sample
+  of each pixel column, so the drawn envelope and every peak are the same
+  as with the raw data.
+- `lttb_indices` picks one sample per bucket with the Largest Triangle
+  Three Buckets algorithm, which keeps the visual shape with fewer points
+  but may shave off peaks.
+
+Functions return sorted row positions so that several columns sharing an
+index can be reduced together, see downsample_frame.
+"""
+
+# pylint: disable=unused-import
+from typing import Any, Callable, Dict, Iterable, Optional  # NOQA
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_METHOD = 'minmax'
+
+
+def x_values(index):
+    # type: (pd.Index) -> np.ndarray
+    """Return the index as float64 for binning, datetimes as nanoseconds."""
+    values = np.asarray(index)
+    if values.dtype.kind in 'mM':
+        values = values.view('int64')
+    return values.astype(np.float64)
+
+
+def minmax_indices(x, y, bins):
+    # type: (np.ndarray, np.ndarray, int) -> np.ndarray
+    """Return the positions of the extremes of `y` in `bins` bins of `x`.
+
+    `x` must be ascending. Bins are of equal width in `x`, like pixel
+    columns, and empty bins are skipped. Each bin keeps its first, minimum,
+    maximum and last sample so that lines join up as in the raw data.
+    """
+    count = len(x)
+    if bins <= 0 or count <= 4 * bins:
+        return np.arange(count)
+    span = x[-1] - x[0]
+    if span <= 0:
+        bin_ids = np.zeros(count, dtype=np.int64)
+    else:
+        bin_ids = ((x - x[0]) * (bins / span)).astype(np.int64)
+        np.minimum(bin_ids, bins - 1, out=bin_ids)
+    starts = np.flatnonzero(np.diff(bin_ids, prepend=-1))
+    lasts = np.append(starts[1:] - 1, count - 1)
+    group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, count)))
+    positions = np.arange(count)
+    picks = [starts, lasts]
+    for reduce_ in (np.minimum, np.maximum):
+        extreme = reduce_.reduceat(y, starts)[group]
+        # First position of each bin which holds the extreme
+        picks.append(np.minimum.reduceat(
+            np.where(y == extreme, positions, count), starts))
+    return np.unique(np.concatenate(picks))
+
+
+def lttb_indices(x, y, points):
+    # type: (np.ndarray, np.ndarray, int) -> np.ndarray
+    """Return the positions of `points` samples picked by LTTB.
+
+    The first and last samples are kept and the rest is split into
+    `points - 2` buckets of equal size, from each of which the sample
+    forming the largest triangle with the previously picked sample and
+    the mean of the next bucket is kept.
+    """
+    count = len(x)
+    if points < 3 or count <= points:
+        return np.arange(count)
+    edges = np.linspace(1, count - 1, points - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / sizes
+    # The last bucket is followed by the last sample
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+    picked = np.empty(points, dtype=np.int64)
+    picked[0], picked[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        bucket_x, bucket_y = x[start:stop], y[start:stop]
+        # Twice the triangle area, the factor does not change the argmax
+        area = np.abs(
+            (x[previous] - next_x[bucket]) * (bucket_y - y[previous]) -
+            (x[previous] - bucket_x) * (next_y[bucket] - y[previous]))
+        previous = start + int(np.argmax(area))
+        picked[bucket + 1] = previous
+    return picked
+
+
+# Method name -> function(x, y, pixels) returning positions. LTTB keeps
+# two samples per pixel so that steep changes within a pixel still show.
+METHODS = {
+    'minmax': minmax_indices,
+    'lttb': lambda x, y, pixels: lttb_indices(x, y, 2 * pixels),
+}  # type: Dict[str, Callable[[np.ndarray, np.ndarray, int], np.ndarray]]
+
+
+def downsample_indices(index, values, pixels, method=DEFAULT_METHOD):
+    # type: (pd.Index, np.ndarray, int, str) -> np.ndarray
+    """Return the positions to keep to draw `values` `pixels` wide.
+
+    Raises:
+        ValueError if `method` is not one of `METHODS`.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown downsampling method %r, expected one of %s"
+                         % (method, sorted(METHODS)))
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.flatnonzero(np.isnan(values))
+    if not len(missing):  # pylint: disable=len-as-condition
+        return METHODS[method](x_values(index), values, pixels)
+    # NaN marks a gap, see fto.hourly. Keep every one so that the lines
+    # stay broken there, and pick the other samples as if the gaps held
+    # the value before them.
+    filled = np.where(np.isnan(values), 0, np.arange(len(values)))
+    filled = values[np.maximum.accumulate(filled)]
+    filled[np.isnan(filled)] = 0
+    return np.union1d(METHODS[method](x_values(index), filled, pixels),
+                      missing)
+
+
+def downsample_series(series, pixels, method=DEFAULT_METHOD):
+    # type: (pd.Series, int, str) -> pd.Series
+    """Return the samples of `series` needed to draw it `pixels` wide."""
+    return series.iloc[downsample_indices(series.index, series.values,
+                                          pixels, method)]
+
+
+def downsample_frame(df,                     # type: pd.DataFrame
+                     pixels,                 # type: int
+                     columns=None,           # type: Optional[Iterable[str]]
+                     method=DEFAULT_METHOD   # type: str
+                     ):  # pylint: disable=bad-continuation
+    # type: (...) -> pd.DataFrame
+    """Return the rows of `df` needed to draw each of `columns`.
+
+    The rows kept for each column are combined, so that every column keeps
+    its peaks and all columns still share one index, as a bokeh
+    ColumnDataSource needs. The number of rows depends on `pixels` only,
+    not on the length of `df`.
+
+    Args:
+        df: A DataFrame with an ascending index.
+        pixels: Width of the plot in pixels.
+        columns: Columns whose shape must be kept. Default: all numeric
+        method: One of `METHODS`. Default: `DEFAULT_METHOD`
+    """
+    if columns is None:
+        columns = [column for column in df.columns
+                   if df[column].dtype.kind in 'iufb']
+    if len(df) <= pixels:
+        return df
+    keep = np.unique(np.concatenate([
+        downsample_indices(df.index, df[column].values, pixels, method)
+        for column in columns]))
+    return df.iloc[keep]
+
+
+def figure_pixels(figure, dpi=None):
+    # type: (Any, Optional[float]) -> int
+    """Return the width in pixels of a matplotlib `figure` once saved."""
+    if dpi is None or dpi == 'figure':
+        dpi = figure.dpi
+    return int(round(figure.get_figwidth() * dpi))
@@ -2,9 +2,12 @@
 """Command-line program to read a fto statistics csv and output a png graph"""
 
 import argparse
+import collections
 import errno
 import logging
+import multiprocessing
 import sys
+import time
 from operator import itemgetter
 import io
 import warnings
@@ -15,18 +18,36 @@ except ImportError:
 
 
 # pylint: disable=unused-import
-from typing import Iterable, Hashable, Any, Union, IO, Optional # NOQA
+from typing import Iterable, Hashable, Any, Dict, Union, IO, Optional, Tuple # NOQA
+import numpy as np
 import pandas as pd
-import requests
 import matplotlib
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
     # The backend choice must be called before pyplot import
     matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import matplotlib.ticker
+
+from . import binstore
+from . import downsample
+from . import hourly
+from . import ingest
+from . import metrics
+from . import partition
+from . import remote
+from . import window
+from .timeformat import TIME_FORMATS_BY_LENGTH
 
 __all__ = ['main', 'generate_figure', 'load_dataframe']
 
+# matplotlib settings generate_figure applies
+FIGURE_RC = {'font.size': 22}
+
+# One image of a batch render, see render_batch
+RenderJob = collections.namedtuple(
+    'RenderJob', ['window', 'output_filename', 'dpi'])
+
 
 # pylint: disable=invalid-name
 log = logging.getLogger(__name__)
@@ -56,6 +77,15 @@ class InvalidCSVError(Error):
     pass
 
 
+class BatchRenderError(Error):
+    """Error when some images of a batch render failed."""
+    def __init__(self, failures):
+        # type: (Dict[str, str]) -> None
+        super(BatchRenderError, self).__init__(
+            "; ".join("%s: %s" % item for item in sorted(failures.items())))
+        self.failures = failures
+
+
 def main():
     # () -> None
     """Cli interface to this module"""
@@ -64,8 +94,21 @@ def main():
     logging.basicConfig(level=logging.INFO)
 
     vargs = vars(parse_args())
+    if vargs['verbose']:
+        metrics.enable()
+    renders = vargs.pop('renders')
+    processes = vargs.pop('processes')
+    # Nothing was rendered if the batch is cancelled
+    timings = {}  # type: Dict[str, float]
     try:
-        run(**vargs)
+        if renders:
+            if vargs['verbose']:
+                logging.getLogger().setLevel(logging.DEBUG)
+            timings = render_batch(
+                vargs['input_csv'], renders, processes, vargs['incremental'],
+                vargs['cache_dir'] if vargs['cache'] else None)
+        else:
+            run(**vargs)
     except KeyboardInterrupt as e:
         log.debug(e, stack_info=True)
         log.info("Keyboard Cancelled operation")
@@ -74,7 +117,12 @@ def main():
         log.error("Could not generate figure: %s", str(e))
         sys.exit(1)
 
-    print("%s => %s" % itemgetter('input_csv', 'output_filename')(vargs))
+    if renders:
+        for output_filename, seconds in sorted(timings.items()):
+            print("%s => %s (%.1fs)" % (vargs['input_csv'], output_filename,
+                                        seconds))
+    else:
+        print("%s => %s" % itemgetter('input_csv', 'output_filename')(vargs))
 
 
 def parse_args():
@@ -91,6 +139,33 @@ def parse_args():
     )
     parser.add_argument(
         '--verbose', help='Turn debug output on.', action='store_true')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='cache the parsed csv and only parse newly appended rows')
+    parser.add_argument(
+        '--start', default=None,
+        help='first date to graph, e.g. 2016-02-15. Default: all')
+    parser.add_argument(
+        '--end', default=None,
+        help='date to graph up to, exclusive. Default: all')
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='copy the png from the render cache when the data and options '
+             'are unchanged')
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help='render cache directory. Default: ~/.cache/fto/renders')
+    parser.add_argument(
+        '--render', dest='renders', action='append', default=None,
+        type=parse_render_spec, metavar='WINDOW=PATH[@DPI]',
+        help='render a window instead of output_filename, e.g. all=full.png, '
+             '6m=recent.svg or 2017=2017.png@200. WINDOW is all, a window '
+             'like 7d, 6m or 1y, a year or a month like 2017-03. May be '
+             'repeated, the data is loaded once and the images are rendered '
+             'in parallel')
+    parser.add_argument(
+        '--processes', type=int, default=None,
+        help='worker processes for --render. Default: one per cpu')
     args = parser.parse_args()
     return args
 
@@ -114,9 +189,14 @@ def get_mapped_vals(data_dict, keys):
 
 def run(input_csv,             # type: Union[str, IO]
         output_filename=None,  # type: Optional[str]
-        verbose=False          # type: bool
+        verbose=False,         # type: bool
+        incremental=False,     # type: bool
+        start=None,            # type: Any
+        end=None,              # type: Any
+        cache=False,           # type: bool
+        cache_dir=None         # type: Optional[str]
         ):  # pylint: disable=bad-continuation
-    # type: (...) -> plt.Figure
+    # type: (...) -> Optional[plt.Figure]
     """parse csv, modify dataframe, generate figure, save figure.
 
     Args:
@@ -126,30 +206,190 @@ def run(input_csv,             # type: Union[str, IO]
             path for the figure output file.
             If Falsy, only return figure, do not write to file. Default: None
         verbose(bool): If true, also log debug output to stdout. Default: False
+        incremental(bool): If true, only parse rows appended since the
+            last run. See `load_dataframe`. Default: False
+        start: Only graph rows from this date on. See `load_dataframe`.
+        end: Only graph rows before this date. See `load_dataframe`.
+        cache(bool): If true and `output_filename` is given, copy the file
+            from the render cache when the data and render options are
+            unchanged. See `fto.render`. Default: False
+        cache_dir(str|None): Render cache directory. Default: see
+            `fto.render.default_cache_dir`
 
     Returns:
-        A copy of the figure
+        A copy of the figure, or None if the file came from the cache
     """
     if verbose:
         logging.getLogger().setLevel(logging.DEBUG)
         log.setLevel(logging.DEBUG)
-    df = load_dataframe(input_csv)
+    df = load_dataframe(input_csv, incremental=incremental,
+                        start=start, end=end)
+    if cache and output_filename:
+        # Imported here since fto.render depends on this module
+        from . import render
+        renderer = render.FigureRenderer(render.RenderCache(cache_dir))
+        renderer.render(df, output_filename)
+        return renderer.figure
     figure = generate_figure(df)
     if output_filename:
-        figure.savefig(output_filename)
+        with metrics.span("fto_graph.savefig"):
+            figure.savefig(output_filename)
     return figure
 
 
-def load_dataframe(csv_path_or_buffer):
-    # type: (Union[str, IO]) -> pd.DataFrame
+def parse_render_spec(text):
+    # type: (str) -> RenderJob
+    """Parse a `WINDOW=PATH[@DPI]` batch render argument."""
+    spec, _, output_filename = text.partition("=")
+    dpi = None  # type: Optional[float]
+    path, _, suffix = output_filename.rpartition("@")
+    if path and suffix.isdigit():
+        output_filename, dpi = path, float(suffix)
+    if not spec or not output_filename:
+        raise argparse.ArgumentTypeError(
+            "invalid render %r, expected WINDOW=PATH[@DPI]" % text)
+    try:
+        window.window_bounds(spec)
+    except window.Error as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return RenderJob(spec, output_filename, dpi)
+
+
+def render_batch(input_csv,          # type: Union[str, IO]
+                 jobs,               # type: Iterable[RenderJob]
+                 processes=None,     # type: Optional[int]
+                 incremental=False,  # type: bool
+                 cache_dir=None,     # type: Optional[str]
+                 now=None            # type: Optional[float]
+                 ):  # pylint: disable=bad-continuation
+    # type: (...) -> Dict[str, float]
+    """Load `input_csv` once and render several windows of it in parallel.
+
+    Each image is rendered by a worker process of its own pool, starting
+    from the matplotlib settings of this process, so that the global state
+    generate_figure changes is not shared between images.
+
+    Args:
+        input_csv: See load_dataframe. Only the rows of the earliest
+            window are read from a partitioned store.
+        jobs: The images to render, such as from parse_render_spec. The
+            format follows from the extension of the output filename.
+        processes: Number of worker processes. With 1, images are rendered
+            in this process. Default: one per cpu, at most one per image
+        incremental: See load_dataframe.
+        cache_dir: If given, copy unchanged images from this render cache
+            directory. See `fto.render`.
+        now: Unix timestamp windows such as 6m end at. Default: now
+
+    Returns:
+        Seconds spent rendering each output file.
+
+    Raises:
+        BatchRenderError after every image was attempted, if any failed.
+        The errors of load_dataframe.
+    """
+    tasks = [(job,) + window.window_bounds(job.window, now) for job in jobs]
+    if not tasks:
+        return {}
+    starts = [start for _, start, _ in tasks]
+    df = load_dataframe(input_csv, incremental=incremental,
+                        start=None if None in starts else min(starts))
+    settings = dict(matplotlib.rcParams)
+    if processes is None:
+        processes = min(len(tasks), multiprocessing.cpu_count())
+    if processes <= 1:
+        results = [render_task(df, task, cache_dir) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(
+            processes, initializer=init_render_worker,
+            initargs=(df, settings, cache_dir))
+        try:
+            results = pool.map(render_worker_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    failures = dict((output, error) for output, _, error in results if error)
+    if failures:
+        raise BatchRenderError(failures)
+    return dict((output, seconds) for output, seconds, _ in results)
+
+
+# Data and settings of a render worker process, see init_render_worker
+_worker_state = {}  # type: Dict[str, Any]
+
+
+def init_render_worker(df, settings, cache_dir):
+    # type: (pd.DataFrame, Dict[str, Any], Optional[str]) -> None
+    """Start a render worker from a clean pyplot and the given settings."""
+    plt.close('all')
+    matplotlib.rcParams.update(settings)
+    _worker_state.update(df=df, cache_dir=cache_dir)
+
+
+def render_worker_task(task):
+    # type: (Tuple[RenderJob, Optional[int], Optional[int]]) -> Tuple
+    """Render one task with the data of init_render_worker."""
+    return render_task(_worker_state['df'], task, _worker_state['cache_dir'])
+
+
+def render_task(df, task, cache_dir=None):
+    # type: (pd.DataFrame, Tuple, Optional[str]) -> Tuple[str, float, Optional[str]]
+    """Render the rows of `df` in the window of `task` to its output file.
+
+    Returns:
+        The output filename, the seconds taken and None, or an error
+        message instead of None if rendering failed.
+    """
+    # Imported here since fto.render depends on this module
+    from . import render
+    job, start, end = task
+    began = time.time()
+    try:
+        window_df = select_dates(df, start, end)
+        if window_df.empty:
+            raise InvalidCSVError("No rows in window %s" % job.window)
+        cache = render.RenderCache(cache_dir) if cache_dir else None
+        renderer = render.FigureRenderer(cache, job.dpi)
+        try:
+            renderer.render(window_df, job.output_filename)
+        finally:
+            renderer.close()
+    except Exception as e:  # pylint: disable=broad-except
+        log.debug("Could not render %s", job.output_filename, exc_info=True)
+        return job.output_filename, time.time() - began, str(e)
+    return job.output_filename, time.time() - began, None
+
+
+@metrics.timed("fto_graph.load_dataframe")
+def load_dataframe(csv_path_or_buffer,  # type: Union[str, IO]
+                   incremental=False,   # type: bool
+                   start=None,          # type: Any
+                   end=None,            # type: Any
+                   columns=None         # type: Optional[Iterable[str]]
+                   ):  # pylint: disable=bad-continuation
+    # type: (...) -> pd.DataFrame
     """Load pd.DataFrame from csv at `csv_path` on the filesystem.
 
-    The first column should be the Date column.
+    The first column should be the Date column. Local csvs are parsed
+    with the vectorized `fto.ingest` parser when they have the standard
+    layout. A local path may also point to a binary store written by
+    `fto.binstore`, which is memory mapped instead of parsed, or to the
+    directory of a partitioned store written by `fto.partition`, of which
+    only the months between `start` and `end` and the requested `columns`
+    are read.
 
     Args:
         csv_path_or_buffer(str): Path to existing csv on filesystem
             or a csv resource via http or https. Alternatively
             it can to a file-like object which implements read.
+        incremental(bool): If True, keep a sidecar cache of the parsed csv
+            and only parse rows appended since the last load. See
+            `fto.incremental`. Default: False
+        start: Only return rows from this time on: a unix timestamp,
+            datetime (naive ones are UTC) or date string. Default: all
+        end: Only return rows before this time. Default: all
+        columns: Only return these columns, e.g. ['Population'].
+            Default: all
 
     Returns:
         A `pd.DataFrame` with the column names 'Birth Queue',
@@ -160,6 +400,76 @@ def load_dataframe(csv_path_or_buffer):
         CSVNotReadError if data from `csv_path` cannot be read from.
         InvalidCSVError if the data in `csv_path` is not valid for this
         program.
+        ValueError if a column of `columns` is unknown.
+    """
+    if columns is not None:
+        columns = list(columns)
+        unknown = [column for column in columns
+                   if column not in partition.FIELDS]
+        if unknown:
+            raise ValueError("Unknown columns %s, expected some of %s"
+                             % (unknown, sorted(partition.FIELDS)))
+    if (isinstance(csv_path_or_buffer, str) and
+            partition.is_partitioned_store(csv_path_or_buffer)):
+        # Corrected by the counts of the whole store, not of the months read
+        return adjust_pregnant_mothers(
+            partition.load_dataframe(csv_path_or_buffer, start, end, columns),
+            partition.pregnant_mothers_min(csv_path_or_buffer))
+    fto_df = select_dates(load_full_dataframe(csv_path_or_buffer, incremental),
+                          start, end)
+    if columns is not None:
+        fto_df = fto_df[columns]
+    return fto_df
+
+
+def load_full_dataframe(csv_path_or_buffer, incremental=False):
+    # type: (Union[str, IO], bool) -> pd.DataFrame
+    """Load every row of a csv or binary store. See load_dataframe."""
+    if (isinstance(csv_path_or_buffer, str) and
+            binstore.is_binary_store(csv_path_or_buffer)):
+        return adjust_pregnant_mothers(
+            binstore.load_dataframe(csv_path_or_buffer))
+    if incremental:
+        # Imported here since fto.incremental depends on this module
+        from . import incremental as incremental_
+        return incremental_.load_dataframe(csv_path_or_buffer)
+    if (isinstance(csv_path_or_buffer, str) and
+            urlparse(csv_path_or_buffer).scheme not in ["http", "https"]):
+        try:
+            return adjust_pregnant_mothers(ingest.read_csv(csv_path_or_buffer))
+        except ingest.UnsupportedCSVError as e:
+            log.debug("Falling back to pandas csv parser: %s", e)
+        except (OSError, IOError) as e:
+            # Let the generic path report the error
+            log.debug(e)
+    df = read_csv_frame(csv_path_or_buffer)
+    df_adjusted = adjust_from_csv(df)
+    return df_adjusted
+
+
+def select_dates(fto_df, start=None, end=None):
+    # type: (pd.DataFrame, Any, Any) -> pd.DataFrame
+    """Return the rows of `fto_df` in [`start`, `end`).
+
+    See load_dataframe for the accepted bounds.
+    """
+    start, end = partition.to_timestamp(start), partition.to_timestamp(end)
+    if start is None and end is None:
+        return fto_df
+    mask = np.ones(len(fto_df), dtype=bool)
+    seconds = fto_df.index.values.astype('datetime64[s]').astype('int64')
+    if start is not None:
+        mask &= seconds >= start
+    if end is not None:
+        mask &= seconds < end
+    return fto_df[mask]
+
+
+def read_csv_frame(csv_path_or_buffer):
+    # type: (Union[str, IO]) -> pd.DataFrame
+    """Read the csv as is, with the Date column still holding strings.
+
+    See load_dataframe for the arguments and errors.
     """
     columns = ['Date', 'Birth Queue', 'Population', 'Pregnant Mothers']
     line = ""
@@ -176,12 +486,14 @@ def load_dataframe(csv_path_or_buffer):
             .format(type(csv_path_or_buffer).__name__))
     try:
         if csv_path is not None and parse_result.scheme in ["http", "https"]:
-            response = requests.get(csv_path)
-            csv_fh = io.StringIO(response.text)
+            # Only the rows appended since the last load are downloaded
+            csv_fh = io.StringIO(remote.read(csv_path).decode("utf-8"))
         elif csv_path is not None:
             csv_fh = open(csv_path)
         with csv_fh:
             line = csv_fh.readline()
+            if not line:
+                raise InvalidCSVError("No data in csv %s" % csv_path_or_buffer)
             names = None if substrs_in_line(columns, line) else columns
             csv_fh.seek(0)
             # Supply column names if not present
@@ -190,6 +502,8 @@ def load_dataframe(csv_path_or_buffer):
             # column names in the csv leads to a row for data
             # with column names.
             df = pd.read_csv(csv_fh, names=names)
+    except pd.errors.EmptyDataError:
+        raise InvalidCSVError("No data in csv %s" % csv_path_or_buffer)
     except (OSError, IOError) as e:
         log.debug(e)
         if e.errno == errno.ENOENT:
@@ -201,10 +515,10 @@ def load_dataframe(csv_path_or_buffer):
                 % csv_path_or_buffer, e.errno)
 
     verify_dataframe(df, columns)
-    df_adjusted = adjust_from_csv(df)
-    return df_adjusted
+    return convert_counts(df)
 
 
+@metrics.timed("fto_graph.adjust_from_csv")
 def adjust_from_csv(fto_df):
     # type: (pd.DataFrame) -> pd.DataFrame
     """Adjust the fto Dataframe format from csv.
@@ -219,11 +533,53 @@ def adjust_from_csv(fto_df):
     dates = fto_df['Date']
     new_df = fto_df.drop("Date", axis=1)
     # Reindex dataframe based on date column
-    new_df.index = pd.to_datetime(dates, format='%m/%d/%y-%H')
+    new_df.index = parse_csv_dates(dates)
+    return adjust_pregnant_mothers(new_df)
+
+
+def adjust_pregnant_mothers(fto_df, minimum=None):
+    # type: (pd.DataFrame, Optional[int]) -> pd.DataFrame
+    """Correct the Pregnant Mothers column of `fto_df` in place.
+
+    Args:
+        minimum: The smallest count of the whole history `fto_df` is part
+            of, which decides the correction. Default: that of `fto_df`
+
+    Returns:
+        `fto_df`
+    """
+    if "Pregnant Mothers" not in fto_df:
+        return fto_df
+    if minimum is None:
+        minimum = fto_df["Pregnant Mothers"].min()
     # There is a bug where the number of pregnant mothers is thrown off by one
-    if new_df["Pregnant Mothers"].min() == 1:
-        new_df["Pregnant Mothers"] = (new_df["Pregnant Mothers"] - 1)
-    return new_df
+    if minimum == 1:
+        fto_df["Pregnant Mothers"] = (fto_df["Pregnant Mothers"] - 1)
+    return fto_df
+
+
+def parse_csv_dates(dates):
+    # type: (pd.Series) -> pd.DatetimeIndex
+    """Parse csv timestamp strings of hour, minute or second resolution.
+
+    A csv may mix resolutions when the sampling rate was changed, so each
+    timestamp length is parsed with its own format.
+
+    Raises:
+        InvalidCSVError if a timestamp has an unknown length.
+    """
+    lengths = dates.str.len()
+    unknown = set(lengths.unique()) - set(TIME_FORMATS_BY_LENGTH)
+    if unknown:
+        raise InvalidCSVError(
+            "Unrecognized date format in csv: %r"
+            % dates[lengths.isin(unknown)].iloc[0])
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    for length, date_format in TIME_FORMATS_BY_LENGTH.items():
+        mask = lengths == length
+        if mask.any():
+            parsed[mask] = pd.to_datetime(dates[mask], format=date_format)
+    return pd.DatetimeIndex(parsed, name=dates.name)
 
 
 def verify_dataframe(fto_df, columns):
@@ -243,6 +599,32 @@ def verify_dataframe(fto_df, columns):
                 "Column '%s' not present in input csv but should be" % (col))
 
 
+def convert_counts(fto_df):
+    # type: (pd.DataFrame) -> pd.DataFrame
+    """Store the integer count columns of `fto_df` as `ingest.COUNT_DTYPE`,
+    as every other loader does, in place.
+
+    Columns with missing values are left as floats.
+
+    Returns:
+        `fto_df`
+
+    Raises:
+        InvalidCSVError if a count does not fit the count dtype.
+    """
+    limits = np.iinfo(ingest.COUNT_DTYPE)
+    for col in fto_df.columns:
+        values = fto_df[col]
+        if col == "Date" or not pd.api.types.is_integer_dtype(values):
+            continue
+        if len(values) and (values.min() < limits.min or
+                            values.max() > limits.max):
+            raise InvalidCSVError(
+                "Column '%s' has counts out of range" % col)
+        fto_df[col] = values.astype(ingest.COUNT_DTYPE)
+    return fto_df
+
+
 def substrs_in_line(items, line):
     # type: (Iterable[str], str) -> bool
     """Returns True if `line` contains any item from `items` else False.
@@ -259,15 +641,21 @@ def substrs_in_line(items, line):
     return True
 
 
-def generate_figure(df):
-    # type: (pd.DataFrame) -> plt.Figure
+@metrics.timed("fto_graph.generate_figure")
+def generate_figure(df, method=downsample.DEFAULT_METHOD):
+    # type: (pd.DataFrame, Optional[str]) -> plt.Figure
     """Generates a matplotlib.figure.Figure from `df`.
 
     Takes the fto-data dataframe, plots Population, Birth Queue, and Pregnant
-    Mothers onto a matplotlib figure.
+    Mothers onto a matplotlib figure. Each line's gid is the column it
+    plots, see update_figure.
 
     Args:
-        df(pd.DataFrame): The fto dataframe index by datetime.
+        df(pd.DataFrame): The fto dataframe index by datetime, or
+            `fto.hourly.HourlyArrays`, whose lines are broken at gaps.
+        method(str|None): How to reduce each line to about the width of
+            the figure in pixels, see `fto.downsample.METHODS`. None plots
+            every sample. Default: min-max
 
     TODO:
         Remove 0 label for pregnant mothers
@@ -275,8 +663,10 @@ def generate_figure(df):
     Returns:
         The generated matplotlib figure.
     """
-    matplotlib.rcParams.update({'font.size': 22})
+    df = as_dataframe(df)
+    matplotlib.rcParams.update(FIGURE_RC)
     fig = plt.figure(figsize=(20, 15))
+    pixels = downsample.figure_pixels(fig)
 
     # Population
     pop_label = "Population"
@@ -284,7 +674,8 @@ def generate_figure(df):
     # Use 2/3 of grid
     ax = plt.subplot2grid((3, 1), (0, 0), rowspan=2, label=pop_label)
     ax.set_ylabel(pop_label, color=pop_color)
-    ax.plot(df['Population'], color=pop_color, clip_on=False, linewidth=5)
+    ax.plot(line_data(df, 'Population', pixels, method),
+            color=pop_color, clip_on=False, linewidth=5, gid='Population')
 
     # Birth Queue
     # Generate secordary axis for top subplot
@@ -292,31 +683,84 @@ def generate_figure(df):
     birth_queue_label = 'Birth Queue'
     birth_queue_color = 'b'
     ax_secondary.set_ylabel(birth_queue_label, color=birth_queue_color)
-    ax_secondary.plot(df['Birth Queue'],
-                      color=birth_queue_color, clip_on=False, linewidth=5)
+    ax_secondary.plot(line_data(df, 'Birth Queue', pixels, method),
+                      color=birth_queue_color, clip_on=False, linewidth=5,
+                      gid='Birth Queue')
 
     # Pregnant Mothers
     preg_label = "Pregnant Mothers"
     # Use lower 1/3 of graph
     ax_lower = plt.subplot2grid((3, 1), (2, 0), rowspan=1)
     ax_lower.set_ylabel(preg_label)
-    ax_lower.plot(df['Pregnant Mothers'],
-                  color='g', clip_on=False, linewidth=5)
+    ax_lower.plot(line_data(df, 'Pregnant Mothers', pixels, method),
+                  color='g', clip_on=False, linewidth=5,
+                  gid='Pregnant Mothers')
+    format_mothers_axis(ax_lower)
+
+    # Autotilt dates
+    fig.autofmt_xdate()
+
+    return fig
+
+
+@metrics.timed("fto_graph.update_figure")
+def update_figure(fig, df, method=downsample.DEFAULT_METHOD):
+    # type: (plt.Figure, pd.DataFrame, Optional[str]) -> plt.Figure
+    """Replace the data of a figure from generate_figure with `df`.
+
+    Only the line data, the axis limits and the Pregnant Mothers tick
+    labels change, which is much cheaper than building a new figure.
+
+    Returns:
+        `fig`
+    """
+    df = as_dataframe(df)
+    pixels = downsample.figure_pixels(fig)
+    for ax in fig.axes:
+        for line in ax.get_lines():
+            series = line_data(df, line.get_gid(), pixels, method)
+            line.set_data(series.index, series.values)
+        ax.relim()
+        ax.autoscale(enable=True)
+        if any(line.get_gid() == 'Pregnant Mothers'
+               for line in ax.get_lines()):
+            format_mothers_axis(ax)
+    return fig
+
 
+def as_dataframe(data):
+    # type: (Union[pd.DataFrame, hourly.HourlyArrays]) -> pd.DataFrame
+    """Return `data` as a DataFrame to plot.
+
+    HourlyArrays get a row of NaN at the start of each gap, which breaks
+    the lines there.
+    """
+    if isinstance(data, hourly.HourlyArrays):
+        return data.to_dataframe(mark_gaps=True)
+    return data
+
+
+def line_data(df, column, pixels, method):
+    # type: (pd.DataFrame, str, int, Optional[str]) -> pd.Series
+    """Return the samples of `column` to plot `pixels` wide."""
+    if method is None:
+        return df[column]
+    return downsample.downsample_series(df[column], pixels, method)
+
+
+def format_mothers_axis(ax_lower):
+    # type: (plt.Axes) -> None
+    """Set the y-axis limits and tick labels of the Pregnant Mothers axes."""
     # Start pregnant mothers y-axis at 0 even though there might not be
     # 0 pregnant mothers
     ax_lower.set_ylim(0, ax_lower.get_ylim()[1])
 
-    # Autotilt dates
-    fig.autofmt_xdate()
-
     # Remove 'half' mother labels which don't make sense
     # and 0 mother label which collides with the date formatting.
-    tick_labels = ["" if not tick.is_integer() or tick == 0 else int(tick)
-                   for tick in ax_lower.get_yticks()]
-    ax_lower.set_yticklabels(tick_labels)
-
-    return fig
+    # A formatter keeps the labels right when the ticks change.
+    ax_lower.yaxis.set_major_formatter(matplotlib.ticker.FuncFormatter(
+        lambda tick, _: "" if not float(tick).is_integer() or tick == 0
+        else "%d" % tick))
 
 
 if __name__ == "__main__":
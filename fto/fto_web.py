@@ -6,10 +6,11 @@ on the HTML canvas.
 """
 
 import argparse
+import logging
 
 
 # pylint: disable=unused-import
-from typing import IO, Union, AnyStr  # NOQA
+from typing import Any, Dict, IO, Optional, Tuple, Union, AnyStr  # NOQA
 import bokeh
 import bokeh.mpl
 import bokeh.io
@@ -23,16 +24,41 @@ from bokeh.models import HoverTool
 # pylint: disable=no-name-in-module
 from bokeh.palettes import Set1_3
 from bokeh.plotting import figure
+import numpy as np
 import pandas as pd
 import attr
 
+from . import downsample
+from . import hourly
 from . import load_dataframe
+from . import metrics
+
+# Columns drawn as lines, whose peaks downsampling keeps
+PLOTTED_COLUMNS = ['Population', 'Birth Queue', 'Pregnant Mothers']
+
+# Smallest first, integer dtypes bokeh sends base64 encoded instead of as
+# json lists
+COMPACT_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32)
+
+# Date format of the hover tooltip
+HOVER_DATE_FORMAT = '%m/%d/%y-%H'
 
 
 def main():
     """Cli interface to show resultant graph in browser."""
     # type () -> None
     vargs = parse_args()
+    if vargs.pop('verbose'):
+        logging.basicConfig(level=logging.DEBUG)
+        metrics.enable()
+    if vargs.pop('report_size'):
+        fto_df = load_dataframe(
+            vargs['csv_path_or_df'], incremental=vargs.pop('incremental'),
+            start=vargs.pop('start'), end=vargs.pop('end'))
+        vargs['csv_path_or_df'] = fto_df
+        full_size, lean_size = payload_sizes(fto_df)
+        print("ColumnDataSource payload: %d bytes, %d bytes lean (%.0f%%)"
+              % (full_size, lean_size, 100.0 * lean_size / full_size))
     layout = run(**vargs)
     bokeh.plotting.show(layout)
 
@@ -44,16 +70,49 @@ def parse_args():
         "Generate interactive web graph for fto data.")
     parser.add_argument(metavar="csv_path", dest="csv_path_or_df",
                         help="url or file system path to csv source data.")
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='cache the parsed csv and only parse newly appended rows')
+    parser.add_argument(
+        '--start', default=None,
+        help='first date to show, e.g. 2016-02-15. Default: all')
+    parser.add_argument(
+        '--end', default=None,
+        help='date to show up to, exclusive. Default: all')
+    parser.add_argument(
+        '--lean', action='store_true',
+        help='send only the plotted columns as compact binary arrays and '
+             'format the hover date in the browser')
+    parser.add_argument(
+        '--report-size', action='store_true',
+        help='print the data payload size with and without --lean')
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
     return vars(parser.parse_args())
 
 
-def run(csv_path_or_df):
-    # type: (Union[str, pd.DataFrame, IO[AnyStr]]) -> bokeh.layouts.LayoutDOM
+@metrics.timed("fto_web.run")
+def run(csv_path_or_df,                  # type: Union[str, pd.DataFrame, hourly.HourlyArrays, IO[AnyStr]]
+        incremental=False,               # type: bool
+        start=None,                      # type: Any
+        end=None,                        # type: Any
+        method=downsample.DEFAULT_METHOD,  # type: Optional[str]
+        lean=False                       # type: bool
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> bokeh.layouts.LayoutDOM
     """Reads fto data from resource and returns a bokeh object.
 
     Args:
-        csv_path_or_df: A path, url, DataFrame, or file-like object
-            that contains fto data.
+        csv_path_or_df: A path, url, DataFrame, `fto.hourly.HourlyArrays`
+            or file-like object that contains fto data.
+        incremental: If True, only parse csv rows appended since the last
+            run. See `fto.incremental`.
+        start: Only show rows from this date on. See `fto.load_dataframe`.
+        end: Only show rows before this date. See `fto.load_dataframe`.
+        method: How to reduce the rows to about the plot width, see
+            `fto.downsample.METHODS`. None keeps every row.
+        lean: If True, only send the plotted columns in compact binary
+            form, see lean_source_data.
 
     Returns:
         A bokeh objet which can be displayed in a jupyter notebook or
@@ -61,12 +120,16 @@ def run(csv_path_or_df):
     """
     if isinstance(csv_path_or_df, pd.DataFrame):
         fto_df = csv_path_or_df
+    elif isinstance(csv_path_or_df, hourly.HourlyArrays):
+        # Lines are broken at the gaps
+        fto_df = csv_path_or_df.to_dataframe(mark_gaps=True)
     else:
-        fto_df = load_dataframe(csv_path_or_df)
+        fto_df = load_dataframe(csv_path_or_df, incremental=incremental,
+                                start=start, end=end)
 
-    if "Date Formatted" not in fto_df.columns:
+    if not lean and "Date Formatted" not in fto_df.columns:
         fto_df["Date Formatted"] = format_bokeh_date(fto_df)
-    layout = generate_bokeh_layout(fto_df)
+    layout = generate_bokeh_layout(fto_df, method, lean)
 
     # It is in fact an iterable
     for child in layout.children:  # pylint: disable=not-an-iterable
@@ -75,15 +138,20 @@ def run(csv_path_or_df):
     return layout
 
 
-def generate_bokeh_layout(fto_df):
-    # type: (pd.DataFrame) -> bokeh.layouts.LayoutDOM
-    """Generate bokeh layout from data in given DataFrame."""
+def generate_bokeh_layout(fto_df, method=downsample.DEFAULT_METHOD,
+                          lean=False):
+    # type: (pd.DataFrame, Optional[str], bool) -> bokeh.layouts.LayoutDOM
+    """Generate bokeh layout from data in given DataFrame.
+
+    Only the rows needed to draw the lines `width` pixels wide are sent to
+    the browser unless `method` is None. See `run` for `lean`.
+    """
     width = 1600
     pop_color, birth_color, mother_color = Set1_3
-    source = bokeh.models.ColumnDataSource(fto_df)
+    source = create_source(plot_rows(fto_df, width, method), lean)
     mother_fig = generate_mother_figure(fto_df, source, mother_color, width)
 
-    fig_options = TopFigOptions(pop_color, birth_color, width)
+    fig_options = TopFigOptions(pop_color, birth_color, width, lean)
     top_fig = generate_top_figure(fto_df, mother_fig, source, fig_options)
     header = bokeh.models.Div(text="<h1>FTO Hourly Statistics</h1>")
     column = bokeh.layouts.column([header, top_fig, mother_fig])
@@ -173,13 +241,13 @@ def generate_top_figure(fto_df,       # type: pd.DataFrame
     top_fig.toolbar.logo = None
     vertical_positioner = bokeh.models.CrosshairTool(dimensions="height")
     top_fig.add_tools(vertical_positioner)
-    hover_tool = generate_hover_tool([pop_renderer])
+    hover_tool = generate_hover_tool([pop_renderer], options.lean)
     top_fig.add_tools(hover_tool)
     return top_fig
 
 
-def generate_hover_tool(renderers):
-    # type: (List[bokeh.model.renderers.Renderer]) -> HoverTool
+def generate_hover_tool(renderers, lean=False):
+    # type: (List[bokeh.model.renderers.Renderer], bool) -> HoverTool
     """Generate a hover tool which is tied to the all the given renderers.
 
     Added some custom javascript to:
@@ -189,6 +257,8 @@ def generate_hover_tool(renderers):
 
     Args:
         renderers: The renderers you want the hover tool to effect
+        lean: If True, format the Date timestamps in the browser instead
+            of showing the Date Formatted column.
 
     Returns:
         A hover tool that is tied to the given renderers
@@ -213,14 +283,17 @@ def generate_hover_tool(renderers):
 
         """)
 
+    date_field = "@Date{%s}" % HOVER_DATE_FORMAT if lean else \
+        "@{Date Formatted}"
+    formatters = {"Date": "datetime"} if lean else {}
     # This div is needed for the above javascript to work.
     tooltop_dom = """
     <div id="static-tooltip">
         <span>Population: @Population</span><br />
         <span>Birth Queue: @{Birth Queue}</span><br />
         <span>Pregnant Mothers: @{Pregnant Mothers}</span><br />
-        <span>Date: @{Date Formatted}</span><br />
-    </div>"""
+        <span>Date: %s</span><br />
+    </div>""" % date_field
     # vline allows the tooltip to be displayed verically even
     #   when not touching a line.
     hover = HoverTool(renderers=renderers,
@@ -228,10 +301,73 @@ def generate_hover_tool(renderers):
                       callback=callback,
                       line_policy="nearest",
                       show_arrow=False,
-                      tooltips=tooltop_dom)
+                      tooltips=tooltop_dom,
+                      formatters=formatters)
     return hover
 
 
+def plot_rows(fto_df, width, method=downsample.DEFAULT_METHOD):
+    # type: (pd.DataFrame, int, Optional[str]) -> pd.DataFrame
+    """Return the rows of `fto_df` needed to draw it `width` pixels wide."""
+    if method is None:
+        return fto_df
+    return downsample.downsample_frame(fto_df, width, PLOTTED_COLUMNS, method)
+
+
+def create_source(fto_df, lean=False):
+    # type: (pd.DataFrame, bool) -> bokeh.models.ColumnDataSource
+    """Create the ColumnDataSource of the plotted rows."""
+    if lean:
+        return bokeh.models.ColumnDataSource(data=lean_source_data(fto_df))
+    return bokeh.models.ColumnDataSource(fto_df)
+
+
+def lean_source_data(fto_df):
+    # type: (pd.DataFrame) -> Dict[str, np.ndarray]
+    """Return the plotted columns of `fto_df` as compact numpy arrays.
+
+    Date is sent as float64 milliseconds since the epoch, the unit of
+    bokeh datetime axes, and the counts in the smallest of
+    `COMPACT_DTYPES` which holds them. Bokeh encodes these arrays as
+    base64 rather than as json lists of numbers.
+    """
+    dates = fto_df.index.values.astype('datetime64[ms]').astype(np.int64)
+    data = {'Date': dates.astype(np.float64)}
+    for column in PLOTTED_COLUMNS:
+        data[column] = compact_array(fto_df[column].values)
+    return data
+
+
+def compact_array(values):
+    # type: (np.ndarray) -> np.ndarray
+    """Return integer `values` in the smallest dtype of `COMPACT_DTYPES`.
+
+    Other values are returned as float64.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu' and len(values):
+        low, high = values.min(), values.max()
+        for dtype in COMPACT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    return values.astype(np.float64)
+
+
+def payload_sizes(fto_df, method=downsample.DEFAULT_METHOD, width=1600):
+    # type: (pd.DataFrame, Optional[str], int) -> Tuple[int, int]
+    """Return the serialized size of the data source without and with lean.
+
+    Both are measured on the same downsampled rows.
+    """
+    plot_df = plot_rows(fto_df, width, method)
+    full_df = plot_df.assign(**{"Date Formatted": format_bokeh_date(plot_df)})
+    return tuple(
+        len(create_source(df, lean).to_json_string(
+            include_defaults=False).encode("utf-8"))
+        for df, lean in ((full_df, False), (plot_df, True)))
+
+
 def format_bokeh_date(fto_df):
     # type: (pd.DataFrame) -> pd.Series
     """Find Date on DateaFrame and return a human readable time format.
@@ -243,11 +379,10 @@ def format_bokeh_date(fto_df):
     Returns:
         A Series of human-readable date strings.
     """
-    date_format = '%m/%d/%y-%H'
     if "Date" in fto_df.columns:
         series = fto_df.Date
     else:
-        series = fto_df.index.strftime(date_format)
+        series = fto_df.index.strftime(HOVER_DATE_FORMAT)
     return series
 
 
@@ -259,6 +394,7 @@ class TopFigOptions(object):
     pop_color = attr.ib()
     birth_color = attr.ib()
     width = attr.ib()
+    lean = attr.ib(default=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+"""Fto samples on a dense hourly grid.
+
+`fto.load_dataframe` returns the samples indexed by their dates, with
+gaps wherever cron or the site failed. `HourlyArrays` instead keeps one
+array per column with a slot for every hour from the first sample to the
+last:
+
+- The hour `h`, counted since the epoch, is at position `h - start_hour`,
+  so finding a time and slicing a range take constant time.
+- A packed bitmask tells which hours hold a sample, and `gaps` lists the
+  runs of hours which do not.
+- `delta` and `spread_delta` know how many hours lie between samples, so
+  a change over a gap is not taken for a change within one hour.
+
+Counts are stored in the smallest unsigned dtype which holds them, and
+slices share the arrays of what they were sliced from.
+
+    from fto import hourly
+    arrays = hourly.load("fto-stats.csv")
+    arrays.slice("2024-01-01", "2024-02-01").spread_delta("Population")
+"""
+
+# pylint: disable=unused-import
+from typing import Any, Dict, List, Optional, Tuple  # NOQA
+import collections
+
+import numpy as np
+import pandas as pd
+
+from .partition import to_timestamp
+
+
+HOUR = 3600
+
+COLUMNS = ['Population', 'Birth Queue', 'Pregnant Mothers']
+
+
+def load(source, start=None, end=None):
+    # type: (Any, Any, Any) -> HourlyArrays
+    """Load `source` like `fto.load_dataframe` into HourlyArrays."""
+    # Imported here since fto.fto_graph depends on this module
+    from . import fto_graph
+    return HourlyArrays.from_dataframe(
+        fto_graph.load_dataframe(source, start=start, end=end))
+
+
+class HourlyArrays(object):
+    """Columns of counts with one slot per hour and a validity bitmask.
+
+    Args:
+        start_hour: Hours since the epoch of the first slot.
+        columns: Column name -> counts of each slot, zero in empty slots.
+        bits: The validity bitmask, packed with np.packbits.
+        bit_offset: Bit of `bits` of the first slot, for slices.
+        gaps: Runs of empty slots as rows of [first, stop) hours since the
+            epoch. Default: found from `bits`
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, start_hour, columns, bits, bit_offset=0, gaps=None):
+        # type: (int, Dict[str, np.ndarray], np.ndarray, int, Optional[np.ndarray]) -> None
+        self.start_hour = start_hour
+        self.columns = columns
+        self.bits = bits
+        self.bit_offset = bit_offset
+        self.length = len(next(iter(columns.values()))) if columns else 0
+        self._valid = None  # type: Optional[np.ndarray]
+        if gaps is None:
+            gaps = find_gaps(self.valid) + start_hour
+        self.gaps = gaps
+
+    @classmethod
+    def from_dataframe(cls, fto_df, columns=None):
+        # type: (pd.DataFrame, Optional[List[str]]) -> HourlyArrays
+        """Place the rows of `fto_df`, indexed by date, on the hourly grid.
+
+        Of several samples within one hour, the last is kept. Rows with a
+        NaN count, such as the gap rows of `to_dataframe(mark_gaps=True)`,
+        are not samples.
+
+        Raises:
+            ValueError if a count is negative or not a whole number.
+        """
+        if columns is None:
+            columns = [column for column in COLUMNS if column in fto_df]
+        if not fto_df.index.is_monotonic_increasing:
+            # Stable, so that the later of two rows of an hour still wins
+            fto_df = fto_df.sort_index(kind='mergesort')
+        if any(fto_df[column].dtype.kind == 'f' for column in columns):
+            present = fto_df[columns].notna().values.all(axis=1)
+            if not present.all():
+                fto_df = fto_df[present]
+        hours = (fto_df.index.values.astype('datetime64[s]').astype(np.int64)
+                 // HOUR)
+        start_hour = int(hours[0]) if len(hours) else 0
+        positions = hours - start_hour
+        length = int(positions[-1]) + 1 if len(hours) else 0
+        valid = np.zeros(length, dtype=bool)
+        valid[positions] = True
+        arrays = collections.OrderedDict()
+        for column in columns:
+            values = count_values(fto_df[column].values, column)
+            dtype = np.min_scalar_type(int(values.max())) if len(values) \
+                else np.uint8
+            arrays[column] = np.zeros(length, dtype=dtype)
+            # Later rows of the same hour overwrite earlier ones
+            arrays[column][positions] = values
+        return cls(start_hour, arrays, np.packbits(valid))
+
+    def __len__(self):
+        # type: () -> int
+        return self.length
+
+    def __getitem__(self, column):
+        # type: (str) -> np.ndarray
+        return self.columns[column]
+
+    @property
+    def valid(self):
+        # type: () -> np.ndarray
+        """Read-only boolean array of the slots which hold a sample.
+
+        Unpacked from the bitmask on first use.
+        """
+        if self._valid is None:
+            valid = np.unpackbits(
+                self.bits, count=self.bit_offset + self.length
+            )[self.bit_offset:].astype(bool)
+            valid.flags.writeable = False
+            self._valid = valid
+        return self._valid
+
+    @property
+    def times(self):
+        # type: () -> np.ndarray
+        """The datetime64 of every slot."""
+        return ((self.start_hour + np.arange(self.length, dtype=np.int64)) *
+                HOUR).astype('datetime64[s]').astype('datetime64[ns]')
+
+    @property
+    def nbytes(self):
+        # type: () -> int
+        """Bytes held by the arrays, including shared ones."""
+        return (sum(values.nbytes for values in self.columns.values()) +
+                self.bits.nbytes + self.gaps.nbytes)
+
+    def position(self, time):
+        # type: (Any) -> int
+        """Return the slot of `time`, which may be outside of the arrays.
+
+        See `fto.partition.to_timestamp` for the accepted times.
+        """
+        return int(to_timestamp(time)) // HOUR - self.start_hour
+
+    def is_valid(self, time):
+        # type: (Any) -> bool
+        """Return True if there is a sample in the hour of `time`."""
+        position = self.position(time)
+        if not 0 <= position < self.length:
+            return False
+        bit = self.bit_offset + position
+        return bool(self.bits[bit // 8] & (0x80 >> (bit % 8)))
+
+    def value(self, column, time):
+        # type: (str, Any) -> Optional[int]
+        """Return the count of `column` in the hour of `time` or None."""
+        if not self.is_valid(time):
+            return None
+        return int(self.columns[column][self.position(time)])
+
+    def slice(self, start=None, end=None):
+        # type: (Any, Any) -> HourlyArrays
+        """Return the hours of [`start`, `end`), sharing these arrays."""
+        first = 0 if start is None else self.position(start)
+        stop = self.length if end is None else self.position(end)
+        first = min(max(first, 0), self.length)
+        stop = min(max(stop, first), self.length)
+        bit = self.bit_offset + first
+        byte_stop = (self.bit_offset + stop + 7) // 8
+        start_hour = self.start_hour + first
+        gaps = self.gaps[self.gaps[:, 1].searchsorted(start_hour, 'right'):
+                         self.gaps[:, 0].searchsorted(start_hour + stop - first)]
+        return HourlyArrays(
+            start_hour,
+            collections.OrderedDict(
+                (column, values[first:stop])
+                for column, values in self.columns.items()),
+            self.bits[bit // 8:byte_stop], bit % 8,
+            np.clip(gaps, start_hour, start_hour + stop - first))
+
+    def delta(self, column):
+        # type: (str) -> Tuple[np.ndarray, np.ndarray]
+        """Return the change of `column` since the previous sample.
+
+        Returns:
+            Two float64 arrays with a slot per hour: the change and the
+            hours since the previous sample. Both are NaN in empty slots
+            and at the first sample.
+        """
+        positions = np.flatnonzero(self.valid)
+        values = self.columns[column][positions].astype(np.int64)
+        change = np.full(self.length, np.nan)
+        hours = np.full(self.length, np.nan)
+        change[positions[1:]] = np.diff(values)
+        hours[positions[1:]] = np.diff(positions)
+        return change, hours
+
+    def spread_delta(self, column):
+        # type: (str) -> np.ndarray
+        """Return the change of `column` in each hour.
+
+        A change between samples several hours apart is spread evenly
+        over those hours rather than given to the last one, so sums over
+        days or months split it between them. Hours up to the first
+        sample have no change.
+        """
+        positions = np.flatnonzero(self.valid)
+        spread = np.zeros(self.length)
+        if len(positions) < 2:
+            return spread
+        values = self.columns[column][positions].astype(np.int64)
+        spans = np.diff(positions)
+        spread[positions[0] + 1:positions[-1] + 1] = np.repeat(
+            np.diff(values) / spans.astype(np.float64), spans)
+        return spread
+
+    def to_dataframe(self, mark_gaps=False):
+        # type: (bool) -> pd.DataFrame
+        """Return the samples as a DataFrame indexed by Date.
+
+        Args:
+            mark_gaps: Add a row of NaN at the first hour of each gap, so
+                that plotted lines are broken there instead of joining
+                the samples on either side.
+        """
+        keep = self.valid
+        if mark_gaps:
+            keep = keep.copy()
+            keep[self.gaps[:, 0] - self.start_hour] = True
+        index = pd.DatetimeIndex(self.times[keep], name='Date')
+        frame = pd.DataFrame(collections.OrderedDict(
+            (column, values[keep]) for column, values in self.columns.items()),
+            index=index)
+        if mark_gaps and len(self.gaps):
+            frame = frame.astype(np.float64)
+            frame.loc[index[~self.valid[keep]]] = np.nan
+        return frame
+
+
+def count_values(values, column):
+    # type: (np.ndarray, str) -> np.ndarray
+    """Return the counts `values` of `column` as integers.
+
+    Raises:
+        ValueError if a count is negative or not a whole number.
+    """
+    if values.dtype.kind == 'f':
+        if not np.array_equal(values, np.floor(values)):
+            raise ValueError("%s has counts which are not whole numbers"
+                             % column)
+        values = values.astype(np.int64)
+    elif values.dtype.kind not in 'iub':
+        raise ValueError("%s has counts of type %s, expected numbers"
+                         % (column, values.dtype))
+    if len(values) and values.min() < 0:
+        raise ValueError("%s has negative counts" % column)
+    return values
+
+
+def find_gaps(valid):
+    # type: (np.ndarray) -> np.ndarray
+    """Return the runs of False in `valid` as rows of [first, stop)."""
+    edges = np.diff(np.concatenate([[1], valid.astype(np.int8), [1]]))
+    return np.stack([np.flatnonzero(edges == -1),
+                     np.flatnonzero(edges == 1)], axis=1).astype(np.int64)
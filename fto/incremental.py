@@ -0,0 +1,283 @@
+"""Incrementally load a growing fto statistics csv.
+
+The csv only ever grows at the end. `IncrementalLoader` remembers the
+byte offset up to which the csv has been parsed along with the resulting
+DataFrame, and on the next load only parses the bytes after that offset.
+
+The state is kept in a sidecar cache file so that it survives between
+processes. Local paths, file handles and http(s) urls are supported; urls
+are read with a HTTP Range request for the new tail, made conditional on
+the ETag of the last load so that an unchanged csv is not downloaded at
+all (see `fto.remote`).
+
+To detect a truncated or rewritten csv, the last `ANCHOR_SIZE` bytes
+before the offset are read again and compared with what was parsed. On a
+mismatch the whole csv is parsed again.
+"""
+
+import errno
+import hashlib
+import io
+import logging
+import os
+import pickle
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+# pylint: disable=unused-import
+from typing import Any, IO, List, Optional, Tuple, Union  # NOQA
+import pandas as pd
+
+from . import atomic
+from . import fto_graph
+from . import remote
+
+
+# Suffix of the sidecar cache written next to local csvs
+CACHE_SUFFIX = ".ftocache"
+
+# Bytes before the parsed offset which must be unchanged to reuse the cache
+ANCHOR_SIZE = 256
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+def load_dataframe(source, cache_path=None):
+    # type: (Union[str, IO], Optional[str]) -> pd.DataFrame
+    """Load the fto DataFrame of `source`, parsing only new rows.
+
+    Args:
+        source: A local path, http(s) url or a seekable file handle.
+        cache_path: Where to keep the sidecar cache. Default: see
+            default_cache_path
+
+    Returns:
+        The same DataFrame fto_graph.load_dataframe returns.
+    """
+    if cache_path is None:
+        cache_path = default_cache_path(source)
+    return IncrementalLoader(source, cache_path).load()
+
+
+def default_cache_path(source):
+    # type: (Union[str, IO]) -> Optional[str]
+    """Return the sidecar cache path for `source`.
+
+    Local csvs are cached next to the csv, urls in the user cache
+    directory, and handles next to the file they were opened from. Other
+    handles have no default cache.
+    """
+    if not isinstance(source, str):
+        source = getattr(source, "name", None)
+        if not isinstance(source, str):
+            return None
+    if is_url(source):
+        cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME",
+                           os.path.join(os.path.expanduser("~"), ".cache")),
+            "fto")
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return os.path.join(cache_dir, digest + CACHE_SUFFIX)
+    return source + CACHE_SUFFIX
+
+
+def is_url(source):
+    # type: (str) -> bool
+    """Return True if `source` is a http or https url."""
+    return urlparse(source).scheme in ["http", "https"]
+
+
+# pylint: disable=too-few-public-methods
+class LoaderState(object):
+    """What has been parsed of a csv so far.
+
+    Attributes:
+        names: The csv column names, including Date.
+        offset: Byte offset just after the last parsed row.
+        anchor: The bytes just before `offset`.
+        frame: The adjusted DataFrame of every parsed row.
+        mothers_min: Smallest raw Pregnant Mothers count, which decides
+            whether the off by one adjustment applies, or None before the
+            first row.
+        etag: ETag of the csv when it was last read from a url.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, names, offset, anchor, frame, mothers_min, etag=None):
+        # type: (List[str], int, bytes, pd.DataFrame, Optional[int], Optional[str]) -> None
+        self.names = names
+        self.offset = offset
+        self.anchor = anchor
+        self.frame = frame
+        self.mothers_min = mothers_min
+        self.etag = etag
+
+
+class IncrementalLoader(object):
+    """Loads a csv source, parsing only the rows added since the last load.
+
+    Keep an instance around to load a file handle or an uncached source
+    repeatedly; otherwise the state is read from and written to
+    `cache_path`.
+
+    Args:
+        source: A local path, http(s) url or a seekable file handle.
+        cache_path: Sidecar cache file, or None to keep state in memory.
+    """
+    def __init__(self, source, cache_path=None):
+        # type: (Union[str, IO], Optional[str]) -> None
+        self.source = source
+        self.cache_path = cache_path
+        self.state = self._read_cache()  # type: Optional[LoaderState]
+        # ETag of the last response of a url source
+        self.etag = None  # type: Optional[str]
+
+    def load(self):
+        # type: () -> pd.DataFrame
+        """Return the DataFrame of the whole csv, parsing only new rows.
+
+        Raises:
+            The errors of fto_graph.load_dataframe.
+        """
+        state = self.state
+        if state is not None:
+            start = state.offset - len(state.anchor)
+            # Caches written before ETags were kept have none
+            data, from_start = self._read(start, getattr(state, "etag", None))
+            if not from_start and data.startswith(state.anchor):
+                self.state = self._extend(state, data[len(state.anchor):])
+            else:
+                log.debug("%s was rewritten or cannot be read partially, "
+                          "reloading", self.source)
+                self.state = None
+                if not from_start:
+                    data, _ = self._read(0)
+        else:
+            data, _ = self._read(0)
+        if self.state is None:
+            self.state = self._parse(data)
+        if self.state is not state:
+            self.state.etag = self.etag
+            self._write_cache()
+        # Callers may add columns, do not let them leak into the cache
+        return self.state.frame.copy(deep=False)
+
+    def _read(self, start, etag=None):
+        # type: (int, Optional[str]) -> Tuple[bytes, bool]
+        """Read the source from byte `start` to the end.
+
+        A url is only read if it no longer has `etag`.
+
+        Returns:
+            The bytes read and whether they start at byte 0 although
+            `start` was later, which happens when the source cannot seek
+            or was truncated.
+        """
+        try:
+            if isinstance(self.source, str) and is_url(self.source):
+                return self._read_url(start, etag)
+            if isinstance(self.source, str):
+                with open(self.source, "rb") as csv_fh:
+                    return self._read_handle(csv_fh, start)
+            return self._read_handle(self.source, start)
+        except (OSError, IOError) as e:
+            log.debug(e)
+            if e.errno == errno.ENOENT:
+                raise fto_graph.CSVNotFoundError(
+                    "Could not find csv at %s" % self.source, e.errno)
+            raise fto_graph.CSVNotReadError(
+                "Could not retrieve data from csv %s" % self.source, e.errno)
+
+    def _read_url(self, start, etag=None):
+        # type: (int, Optional[str]) -> Tuple[bytes, bool]
+        """Fetch the url from byte `start` with a Range request, unless
+        it still has `etag`."""
+        tail = remote.fetch_tail(self.source, start, etag)
+        self.etag = tail.etag
+        if tail.not_modified:
+            # Unchanged, so the bytes from `start` are the anchor
+            return self.state.anchor, False
+        return tail.data, tail.from_start and start > 0
+
+    @staticmethod
+    def _read_handle(csv_fh, start):
+        # type: (IO, int) -> Tuple[bytes, bool]
+        """Read a (binary or text) handle from `start`."""
+        csv_fh = getattr(csv_fh, "buffer", csv_fh)
+        seekable = getattr(csv_fh, "seekable", lambda: False)()
+        if seekable:
+            csv_fh.seek(start)
+        data = csv_fh.read()
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        return data, not seekable and start > 0
+
+    @staticmethod
+    def _parse(data):
+        # type: (bytes) -> LoaderState
+        """Parse the complete rows of a whole csv."""
+        complete = data[:data.rfind(b"\n") + 1]
+        csv_df = fto_graph.read_csv_frame(io.StringIO(complete.decode("utf-8")))
+        mothers_min = (None if csv_df.empty else
+                       int(csv_df["Pregnant Mothers"].min()))
+        frame = fto_graph.adjust_from_csv(csv_df)
+        return LoaderState(list(csv_df.columns), len(complete),
+                           complete[-ANCHOR_SIZE:], frame, mothers_min)
+
+    def _extend(self, state, tail):
+        # type: (LoaderState, bytes) -> LoaderState
+        """Parse the complete rows of `tail` and append them to `state`."""
+        complete = tail[:tail.rfind(b"\n") + 1]
+        if not complete:
+            return state
+        csv_df = pd.read_csv(io.StringIO(complete.decode("utf-8")),
+                             names=state.names, header=None)
+        fto_graph.verify_dataframe(csv_df, state.names)
+        fto_graph.convert_counts(csv_df)
+        mothers_min = int(csv_df["Pregnant Mothers"].min())
+        # None before the first row, or NaN in caches written before that
+        if not pd.isna(state.mothers_min):
+            mothers_min = min(int(state.mothers_min), mothers_min)
+            if (mothers_min == 1) != (state.mothers_min == 1):
+                # The adjustment of earlier rows changes, parse everything
+                return self._parse(self._read(0)[0])
+        new_df = csv_df.drop("Date", axis=1)
+        new_df.index = fto_graph.parse_csv_dates(csv_df["Date"])
+        if mothers_min == 1:
+            new_df["Pregnant Mothers"] = new_df["Pregnant Mothers"] - 1
+        log.debug("Parsed %d new rows of %s", len(new_df), self.source)
+        return LoaderState(
+            state.names, state.offset + len(complete),
+            (state.anchor + complete)[-ANCHOR_SIZE:],
+            pd.concat([state.frame, new_df]) if len(state.frame) else new_df,
+            mothers_min)
+
+    def _read_cache(self):
+        # type: () -> Optional[LoaderState]
+        """Load the state from the sidecar cache if there is a valid one."""
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path, "rb") as cache_fh:
+                state = pickle.load(cache_fh)
+        except (OSError, IOError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError) as e:
+            log.debug("No usable cache at %s: %s", self.cache_path, e)
+            return None
+        return state if isinstance(state, LoaderState) else None
+
+    def _write_cache(self):
+        # type: () -> None
+        """Atomically replace the sidecar cache with the current state."""
+        if self.cache_path is None:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        try:
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with atomic.replacing(self.cache_path, "wb") as cache_fh:
+                pickle.dump(self.state, cache_fh, pickle.HIGHEST_PROTOCOL)
+        except (OSError, IOError) as e:
+            log.warning("Could not write cache %s: %s", self.cache_path, e)
@@ -0,0 +1,225 @@
+"""Vectorized ingest of fto statistics csvs.
+
+Every row of a fto csv has the same shape: a fixed-width `MM/DD/YY-HH`
+timestamp (optionally with `:MM` or `:MM:SS`) followed by three unsigned
+integers. Instead of tokenizing the file into python strings and parsing
+the dates with strptime, the whole file is viewed as a numpy byte buffer
+and each field is decoded with vectorized arithmetic at known offsets.
+
+Files which do not have this exact shape raise UnsupportedCSVError, in
+which case the caller should fall back to the generic pandas parser.
+"""
+
+import collections
+
+# pylint: disable=unused-import
+from typing import Any, Dict, List, Tuple  # NOQA
+import numpy as np
+import pandas as pd
+
+
+# Column names used when the csv has no header, as in fto_graph
+DEFAULT_COLUMNS = ['Date', 'Birth Queue', 'Population', 'Pregnant Mothers']
+
+# Length of each timestamp resolution, see fto.timeformat
+DATE_WIDTHS = (11, 14, 17)
+
+# Offset of each separator within the timestamp
+DATE_SEPARATORS = ((2, b'/'), (5, b'/'), (8, b'-'), (11, b':'), (14, b':'))
+
+COUNT_DTYPE = np.uint32
+
+# Digits of the largest `COUNT_DTYPE`
+MAX_DIGITS = len(str(np.iinfo(COUNT_DTYPE).max))
+
+# strptime's %y maps 69-99 to the 1900s and 00-68 to the 2000s
+PIVOT_YEAR = 69
+
+COMMA, NEWLINE, ZERO = ord(','), ord('\n'), ord('0')
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class UnsupportedCSVError(Error):
+    """Error when a csv does not have the fixed fto row layout."""
+    pass
+
+
+def read_csv(path):
+    # type: (str) -> pd.DataFrame
+    """Read the csv at `path` with the vectorized parser.
+
+    Returns:
+        The unadjusted fto DataFrame indexed by date, with uint32 count
+        columns in file order.
+
+    Raises:
+        UnsupportedCSVError if the file does not have the fto layout.
+        OSError/IOError if the file cannot be read.
+    """
+    with open(path, "rb") as csv_fh:
+        data = csv_fh.read()
+    return parse_csv(data)
+
+
+def parse_csv(data):
+    # type: (bytes) -> pd.DataFrame
+    """Parse the bytes of a fto csv. See read_csv."""
+    if b"\r" in data:
+        data = data.replace(b"\r", b"")
+    names, body_start = parse_header(data)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts, ends = line_bounds(buf, body_start)
+    if not len(starts):  # pylint: disable=len-as-condition
+        raise UnsupportedCSVError("No rows")
+    dates, date_width = decode_dates(buf, starts)
+    counts = decode_counts(buf, starts + date_width, ends)
+    columns = collections.OrderedDict(
+        (name, counts[:, column]) for column, name in enumerate(names[1:]))
+    index = pd.DatetimeIndex(dates.astype('datetime64[ns]'), name=names[0])
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def parse_header(data):
+    # type: (bytes) -> Tuple[List[str], int]
+    """Return the column names and the offset of the first row."""
+    end = data.find(b"\n")
+    end = len(data) if end == -1 else end
+    line = data[:end].decode("utf-8", "replace")
+    if not all(name in line for name in DEFAULT_COLUMNS):
+        return DEFAULT_COLUMNS, 0
+    names = [name.strip() for name in line.split(",")]
+    if len(names) != len(DEFAULT_COLUMNS) or names[0] != 'Date':
+        raise UnsupportedCSVError("Unexpected header %r" % line)
+    return names, end + 1
+
+
+def line_bounds(buf, body_start):
+    # type: (np.ndarray, int) -> Tuple[np.ndarray, np.ndarray]
+    """Return the start and end (exclusive) offsets of non-empty rows."""
+    newlines = np.flatnonzero(buf[body_start:] == NEWLINE) + body_start
+    if len(buf) > body_start and buf[-1] != NEWLINE:
+        newlines = np.append(newlines, len(buf))
+    starts = np.concatenate(([body_start], newlines[:-1] + 1))[:len(newlines)]
+    ends = newlines
+    nonempty = ends > starts
+    return starts[nonempty], ends[nonempty]
+
+
+def decode_dates(buf, starts):
+    # type: (np.ndarray, np.ndarray) -> Tuple[np.ndarray, np.ndarray]
+    """Decode the timestamp at each row start.
+
+    Returns:
+        The datetime64[s] timestamps and the width of each timestamp.
+
+    Raises:
+        UnsupportedCSVError if a timestamp is malformed or a field is out
+        of range, such as February 30th or hour 24.
+    """
+    width = np.zeros(len(starts), dtype=np.int64)
+    for candidate in DATE_WIDTHS:
+        ends = np.minimum(starts + candidate, len(buf) - 1)
+        width[(width == 0) & (buf[ends] == COMMA)] = candidate
+    if (width == 0).any():
+        raise UnsupportedCSVError("Unrecognized date width")
+    for offset, separator in DATE_SEPARATORS:
+        has_field = width > offset
+        if (buf[starts[has_field] + offset] != ord(separator)).any():
+            raise UnsupportedCSVError("Unexpected date separator")
+
+    def two_digits(offset, present):
+        # type: (int, np.ndarray) -> np.ndarray
+        """Decode the two digit field at `offset` of the `present` rows."""
+        index = np.where(present, starts + offset, starts)
+        tens = buf[index].astype(np.int16) - ZERO
+        ones = buf[index + 1].astype(np.int16) - ZERO
+        if (((tens < 0) | (tens > 9) | (ones < 0) | (ones > 9)) &
+                present).any():
+            raise UnsupportedCSVError("Non digit in date")
+        return np.where(present, 10 * tens + ones, 0)
+
+    def in_range(field, values, low, high):
+        # type: (str, np.ndarray, Any, Any) -> np.ndarray
+        """Check that `values` lie in [low, high], which strptime would."""
+        if ((values < low) | (values > high)).any():
+            raise UnsupportedCSVError("%s out of range" % field)
+        return values
+
+    every = np.ones(len(starts), dtype=bool)
+    year = two_digits(6, every)
+    year += np.where(year < PIVOT_YEAR, 2000, 1900).astype(np.int16)
+    months = (year - 1970) * 12 + in_range(
+        "Month", two_digits(0, every), 1, 12) - 1
+    del year
+    month_starts = months.astype('datetime64[M]')
+    del months
+    dates = month_starts.astype('datetime64[D]')
+    month_days = ((month_starts + 1).astype('datetime64[D]') - dates).astype(
+        np.int16)
+    del month_starts
+    dates += (in_range("Day", two_digits(3, every), 1, month_days) - 1).astype(
+        'timedelta64[D]')
+    del month_days
+    dates = dates.astype('datetime64[s]')
+    dates += in_range("Hour", two_digits(9, every), 0, 23).astype(
+        'timedelta64[h]')
+    dates += in_range("Minute", two_digits(12, width >= 14), 0, 59).astype(
+        'timedelta64[m]')
+    dates += in_range("Second", two_digits(15, width >= 17), 0, 59).astype(
+        'timedelta64[s]')
+    return dates, width
+
+
+def decode_counts(buf, date_ends, ends):
+    # type: (np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+    """Decode the three integers following each timestamp.
+
+    Each field is decoded one digit position at a time for every row at
+    once, stopping at the first non digit, which must be the separator.
+
+    Args:
+        buf: The csv bytes.
+        date_ends: Offset of the comma after each timestamp.
+        ends: Offset just after the last byte of each row.
+
+    Returns:
+        A (rows, 3) array of `COUNT_DTYPE`.
+
+    Raises:
+        UnsupportedCSVError if a row does not have three integers.
+    """
+    rows = len(date_ends)
+    counts = np.empty((rows, 3), dtype=COUNT_DTYPE)
+    # Pad so that reading every digit position past the last row stays
+    # in bounds
+    padded = np.append(buf, np.full(MAX_DIGITS + 3, NEWLINE, dtype=np.uint8))
+    separator = date_ends
+    for field in range(3):
+        field_start = separator + 1
+        separator = field_start.copy()
+        value = np.zeros(rows, dtype=np.int64)
+        active = np.ones(rows, dtype=bool)
+        length = 0
+        while active.any():
+            if length > MAX_DIGITS:
+                raise UnsupportedCSVError("Value out of range")
+            digit = padded[field_start + length].astype(np.int16) - ZERO
+            is_digit = (digit >= 0) & (digit <= 9)
+            stopped = active & ~is_digit
+            separator[stopped] = field_start[stopped] + length
+            active &= is_digit
+            value = np.where(active, value * 10 + digit, value)
+            length += 1
+        if (separator == field_start).any():
+            raise UnsupportedCSVError("Empty value")
+        expected = padded[separator] == COMMA if field < 2 else separator == ends
+        if not expected.all():
+            raise UnsupportedCSVError("Expected 3 values per row")
+        if (value > np.iinfo(COUNT_DTYPE).max).any():
+            raise UnsupportedCSVError("Value out of range")
+        counts[:, field] = value
+    return counts
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+"""Serve the interactive graph as a bokeh server app which stays current.
+
+The page is the `fto_web` layout of the newest rows of a csv, binary or
+partitioned store. Each browser session polls the store and sends only
+the rows appended since with `ColumnDataSource.stream`, dropping the
+oldest rows beyond a rollover limit, so the full data is never sent
+again. The plot ranges are widened from the new rows alone.
+
+    python -m fto live fto-stats.csv --port 5006
+
+`--synthetic` appends made up samples to the store from this process,
+to try the app without waiting for the scraper:
+
+    python -m fto live /tmp/live.csv --synthetic 1
+"""
+
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+
+# pylint: disable=unused-import
+from typing import Any, Dict, Optional  # NOQA
+import numpy as np
+import pandas as pd
+
+from . import binstore
+from . import daemon
+from . import downsample
+from . import fto_graph
+from . import incremental
+from . import metrics
+from . import timeformat
+
+
+DEFAULT_PORT = 5006
+
+# Rows kept in each browser, about a year of hourly samples
+DEFAULT_ROLLOVER = 24 * 366
+
+# Seconds between polls of the store
+DEFAULT_POLL = 5.0
+
+# Width of the plots in fto_web
+PLOT_WIDTH = 1600
+
+# Counts are streamed as int32, wide enough for any count, as bokeh appends
+# streamed values to the typed arrays sent first
+COUNT_DTYPE = np.int32
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+class Error(Exception):
+    """Base exception for this module"""
+    pass
+
+
+class EmptyStoreError(Error):
+    """The store has no rows to show"""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    vargs = parse_args()
+    if vargs.pop('verbose'):
+        log.setLevel(logging.DEBUG)
+        metrics.enable()
+    try:
+        run(**vargs)
+    except KeyboardInterrupt:
+        log.info("Stopped")
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'source', help='csv, binary or partitioned store to watch')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='port to listen on. Default: %d' % DEFAULT_PORT)
+    parser.add_argument(
+        '--allow-origin', dest='allow_origins', action='append',
+        default=None, help='host[:port] the page may be opened from besides '
+                           'localhost. May be repeated.')
+    parser.add_argument(
+        '--rollover', type=int, default=DEFAULT_ROLLOVER,
+        help='rows kept in the browser. Default: %d' % DEFAULT_ROLLOVER)
+    parser.add_argument(
+        '--poll', type=daemon.parse_interval, default=DEFAULT_POLL,
+        help='time between checks of the store, in seconds or with a s/m/h/d '
+             'suffix. Default: %gs' % DEFAULT_POLL)
+    parser.add_argument(
+        '--synthetic', type=daemon.parse_interval, default=None,
+        metavar='INTERVAL',
+        help='append a made up sample to the store every INTERVAL, '
+             'for trying the app out')
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
+    return vars(parser.parse_args())
+
+
+def run(source,                         # type: str
+        port=DEFAULT_PORT,              # type: int
+        allow_origins=None,             # type: Optional[list]
+        rollover=DEFAULT_ROLLOVER,      # type: int
+        poll=DEFAULT_POLL,              # type: float
+        synthetic=None                  # type: Optional[float]
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> None
+    """Serve the live graph of `source` until interrupted.
+
+    Args:
+        source: A csv, binary or partitioned store.
+        port: Port of the bokeh server.
+        allow_origins: Extra host[:port] allowed to open the page.
+        rollover: Rows kept in each browser.
+        poll: Seconds between checks of the store.
+        synthetic: If given, append a made up sample to `source` every
+            this many seconds. See SyntheticAppender.
+    """
+    # Imported here since bokeh is only needed to serve
+    from bokeh.application import Application
+    from bokeh.application.handlers.function import FunctionHandler
+    from bokeh.server.server import Server
+
+    if synthetic is not None:
+        appender = SyntheticAppender(source)
+        if not os.path.exists(source):
+            appender.backfill(DEFAULT_ROLLOVER // 10)
+        thread = threading.Thread(target=appender.run, args=(synthetic,))
+        thread.daemon = True
+        thread.start()
+
+    def make_document(doc):
+        # type: (Any) -> None
+        """Attach a LiveGraph of `source` to a new session document."""
+        LiveGraph(source, rollover).attach(doc, poll)
+
+    origins = ['localhost:%d' % port] + list(allow_origins or [])
+    server = Server({'/': Application(FunctionHandler(make_document))},
+                    port=port, allow_websocket_origin=origins)
+    server.start()
+    log.info("Serving %s on http://localhost:%d/", source, port)
+    server.io_loop.start()
+
+
+class StoreWatcher(object):
+    """Returns the rows appended to a store since the last call.
+
+    The store is only read when its size or modification time changed.
+    Csvs are read with `fto.incremental`, so only the new bytes are
+    parsed, and partitioned stores only open the newest months.
+    """
+    def __init__(self, source):
+        # type: (str) -> None
+        self.source = source
+        self.last_time = None  # type: Optional[int]
+        self.signature = None  # type: Optional[tuple]
+
+    def changed(self):
+        # type: () -> bool
+        """Return True if the store may have new rows."""
+        if incremental.is_url(self.source):
+            return True
+        try:
+            stat = os.stat(self.source)
+        except (OSError, IOError):
+            return False
+        signature = (stat.st_size, stat.st_mtime)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def new_rows(self):
+        # type: () -> pd.DataFrame
+        """Return the rows newer than those returned before.
+
+        The first call returns every row.
+        """
+        if not self.changed():
+            return pd.DataFrame()
+        start = None if self.last_time is None else self.last_time + 1
+        is_csv = (incremental.is_url(self.source) or
+                  os.path.isfile(self.source) and
+                  not binstore.is_binary_store(self.source))
+        rows = fto_graph.load_dataframe(self.source, incremental=is_csv,
+                                        start=start)
+        if len(rows):
+            self.last_time = int(
+                rows.index.values[-1].astype('datetime64[s]').astype(np.int64))
+        return rows
+
+
+class RangeTracker(object):
+    """Widens a bokeh Range1d to include the values of a column.
+
+    Only the new values are looked at, so the range never shrinks when
+    old rows roll over.
+
+    Args:
+        plot_range: The Range1d to update.
+        column: Column of the data source plotted against it.
+        fixed_start: If True, only the end is moved.
+    """
+    def __init__(self, plot_range, column, fixed_start=False):
+        # type: (Any, str, bool) -> None
+        self.plot_range = plot_range
+        self.column = column
+        self.fixed_start = fixed_start
+
+    def update(self, data):
+        # type: (Dict[str, np.ndarray]) -> None
+        """Widen the range to the values of `data`, the streamed columns."""
+        values = data[self.column]
+        start, end = self.plot_range.start, self.plot_range.end
+        if not self.fixed_start:
+            start = min(start, float(values.min()))
+        end = max(end, float(values.max()))
+        if (start, end) != (self.plot_range.start, self.plot_range.end):
+            self.plot_range.update(start=start, end=end, bounds=(start, end))
+
+
+class LiveGraph(object):
+    """The fto_web layout of a store for one session, kept current.
+
+    Args:
+        source: A csv, binary or partitioned store.
+        rollover: Rows kept in the data source.
+        method: Downsampling of the initial rows, see `fto.downsample`.
+    """
+    def __init__(self,
+                 source,                           # type: str
+                 rollover=DEFAULT_ROLLOVER,        # type: int
+                 method=downsample.DEFAULT_METHOD  # type: Optional[str]
+                 ):  # pylint: disable=bad-continuation
+        # type: (...) -> None
+        self.watcher = StoreWatcher(source)
+        self.rollover = rollover
+        self.method = method
+        self.layout = None  # type: Optional[Any]
+        self.data_source = None  # type: Optional[Any]
+        self.x_range = None  # type: Optional[Any]
+        self.trackers = []  # type: list
+
+    def create_layout(self):
+        # type: () -> Any
+        """Build the layout from the newest `rollover` rows of the store.
+
+        Raises:
+            EmptyStoreError if the store has no rows yet.
+        """
+        # Imported here since bokeh is only needed to serve
+        import bokeh.models
+        from . import fto_web
+        fto_df = self.watcher.new_rows()
+        if not len(fto_df):  # pylint: disable=len-as-condition
+            raise EmptyStoreError("No rows in %s" % self.watcher.source)
+        plot_df = fto_web.plot_rows(fto_df, PLOT_WIDTH, self.method)
+        plot_df = plot_df.iloc[-self.rollover:]
+        self.layout = fto_web.run(plot_df, method=None, lean=True)
+        _, top_fig, mother_fig = self.layout.children
+        self.data_source = self.layout.select_one(
+            {'type': bokeh.models.ColumnDataSource})
+        self.data_source.data = stream_data(plot_df)
+        dates = self.data_source.data['Date']
+        self.x_range = mother_fig.x_range
+        self.x_range.update(start=dates[0], end=dates[-1],
+                            bounds=(dates[0], dates[-1]))
+        self.trackers = [
+            RangeTracker(top_fig.y_range, 'Birth Queue'),
+            RangeTracker(top_fig.extra_y_ranges['population'], 'Population'),
+            RangeTracker(mother_fig.y_range, 'Pregnant Mothers',
+                         fixed_start=True),
+        ]
+        return self.layout
+
+    def attach(self, doc, poll=DEFAULT_POLL):
+        # type: (Any, float) -> None
+        """Add the layout to a bokeh document and poll every `poll` s."""
+        doc.add_root(self.create_layout())
+        doc.title = "FTO Hourly Statistics"
+        doc.add_periodic_callback(self.update, int(poll * 1000))
+
+    def update(self):
+        # type: () -> int
+        """Stream the rows appended to the store since the last update.
+
+        Returns:
+            The number of rows streamed.
+        """
+        rows = self.watcher.new_rows()
+        if not len(rows):  # pylint: disable=len-as-condition
+            return 0
+        data = stream_data(rows)
+        previous_last = self.data_source.data['Date'][-1]
+        self.data_source.stream(data, rollover=self.rollover)
+        for tracker in self.trackers:
+            tracker.update(data)
+        self.follow(previous_last)
+        log.debug("Streamed %d rows", len(rows))
+        return len(rows)
+
+    def follow(self, previous_last):
+        # type: (float) -> None
+        """Move the x range along with the data.
+
+        A view which showed the newest row keeps showing it, and one which
+        started at the oldest row starts at the new oldest row. Zoomed in
+        views elsewhere are left alone.
+        """
+        dates = self.data_source.data['Date']
+        first, last = float(dates[0]), float(dates[-1])
+        start, end = self.x_range.start, self.x_range.end
+        bounds_start = self.x_range.bounds[0]
+        if start <= bounds_start:
+            start = first
+        if end >= previous_last:
+            end = last
+        self.x_range.update(start=max(start, first), end=end,
+                            bounds=(first, last))
+
+
+def stream_data(fto_df):
+    # type: (pd.DataFrame) -> Dict[str, np.ndarray]
+    """Return the data source columns of `fto_df` for streaming.
+
+    Like `fto_web.lean_source_data`, with every count as `COUNT_DTYPE` so
+    that the arrays in the browser can hold any appended value.
+    """
+    # Imported here since bokeh is only needed to serve
+    from . import fto_web
+    dates = fto_df.index.values.astype('datetime64[ms]').astype(np.int64)
+    data = {'Date': dates.astype(np.float64)}
+    for column in fto_web.PLOTTED_COLUMNS:
+        data[column] = fto_df[column].values.astype(COUNT_DTYPE)
+    return data
+
+
+class SyntheticAppender(object):
+    """Appends made up samples to a store, as the daemon would.
+
+    Samples follow a random walk from the newest row of the store and are
+    one `step` apart, so that a store can be grown faster than real time.
+
+    Args:
+        store: A csv, binary or partitioned store, see `daemon.append_line`.
+        step: Seconds between the timestamps of samples. Default: 1 hour
+        seed: Seed of the random walk.
+    """
+    def __init__(self, store, step=3600, seed=None):
+        # type: (str, int, Optional[int]) -> None
+        self.store = store
+        self.step = step
+        self.resolution = timeformat.resolution_for_interval(step)
+        self.random = random.Random(seed)
+        self.time = None  # type: Optional[int]
+        self.values = [300, 100, 10]
+        if os.path.exists(store):
+            last = fto_graph.load_dataframe(store).iloc[-1:]
+            if len(last):
+                self.time = int(last.index.values[0].astype(
+                    'datetime64[s]').astype(np.int64))
+                self.values = [int(last[column].iloc[0]) for column in
+                               ('Population', 'Birth Queue', 'Pregnant Mothers')]
+
+    def next_line(self):
+        # type: () -> str
+        """Return the next csv line of the walk."""
+        if self.time is None:
+            self.time = int(time.time()) // self.step * self.step
+        else:
+            self.time += self.step
+        self.values = [max(0, value + self.random.randint(-3, 3))
+                       for value in self.values]
+        return "%s,%d,%d,%d" % ((timeformat.format_time(
+            self.time, self.resolution),) + tuple(self.values))
+
+    def append(self):
+        # type: () -> str
+        """Append the next sample to the store and return its csv line."""
+        line = self.next_line()
+        daemon.append_line(self.store, line)
+        return line
+
+    def backfill(self, count):
+        # type: (int) -> None
+        """Append `count` samples ending about now."""
+        self.time = (int(time.time()) // self.step - count) * self.step
+        for _ in range(count):
+            self.append()
+
+    def run(self, interval):
+        # type: (float) -> None
+        """Append a sample every `interval` seconds, forever."""
+        while True:
+            time.sleep(interval)
+            log.debug("Appended %s", self.append())
+
+
+if __name__ == "__main__":
+    main()
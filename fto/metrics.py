@@ -0,0 +1,355 @@
+"""Timing spans and counters of where fto spends its time.
+
+Instrumented code times its stages and counts its events:
+
+    with metrics.span("fto_graph.savefig"):
+        figure.savefig(output_filename)
+    metrics.count("scrape_fto.page_cache_hits")
+
+or times whole functions with the `timed` decorator. Nothing is recorded
+until `enable` is called, which the --verbose option of the commands does,
+as does setting the FTO_METRICS environment variable to anything but 0.
+Until then `span` returns a shared no-op context manager and `count`
+returns at once, so instrumented code only pays for a function call.
+
+Once enabled, the totals of each span are logged when the process exits
+and written to the files named by these environment variables:
+
+- FTO_METRICS_LOG: a json line per finished span, appended as it ends.
+- FTO_METRICS_TEXTFILE: the totals in the Prometheus text format, for the
+  textfile collector of the node exporter, which only reads files ending
+  in .prom. The file is replaced atomically by `flush`, which the daemon
+  calls after each sample, and at exit.
+
+Setting either of them also enables recording.
+"""
+
+import atexit
+import collections
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# pylint: disable=unused-import
+from typing import Any, Callable, Dict, List, Optional, Tuple  # NOQA
+
+from . import atomic
+
+
+ENV_ENABLE = "FTO_METRICS"
+ENV_LOG = "FTO_METRICS_LOG"
+ENV_TEXTFILE = "FTO_METRICS_TEXTFILE"
+
+# Prefix of the Prometheus metric names
+PREFIX = "fto"
+
+# The Registry recording spans and counters, None while disabled
+_registry = None  # type: Optional[Registry]
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+def enable(log_path=None, textfile_path=None):
+    # type: (Optional[str], Optional[str]) -> Registry
+    """Start recording spans and counters, if not already recording.
+
+    Args:
+        log_path: File to append a json line per span to. Default: the
+            FTO_METRICS_LOG environment variable, or no log.
+        textfile_path: Prometheus textfile to write the totals to.
+            Default: the FTO_METRICS_TEXTFILE environment variable, or
+            no textfile.
+
+    Returns:
+        The Registry recording them.
+    """
+    global _registry  # pylint: disable=global-statement
+    if _registry is None:
+        _registry = Registry(log_path or os.environ.get(ENV_LOG),
+                             textfile_path or os.environ.get(ENV_TEXTFILE))
+        atexit.register(_registry.close)
+    return _registry
+
+
+def disable():
+    # type: () -> None
+    """Stop recording, writing out what was recorded so far."""
+    global _registry  # pylint: disable=global-statement
+    registry, _registry = _registry, None
+    if registry is not None:
+        atexit.unregister(registry.close)
+        registry.close()
+
+
+def enabled():
+    # type: () -> bool
+    """Return True if spans and counters are being recorded."""
+    return _registry is not None
+
+
+def enabled_by_environment(environ=None):
+    # type: (Optional[Dict[str, str]]) -> bool
+    """Return True if the environment asks for recording."""
+    if environ is None:
+        environ = os.environ
+    return (environ.get(ENV_ENABLE, "0") not in ("", "0") or
+            bool(environ.get(ENV_LOG)) or bool(environ.get(ENV_TEXTFILE)))
+
+
+def span(name):
+    # type: (str) -> Any
+    """Return a context manager timing its block as the span `name`."""
+    if _registry is None:
+        return NULL_SPAN
+    return Span(_registry, name)
+
+
+def count(name, amount=1):
+    # type: (str, int) -> None
+    """Add `amount` to the counter `name`."""
+    if _registry is not None:
+        _registry.count(name, amount)
+
+
+def timed(name):
+    # type: (str) -> Callable[[Callable], Callable]
+    """Decorate a function to time each call as the span `name`.
+
+    Generators would only be timed until they are created, time their
+    body with `span` instead.
+    """
+    def decorate(func):
+        # type: (Callable) -> Callable
+        """Wrap `func`."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # type: (*Any, **Any) -> Any
+            """Call `func` in a span while recording."""
+            if _registry is None:
+                return func(*args, **kwargs)
+            with Span(_registry, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def flush():
+    # type: () -> None
+    """Write the Prometheus textfile, if recording to one."""
+    if _registry is not None:
+        _registry.flush()
+
+
+class NullSpan(object):
+    """The span returned while not recording, which does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        # type: () -> NullSpan
+        return self
+
+    def __exit__(self, *exc_info):
+        # type: (*Any) -> bool
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span(object):
+    """Times a block and records it in a Registry when the block ends.
+
+    Spans started within the block of another span of the same thread
+    are logged with that span as their parent.
+    """
+    __slots__ = ('registry', 'name', 'parent', 'began', 'start')
+
+    def __init__(self, registry, name):
+        # type: (Registry, str) -> None
+        self.registry = registry
+        self.name = name
+        self.parent = None  # type: Optional[str]
+        self.began = 0.0
+        self.start = 0.0
+
+    def __enter__(self):
+        # type: () -> Span
+        stack = self.registry.stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.began = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # type: (Any, Any, Any) -> bool
+        seconds = time.perf_counter() - self.start
+        self.registry.stack().pop()
+        self.registry.record(self.name, self.parent, self.began, seconds,
+                             exc_type is not None)
+        return False
+
+
+# pylint: disable=too-few-public-methods
+class SpanTotals(object):
+    """Calls, failed calls, total and longest seconds of one span."""
+    __slots__ = ('calls', 'errors', 'seconds', 'max_seconds')
+
+    def __init__(self):
+        # type: () -> None
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class Registry(object):
+    """Totals of the spans and counters recorded in this process.
+
+    Args:
+        log_path: File to append a json line per finished span to.
+        textfile_path: File to write the Prometheus text format to.
+    """
+    def __init__(self, log_path=None, textfile_path=None):
+        # type: (Optional[str], Optional[str]) -> None
+        self.log_path = log_path
+        self.textfile_path = textfile_path
+        self.spans = collections.OrderedDict()  # type: Dict[str, SpanTotals]
+        self.counters = collections.OrderedDict()  # type: Dict[str, int]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._log_fh = None  # type: Optional[Any]
+        if log_path is not None:
+            # Line buffered so that each span is written when it ends
+            self._log_fh = open(log_path, "a", buffering=1)
+
+    def stack(self):
+        # type: () -> List[str]
+        """Return the names of the open spans of this thread."""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def record(self, name, parent, began, seconds, failed=False):
+        # type: (str, Optional[str], float, float, bool) -> None
+        """Add a finished span to the totals and the log."""
+        with self._lock:
+            totals = self.spans.get(name)
+            if totals is None:
+                totals = self.spans[name] = SpanTotals()
+            totals.calls += 1
+            totals.errors += failed
+            totals.seconds += seconds
+            totals.max_seconds = max(totals.max_seconds, seconds)
+            if self._log_fh is not None:
+                self._log_fh.write(json.dumps(collections.OrderedDict([
+                    ('time', round(began, 6)),
+                    ('span', name),
+                    ('parent', parent),
+                    ('seconds', round(seconds, 6)),
+                    ('error', failed),
+                    ('pid', os.getpid()),
+                ])) + "\n")
+
+    def count(self, name, amount=1):
+        # type: (str, int) -> None
+        """Add `amount` to the counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def prometheus_text(self):
+        # type: () -> str
+        """Return the totals in the Prometheus text exposition format."""
+        with self._lock:
+            spans = [(name, (totals.calls, totals.errors, totals.seconds,
+                             totals.max_seconds))
+                     for name, totals in self.spans.items()]
+            counters = list(self.counters.items())
+        lines = []
+        families = (
+            ("span_calls_total", "counter", "Finished spans.", 0),
+            ("span_errors_total", "counter",
+             "Spans ended by an exception.", 1),
+            ("span_seconds_total", "counter", "Seconds spent in spans.", 2),
+            ("span_max_seconds", "gauge", "Longest span in seconds.", 3),
+        )
+        for family, kind, description, field in families:
+            if not spans:
+                break
+            metric = "%s_%s" % (PREFIX, family)
+            lines.append("# HELP %s %s" % (metric, description))
+            lines.append("# TYPE %s %s" % (metric, kind))
+            for name, values in spans:
+                lines.append('%s{span="%s"} %s' % (
+                    metric, escape_label(name), format_value(values[field])))
+        for name, value in counters:
+            metric = "%s_%s_total" % (PREFIX, metric_name(name))
+            lines.append("# HELP %s Count of %s." % (metric, name))
+            lines.append("# TYPE %s counter" % metric)
+            lines.append("%s %d" % (metric, value))
+        return "".join(line + "\n" for line in lines)
+
+    def flush(self):
+        # type: () -> None
+        """Replace the textfile with the current totals."""
+        if self.textfile_path is None:
+            return
+        atomic.write_text(self.textfile_path, self.prometheus_text())
+
+    def summary(self):
+        # type: () -> List[str]
+        """Return a line per span and counter, slowest spans first."""
+        with self._lock:
+            spans = sorted(self.spans.items(),
+                           key=lambda item: -item[1].seconds)
+            lines = ["%-36s %6d calls %10.3fs total %10.3fs max%s" % (
+                name, totals.calls, totals.seconds, totals.max_seconds,
+                " %d failed" % totals.errors if totals.errors else "")
+                     for name, totals in spans]
+            lines.extend("%-36s %6d" % item for item in self.counters.items())
+        return lines
+
+    def close(self):
+        # type: () -> None
+        """Log the summary, write the textfile and close the log."""
+        for line in self.summary():
+            log.info("%s", line)
+        try:
+            self.flush()
+        except (IOError, OSError) as e:
+            log.warning("Could not write metrics to %s: %s",
+                        self.textfile_path, e)
+        with self._lock:
+            if self._log_fh is not None:
+                self._log_fh.close()
+                self._log_fh = None
+
+
+def metric_name(name):
+    # type: (str) -> str
+    """Return `name` with the characters invalid in metric names as _."""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def escape_label(value):
+    # type: (str) -> str
+    """Escape a Prometheus label value."""
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def format_value(value):
+    # type: (float) -> str
+    """Format a sample value without losing precision."""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+if enabled_by_environment():
+    enable()
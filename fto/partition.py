@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+"""Time partitioned columnar store for fto statistics.
+
+A store is a directory with one compressed numpy archive per month,
+`YYYY-MM.npz`, holding one array per column:
+
+    time              int64   UTC unix timestamp in seconds, ascending
+    population        uint32
+    birth_queue       uint32
+    pregnant_mothers  uint32
+
+`load_dataframe` only opens the months which overlap the requested time
+range and only reads the requested columns of those, so loading the
+recent data does not get slower as more months are archived.
+
+A `store.json` file next to the partitions marks the directory as a store
+and keeps what is known about the whole history, such as the smallest
+Pregnant Mothers count, which loading a few months cannot tell.
+"""
+
+import argparse
+import calendar
+import collections
+import datetime
+import json
+import os
+import re
+
+# pylint: disable=unused-import
+from typing import Any, Iterable, List, Optional, Tuple, Union  # NOQA
+import numpy as np
+
+from . import atomic
+from . import binstore
+from .timeformat import TIME_FORMATS, format_time, parse_time, resolution_of
+
+
+# Conventional file extension of partitions
+SUFFIX = ".npz"
+
+PARTITION_PATTERN = re.compile(r"^(\d{4})-(\d{2})\.npz$")
+
+# Metadata of the whole store, which also marks a directory as a store
+METADATA_NAME = "store.json"
+
+# DataFrame column -> array name
+FIELDS = dict((column, field) for field, column in binstore.COLUMNS)
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class InvalidPartitionError(Error):
+    """Error when a partition does not hold the expected arrays."""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to convert between csvs and partitioned stores."""
+    vargs = parse_args()
+    command = vargs.pop('command')
+    count = command(**vargs)
+    print("%s => %s (%d rows)" % (vargs['source'], vargs['destination'], count))
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command_name')
+    subparsers.required = True
+    from_csv = subparsers.add_parser(
+        'from-csv', help='import a csv or binary store into a partitioned '
+                         'store, replacing rows with the same timestamp')
+    from_csv.set_defaults(command=csv_to_partitions)
+    to_csv = subparsers.add_parser(
+        'to-csv', help='export a partitioned store to a csv')
+    to_csv.set_defaults(command=partitions_to_csv)
+    for subparser in (from_csv, to_csv):
+        subparser.add_argument('source')
+        subparser.add_argument('destination')
+    to_csv.add_argument(
+        '--start', help='first date to export, e.g. 2016-02-15. Default: all')
+    to_csv.add_argument(
+        '--end', help='date to export up to, exclusive. Default: all')
+    to_csv.add_argument(
+        '--resolution', choices=sorted(TIME_FORMATS), default=None,
+        help='timestamp precision. Default: the coarsest which fits')
+    vargs = vars(parser.parse_args())
+    del vargs['command_name']
+    return vargs
+
+
+def is_partitioned_store(path):
+    # type: (str) -> bool
+    """Return True if `path` is a store: a directory with the metadata
+    file or at least one partition."""
+    if not os.path.isdir(path):
+        return False
+    if os.path.isfile(os.path.join(path, METADATA_NAME)):
+        return True
+    return any(PARTITION_PATTERN.match(name) for name in os.listdir(path))
+
+
+def read_metadata(store):
+    # type: (str) -> dict
+    """Return the metadata of `store`, empty if it has none."""
+    try:
+        with open(os.path.join(store, METADATA_NAME)) as metadata_fh:
+            metadata = json.load(metadata_fh)
+    except (OSError, IOError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def write_metadata(store, metadata):
+    # type: (str, dict) -> None
+    """Atomically replace the metadata of `store`."""
+    with atomic.replacing(os.path.join(store, METADATA_NAME)) as metadata_fh:
+        json.dump(metadata, metadata_fh, sort_keys=True)
+
+
+def pregnant_mothers_min(store):
+    # type: (str) -> Optional[int]
+    """Return the smallest raw Pregnant Mothers count in all of `store`.
+
+    It decides the off by one correction of
+    `fto_graph.adjust_pregnant_mothers` for the whole history, whichever
+    months are loaded. It is kept in the metadata by write_records, and
+    found once by reading every partition for stores written before.
+
+    Returns:
+        The count, or None if the store is empty.
+    """
+    metadata = read_metadata(store)
+    if 'pregnant_mothers_min' in metadata:
+        return metadata['pregnant_mothers_min']
+    mothers = load_arrays(store, fields=['pregnant_mothers'])[
+        'pregnant_mothers']
+    minimum = int(mothers.min()) if len(mothers) else None
+    metadata['pregnant_mothers_min'] = minimum
+    try:
+        write_metadata(store, metadata)
+    except (OSError, IOError):
+        # A read-only store is scanned again next time
+        pass
+    return minimum
+
+
+def partition_path(store, year, month):
+    # type: (str, int, int) -> str
+    """Return the path of the partition holding `year`-`month`."""
+    return os.path.join(store, "%04d-%02d%s" % (year, month, SUFFIX))
+
+
+def list_partitions(store):
+    # type: (str) -> List[Tuple[Tuple[int, int], str]]
+    """Return ((year, month), path) of every partition, oldest first."""
+    partitions = []
+    for name in os.listdir(store):
+        match = PARTITION_PATTERN.match(name)
+        if match is not None:
+            month = (int(match.group(1)), int(match.group(2)))
+            partitions.append((month, os.path.join(store, name)))
+    return sorted(partitions)
+
+
+def month_bounds(year, month):
+    # type: (int, int) -> Tuple[int, int]
+    """Return the unix timestamps of the start of the month and the next."""
+    next_year, next_month = divmod(12 * year + month, 12)
+    return (calendar.timegm((year, month, 1, 0, 0, 0)),
+            calendar.timegm((next_year, next_month + 1, 1, 0, 0, 0)))
+
+
+def to_timestamp(value):
+    # type: (Any) -> Optional[int]
+    """Convert a date bound to a unix timestamp in seconds.
+
+    Args:
+        value: None, a unix timestamp, a datetime (naive ones are UTC) or
+            a string pandas can parse such as '2016-02-15'.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    import pandas as pd
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return calendar.timegm(timestamp.to_pydatetime().timetuple())
+
+
+def load_arrays(store, start=None, end=None, fields=None):
+    # type: (str, Any, Any, Optional[Iterable[str]]) -> collections.OrderedDict
+    """Read the arrays of the rows in [`start`, `end`) from `store`.
+
+    Args:
+        store: Path to the store directory.
+        start: First time to include, see to_timestamp. Default: the oldest
+        end: Time to stop at, exclusive. Default: the newest
+        fields: Array names to read besides 'time'. Default: every count
+
+    Returns:
+        An ordered dict of 'time' followed by `fields` to concatenated
+        arrays.
+
+    Raises:
+        InvalidPartitionError if a partition lacks one of the arrays.
+    """
+    start, end = to_timestamp(start), to_timestamp(end)
+    if fields is None:
+        fields = [field for field, _ in binstore.COLUMNS]
+    names = ['time'] + list(fields)
+    parts = dict((name, []) for name in names)  # type: dict
+    for (year, month), path in list_partitions(store):
+        month_start, month_end = month_bounds(year, month)
+        if ((start is not None and month_end <= start) or
+                (end is not None and month_start >= end)):
+            continue
+        with np.load(path) as partition:
+            missing = set(names) - set(partition.files)
+            if missing:
+                raise InvalidPartitionError(
+                    "%s lacks %s" % (path, ", ".join(sorted(missing))))
+            times = partition['time']
+            first = 0 if start is None else times.searchsorted(start)
+            last = len(times) if end is None else times.searchsorted(end)
+            for name in names:
+                array = times if name == 'time' else partition[name]
+                parts[name].append(array[first:last])
+    arrays = collections.OrderedDict()
+    for name in names:
+        dtype = binstore.RECORD_DTYPE[name]
+        arrays[name] = (np.concatenate(parts[name]) if parts[name]
+                        else np.empty(0, dtype=dtype))
+    return arrays
+
+
+def load_dataframe(store, start=None, end=None, columns=None):
+    # type: (str, Any, Any, Optional[Iterable[str]]) -> pd.DataFrame
+    """Load the rows in [`start`, `end`) of `store` as a DataFrame.
+
+    Only the partitions overlapping the range and the requested columns
+    are read. No adjustments are made to the raw counts.
+
+    Args:
+        store: Path to the store directory.
+        start: First time to include: a unix timestamp, datetime (naive
+            ones are UTC) or date string. Default: the oldest
+        end: Time to stop at, exclusive. Default: the newest
+        columns: DataFrame columns to load, e.g. ['Population'].
+            Default: all of them
+
+    Returns:
+        A `pd.DataFrame` with the same columns and index as
+        `fto_graph.load_dataframe` returns for a csv.
+
+    Raises:
+        ValueError if a column is unknown.
+    """
+    import pandas as pd
+    if columns is None:
+        columns = [column for _, column in binstore.COLUMNS]
+    unknown = [column for column in columns if column not in FIELDS]
+    if unknown:
+        raise ValueError("Unknown columns %s, expected some of %s"
+                         % (unknown, sorted(FIELDS)))
+    arrays = load_arrays(store, start, end,
+                         [FIELDS[column] for column in columns])
+    index = pd.DatetimeIndex(
+        arrays['time'].astype('datetime64[s]').astype('datetime64[ns]'),
+        name='Date')
+    data = collections.OrderedDict(
+        (column, arrays[FIELDS[column]]) for column in columns)
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def write_records(store, records):
+    # type: (str, np.ndarray) -> int
+    """Merge `binstore.RECORD_DTYPE` records into the partitions of `store`.
+
+    Records replace stored rows with the same timestamp. Every touched
+    partition is rewritten atomically, and then the metadata.
+
+    Returns:
+        The number of partitions written.
+    """
+    records = np.asarray(records, dtype=binstore.RECORD_DTYPE)
+    if not os.path.isdir(store):
+        os.makedirs(store)
+    minimum = pregnant_mothers_min(store)
+    if len(records):
+        new_minimum = int(records['pregnant_mothers'].min())
+        minimum = new_minimum if minimum is None else min(minimum, new_minimum)
+    months = records['time'].astype('datetime64[s]').astype('datetime64[M]')
+    written = 0
+    for month in np.unique(months):
+        date = month.astype(datetime.datetime)
+        path = partition_path(store, date.year, date.month)
+        merged = records[months == month]
+        if os.path.exists(path):
+            merged = np.concatenate([read_records(path), merged])
+        # Keep the last of duplicate times, the stable sort keeps new last
+        merged = merged[np.argsort(merged['time'], kind='mergesort')]
+        keep = np.append(merged['time'][1:] != merged['time'][:-1], True)
+        write_partition(path, merged[keep])
+        written += 1
+    metadata = read_metadata(store)
+    metadata['pregnant_mothers_min'] = minimum
+    write_metadata(store, metadata)
+    return written
+
+
+def read_records(path):
+    # type: (str) -> np.ndarray
+    """Read a whole partition into an array of `binstore.RECORD_DTYPE`."""
+    with np.load(path) as partition:
+        records = np.empty(len(partition['time']), dtype=binstore.RECORD_DTYPE)
+        for name in binstore.RECORD_DTYPE.names:
+            if name not in partition.files:
+                raise InvalidPartitionError("%s lacks %s" % (path, name))
+            records[name] = partition[name]
+    return records
+
+
+def write_partition(path, records):
+    # type: (str, np.ndarray) -> None
+    """Atomically replace the partition at `path` with `records`."""
+    with atomic.replacing(path, "wb") as partition_fh:
+        np.savez_compressed(partition_fh, **dict(
+            (name, np.ascontiguousarray(records[name]))
+            for name in binstore.RECORD_DTYPE.names))
+
+
+def append_csv_line(store, line):
+    # type: (str, str) -> None
+    """Add a `MM/DD/YY-HH,population,birth queue,mothers` csv line."""
+    date, population, birth_queue, pregnant_mothers = line.strip().split(",")
+    write_records(store, np.array(
+        [(parse_time(date), int(population), int(birth_queue),
+          int(pregnant_mothers))],
+        dtype=binstore.RECORD_DTYPE))
+
+
+def csv_to_partitions(source, destination):
+    # type: (str, str) -> int
+    """Import the csv or binary store `source` into the store `destination`.
+
+    Returns:
+        The number of rows imported.
+    """
+    if binstore.is_binary_store(source):
+        records = np.array(binstore.open_memmap(source))
+    else:
+        # Imported here so that appending does not require matplotlib
+        from . import fto_graph
+        csv_df = fto_graph.read_csv_frame(source)
+        dates = fto_graph.parse_csv_dates(csv_df['Date'])
+        records = np.empty(len(csv_df), dtype=binstore.RECORD_DTYPE)
+        records['time'] = dates.values.astype('datetime64[s]').astype('int64')
+        for field, column in binstore.COLUMNS:
+            records[field] = csv_df[column].values
+    write_records(destination, records)
+    return len(records)
+
+
+def partitions_to_csv(source, destination, start=None, end=None,
+                      resolution=None):
+    # type: (str, str, Any, Any, Optional[str]) -> int
+    """Write the rows in [`start`, `end`) of the store `source` to a csv.
+
+    Args:
+        source: Path to the store directory.
+        destination: Path of the csv to write.
+        start: See load_dataframe. Default: the oldest
+        end: See load_dataframe. Default: the newest
+        resolution: Timestamp precision. Default: the coarsest resolution
+            which represents every row.
+
+    Returns:
+        The number of rows written.
+    """
+    arrays = load_arrays(source, start, end)
+    rows = list(zip(*[array.tolist() for array in arrays.values()]))
+    if resolution is None:
+        resolution = resolution_of(arrays['time'].tolist())
+    with open(destination, "w") as csv_fh:
+        csv_fh.write("Date,%s\n" % ",".join(
+            column for _, column in binstore.COLUMNS))
+        for row in rows:
+            csv_fh.write("%s,%d,%d,%d\n" % (
+                (format_time(row[0], resolution),) + row[1:]))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+"""Scrape a sample and refresh everything derived from it in one process.
+
+Replaces append_csv.sh followed by separate graph, web and statistics
+runs, each of which started an interpreter and parsed the whole csv again:
+
+    python -m fto pipeline fto-stats.csv --graph fto.png --web fto.html \
+        --stats fto-stats.json
+
+The stages run in one interpreter, each as soon as the stages it needs
+have succeeded:
+
+- scrape: fetch the pages and format the sample.
+- append: append the sample to the store.
+- window: rewrite the window csvs, see `fto.window`.
+- import: import pandas and matplotlib while the pages are fetched.
+- load: load the store, parsing only the rows appended since the last
+  run (see `fto.incremental`). The frame is shared by the stages below.
+- graph, web and stats: render the png, write the bokeh html and write
+  the statistics as json. They run concurrently, and the statistics are
+  accumulated in states kept next to the store so that only new rows are
+  processed.
+
+A failed stage does not stop the stages which do not need it. Stages
+needing a failed stage are skipped, and each stage is reported with its
+outcome and duration.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
+                                wait as wait_futures)
+
+# pylint: disable=unused-import
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple  # NOQA
+import attr
+
+from . import atomic
+from . import binstore
+from . import daemon
+from . import metrics
+from . import scrape_fto
+from .timeformat import TIME_FORMATS
+from . import window
+
+
+# Suffix of the rolling statistics state kept next to the store
+ROLLING_STATE_SUFFIX = ".ftorolling"
+
+# The names of fto.downsample.METHODS, repeated here so that parsing the
+# arguments does not import pandas before the pages are fetched
+WEB_METHODS = ('minmax', 'lttb')
+
+# Stage outcomes
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class UnknownStageError(Error):
+    """Error when a stage requires a stage which is not in the pipeline."""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    vargs = parse_args()
+    if vargs.pop('verbose'):
+        logging.getLogger().setLevel(logging.DEBUG)
+        metrics.enable()
+    results = run(**vargs)
+    for result in results:
+        print(format_result(result))
+    if any(result.status == FAILED for result in results):
+        sys.exit(1)
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'output_csv',
+        help='csv to append the sample to, a binary store ending in %s or '
+             'a partitioned store directory' % binstore.SUFFIX)
+    parser.add_argument(
+        '--resolution', choices=sorted(TIME_FORMATS), default='hour',
+        help='timestamp precision. Default: hour')
+    parser.add_argument(
+        '--window', dest='windows', action='append', default=None,
+        metavar='SPEC[=PATH]',
+        help='window csv to rewrite, such as 7d, 6m or 1y. May be '
+             'repeated. See python -m fto window. Default: 6m')
+    parser.add_argument(
+        '--no-windows', dest='windows', action='store_const', const=[],
+        help='do not write window csvs')
+    parser.add_argument(
+        '--graph', dest='graph_filename', default=None,
+        help='render the graph png to this path')
+    parser.add_argument(
+        '--web', dest='web_filename', default=None,
+        help='write the interactive bokeh page to this path')
+    parser.add_argument(
+        '--downsample', dest='web_method', default='minmax',
+        choices=WEB_METHODS + ('none',),
+        help='how to reduce the rows sent to the --web page to about its '
+             'width, see fto.downsample. Default: minmax')
+    parser.add_argument(
+        '--lean', dest='web_lean', action='store_true',
+        help='send only the plotted columns of the --web page as compact '
+             'binary arrays, see fto_web --lean')
+    parser.add_argument(
+        '--stats', dest='stats_filename', default=None,
+        help='write the summary statistics as json to this path')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='stages run at the same time. Default: all that can')
+    scrape_fto.add_policy_args(parser)
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
+    vargs = vars(parser.parse_args())
+    if vargs['windows'] is None:
+        vargs['windows'] = ['6m']
+    if vargs['web_method'] == 'none':
+        vargs['web_method'] = None
+    vargs['policy'] = scrape_fto.policy_from_args(vargs)
+    return vargs
+
+
+def run(output_csv,             # type: str
+        resolution='hour',      # type: str
+        windows=('6m',),        # type: Iterable[str]
+        graph_filename=None,    # type: Optional[str]
+        web_filename=None,      # type: Optional[str]
+        stats_filename=None,    # type: Optional[str]
+        base_url="http://www.faerytaleonline.com",  # type: str
+        policy=None,            # type: Optional[scrape_fto.FetchPolicy]
+        workers=None,           # type: Optional[int]
+        web_method='minmax',    # type: Optional[str]
+        web_lean=False          # type: bool
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> List[StageResult]
+    """Scrape one sample into `output_csv` and refresh its outputs.
+
+    Args:
+        output_csv: Csv, binary or partitioned store to append to.
+        resolution: Timestamp precision of the sample. Default: hour
+        windows: Windows written as `SPEC[=PATH]`, see `fto.window.run`.
+            Only written for csv stores. Default: the last 6 months
+        graph_filename: If given, render the graph png to this path.
+        web_filename: If given, write the bokeh html page to this path.
+        stats_filename: If given, write the statistics json to this path.
+        base_url: Url of the website to scrape.
+        policy: Timeouts, retries and hedging of the page requests.
+        workers: Stages run at the same time. Default: all that can
+        web_method: How to downsample the rows of the web page, see
+            `fto.downsample.METHODS`. None sends every row.
+        web_lean: If True, send the web page data in compact binary form,
+            see `fto.fto_web.run`.
+
+    Returns:
+        A StageResult per stage, in the order of `stages`.
+    """
+    started = time.time()
+    results = run_stages(
+        stages(output_csv, resolution, windows, graph_filename,
+               web_filename, stats_filename, base_url, policy, web_method,
+               web_lean), workers)
+    log.info("Pipeline finished in %.3fs", time.time() - started)
+    return results
+
+
+def stages(output_csv,             # type: str
+           resolution='hour',      # type: str
+           windows=('6m',),        # type: Iterable[str]
+           graph_filename=None,    # type: Optional[str]
+           web_filename=None,      # type: Optional[str]
+           stats_filename=None,    # type: Optional[str]
+           base_url="http://www.faerytaleonline.com",  # type: str
+           policy=None,            # type: Optional[scrape_fto.FetchPolicy]
+           web_method='minmax',    # type: Optional[str]
+           web_lean=False          # type: bool
+           ):  # pylint: disable=bad-continuation
+    # type: (...) -> List[Stage]
+    """Return the stages of `run`, each after the stages it requires."""
+    windows = list(windows)
+    pipeline = [
+        Stage("scrape", lambda: scrape(base_url, resolution, policy)),
+        Stage("append", lambda line: daemon.append_line(output_csv, line),
+              ("scrape",)),
+    ]
+    if windows and not is_store(output_csv):
+        pipeline.append(Stage(
+            "window", lambda _: window.run(output_csv, windows),
+            ("append",)))
+    outputs = [
+        ("graph", graph_filename, render_graph),
+        ("web", web_filename,
+         lambda fto_df, path: write_web_page(fto_df, path, web_method,
+                                             web_lean)),
+        ("stats", stats_filename,
+         lambda fto_df, path: write_stats(fto_df, path, output_csv)),
+    ]
+    if any(path for _, path, _ in outputs):
+        pipeline.append(Stage(
+            "import", lambda: import_modules(bool(graph_filename))))
+        pipeline.append(Stage("load", lambda *_: load(output_csv),
+                              ("append", "import")))
+    for name, path, func in outputs:
+        if path:
+            # Bind the loop variables of this stage
+            pipeline.append(Stage(
+                name, lambda fto_df, func=func, path=path: func(fto_df, path),
+                ("load",)))
+    return pipeline
+
+
+@attr.s(frozen=True)
+class Stage(object):
+    """A named step of the pipeline.
+
+    `func` is called with the values returned by the stages of `requires`,
+    in that order.
+    """
+    name = attr.ib()                # type: str
+    func = attr.ib()                # type: Callable[..., Any]
+    requires = attr.ib(default=())  # type: Tuple[str, ...]
+
+
+@attr.s(frozen=True)
+class StageResult(object):
+    """The outcome of a stage: OK, FAILED or SKIPPED."""
+    name = attr.ib()                # type: str
+    status = attr.ib()              # type: str
+    seconds = attr.ib(default=0.0)  # type: float
+    value = attr.ib(default=None)   # type: Any
+    error = attr.ib(default=None)   # type: Optional[str]
+
+
+def run_stages(pipeline, workers=None):
+    # type: (List[Stage], Optional[int]) -> List[StageResult]
+    """Run each stage of `pipeline` once the stages it requires succeeded.
+
+    Stages whose requirements are met run concurrently in threads. A
+    stage requiring a stage which did not succeed is skipped.
+
+    Returns:
+        A StageResult per stage, in the order of `pipeline`.
+
+    Raises:
+        UnknownStageError if a stage requires a stage which is not before
+        it in `pipeline`.
+    """
+    names = set()  # type: set
+    for stage in pipeline:
+        unknown = [name for name in stage.requires if name not in names]
+        if unknown:
+            raise UnknownStageError("Stage %s requires unknown stages %s"
+                                    % (stage.name, ", ".join(unknown)))
+        names.add(stage.name)
+    results = {}  # type: Dict[str, StageResult]
+    pending = list(pipeline)
+    running = {}  # type: Dict[Any, Stage]
+    with ThreadPoolExecutor(max_workers=workers or len(pipeline) or 1) \
+            as executor:
+        while pending or running:
+            # Stages are in dependency order, so one pass settles every
+            # stage whose requirements have finished
+            for stage in list(pending):
+                if any(name not in results for name in stage.requires):
+                    continue
+                pending.remove(stage)
+                unmet = [name for name in stage.requires
+                         if results[name].status != OK]
+                if unmet:
+                    results[stage.name] = StageResult(
+                        stage.name, SKIPPED,
+                        error="%s did not succeed" % ", ".join(unmet))
+                    continue
+                values = [results[name].value for name in stage.requires]
+                running[executor.submit(run_stage, stage, values)] = stage
+            if not running:
+                continue
+            done, _ = wait_futures(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[result.name] = result
+                del running[future]
+    return [results[stage.name] for stage in pipeline]
+
+
+def run_stage(stage, values):
+    # type: (Stage, List[Any]) -> StageResult
+    """Call a stage, turning an exception into a FAILED result."""
+    began = time.time()
+    try:
+        with metrics.span("pipeline." + stage.name):
+            value = stage.func(*values)
+    except Exception as e:  # pylint: disable=broad-except
+        log.debug("Stage %s failed", stage.name, exc_info=True)
+        return StageResult(stage.name, FAILED, time.time() - began,
+                           error="%s: %s" % (type(e).__name__, e))
+    return StageResult(stage.name, OK, time.time() - began, value)
+
+
+def format_result(result):
+    # type: (StageResult) -> str
+    """Return a stage result as a line of text."""
+    line = "%-8s %-8s %8.3fs" % (result.name, result.status, result.seconds)
+    if result.error is not None:
+        line += " " + result.error
+    return line
+
+
+def is_store(path):
+    # type: (str) -> bool
+    """Return True if `path` is a binary or partitioned store."""
+    # Imported here since fto.partition loads numpy
+    from . import partition
+    return (path.endswith(os.sep) or partition.is_partitioned_store(path) or
+            path.endswith(binstore.SUFFIX) or binstore.is_binary_store(path))
+
+
+def scrape(base_url, resolution, policy=None):
+    # type: (str, str, Optional[scrape_fto.FetchPolicy]) -> str
+    """Scrape one sample and return it as a csv line."""
+    return next(iter(scrape_fto.run(
+        base_url=base_url, output_csv=True, policy=policy,
+        time_resolution=resolution)))
+
+
+def import_modules(graph=False):
+    # type: (bool) -> None
+    """Import the modules of the later stages, which takes about as long
+    as fetching the pages."""
+    # pylint: disable=unused-variable
+    from . import fto_graph  # NOQA
+    if graph:
+        from . import render  # NOQA
+
+
+def load(output_csv):
+    # type: (str) -> Any
+    """Load the store, parsing only the csv rows appended since last time."""
+    # Imported here so that the scrape does not wait for pandas, see
+    # import_modules
+    from . import fto_graph
+    return fto_graph.load_dataframe(output_csv, incremental=True)
+
+
+def render_graph(fto_df, graph_filename):
+    # type: (Any, str) -> None
+    """Render the graph png of `fto_df`."""
+    # Imported here so that only pipelines drawing a graph load matplotlib
+    from . import render
+    renderer = render.FigureRenderer()
+    try:
+        renderer.render(fto_df, graph_filename)
+    finally:
+        renderer.close()
+
+
+def write_web_page(fto_df, web_filename, method='minmax', lean=False):
+    # type: (Any, str, Optional[str], bool) -> None
+    """Write the bokeh page of `fto_df` as a standalone html file.
+
+    See `fto.fto_web.run` for `method` and `lean`.
+    """
+    # Imported here since bokeh is only needed for the page
+    import bokeh.embed
+    import bokeh.resources
+    from . import fto_web
+    # Without lean, fto_web.run adds a column, and the frame is shared with
+    # other stages
+    layout = fto_web.run(fto_df if lean else fto_df.copy(), method=method,
+                         lean=lean)
+    atomic.write_text(web_filename, bokeh.embed.file_html(
+        layout, bokeh.resources.CDN, "FTO Statistics"))
+
+
+def write_stats(fto_df, stats_filename, output_csv):
+    # type: (Any, str, str) -> None
+    """Write the average and rolling statistics of `fto_df` as json.
+
+    The states of both are kept next to `output_csv`, so only the rows
+    appended since the last run are processed.
+    """
+    # Imported here so that only pipelines writing statistics load them
+    from . import stats
+    # Next to, rather than in, the directory of a partitioned store
+    store = output_csv.rstrip(os.sep)
+    records = (
+        stats.average_stats(fto_df,
+                            state_path=stats.default_state_path(store)) +
+        stats.rolling_stats(fto_df, state_path=store + ROLLING_STATE_SUFFIX))
+    # json has no NaN or infinity, statistics without data are null
+    atomic.write_text(stats_filename, json.dumps(
+        [collections.OrderedDict([('name', record.name),
+                                  ('value', json_number(record.value)),
+                                  ('unit', record.unit)])
+         for record in records], indent=2, allow_nan=False) + "\n")
+
+
+def json_number(value):
+    # type: (Any) -> Optional[float]
+    """Return `value` as a float, or None if it is not finite."""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+if __name__ == "__main__":
+    main()
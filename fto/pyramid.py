@@ -0,0 +1,205 @@
+"""Multi-resolution levels of fto data for zooming.
+
+A `Pyramid` holds the samples at several resolutions: the raw samples and
+hourly, daily and weekly aggregates with the minimum, maximum and mean of
+each column. A query for a time range is answered from the finest level
+which has no more rows in that range than the plot is pixels wide, so the
+size of every answer is bounded by the plot width rather than by the
+length of the history.
+
+Levels can be saved to and loaded from a directory with one compressed
+numpy archive per level.
+"""
+
+import collections
+import os
+
+# pylint: disable=unused-import
+from typing import Any, Dict, List, Optional, Tuple  # NOQA
+import numpy as np
+import pandas as pd
+
+from . import atomic
+from . import downsample
+from .partition import to_timestamp
+
+
+# Level name -> bin width in seconds, finest first. Weeks start on Monday.
+LEVELS = collections.OrderedDict([
+    ('raw', 0),
+    ('hour', 3600),
+    ('day', 86400),
+    ('week', 7 * 86400),
+])
+
+# The unix epoch was a Thursday, shift bins so that weeks start on Monday
+WEEK_OFFSET = 3 * 86400
+
+STATISTICS = ('min', 'max', 'mean')
+
+COLUMNS = ['Population', 'Birth Queue', 'Pregnant Mothers']
+
+
+def stat_column(column, statistic):
+    # type: (str, str) -> str
+    """Return the column name of an aggregate. The mean keeps the name."""
+    return column if statistic == 'mean' else "%s %s" % (column, statistic)
+
+
+# Every aggregate of COLUMNS, as sent to the zoomable page
+STAT_COLUMNS = [stat_column(column, statistic)
+                for column in COLUMNS for statistic in STATISTICS]
+
+
+def aggregate(times, columns, width):
+    # type: (np.ndarray, Dict[str, np.ndarray], int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]
+    """Aggregate ascending samples into bins `width` seconds wide.
+
+    Args:
+        times: Ascending unix timestamps in seconds.
+        columns: Column name -> values at `times`.
+        width: Bin width in seconds.
+
+    Returns:
+        The start of each non-empty bin and the min, max and mean of every
+        column in it, named by stat_column.
+    """
+    offset = WEEK_OFFSET if width % (7 * 86400) == 0 else 0
+    bins = (times + offset) // width
+    if not len(bins):  # pylint: disable=len-as-condition
+        return bins, collections.OrderedDict(
+            (stat_column(column, statistic), np.empty(0))
+            for column in columns for statistic in STATISTICS)
+    starts = np.flatnonzero(np.diff(bins, prepend=bins[:1] - 1))
+    counts = np.diff(np.append(starts, len(times)))
+    stats = collections.OrderedDict()
+    for column, values in columns.items():
+        values = values.astype(np.float64)
+        stats[column] = np.add.reduceat(values, starts) / counts
+        stats[stat_column(column, 'min')] = np.minimum.reduceat(values, starts)
+        stats[stat_column(column, 'max')] = np.maximum.reduceat(values, starts)
+    return bins[starts] * width - offset, stats
+
+
+class Pyramid(object):
+    """The levels of `LEVELS` for one DataFrame.
+
+    Args:
+        levels: Level name -> DataFrame indexed by Date, with the mean of
+            each column under its own name and the minimum and maximum
+            named by stat_column.
+    """
+    def __init__(self, levels):
+        # type: (Dict[str, pd.DataFrame]) -> None
+        self.levels = levels
+
+    @classmethod
+    def from_dataframe(cls, fto_df, columns=None):
+        # type: (pd.DataFrame, Optional[List[str]]) -> Pyramid
+        """Build every level of `fto_df`, a DataFrame indexed by date."""
+        if columns is None:
+            columns = COLUMNS
+        times = fto_df.index.values.astype('datetime64[s]').astype(np.int64)
+        values = collections.OrderedDict(
+            (column, fto_df[column].values) for column in columns)
+        levels = collections.OrderedDict()
+        for name, width in LEVELS.items():
+            if width:
+                starts, stats = aggregate(times, values, width)
+            else:
+                starts, stats = times, collections.OrderedDict()
+                for column, column_values in values.items():
+                    column_values = column_values.astype(np.float64)
+                    for statistic in STATISTICS:
+                        stats[stat_column(column, statistic)] = column_values
+            levels[name] = make_frame(starts, stats)
+        return cls(levels)
+
+    @classmethod
+    def load(cls, directory):
+        # type: (str) -> Pyramid
+        """Load the levels saved by `save` from `directory`."""
+        levels = collections.OrderedDict()
+        for name in LEVELS:
+            with np.load(os.path.join(directory, name + ".npz")) as level:
+                names = level['columns'].tolist()
+                levels[name] = make_frame(
+                    level['time'], collections.OrderedDict(
+                        (column, level['column%d' % number])
+                        for number, column in enumerate(names)))
+        return cls(levels)
+
+    def save(self, directory):
+        # type: (str) -> None
+        """Save each level to `<directory>/<level>.npz`."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name, level in self.levels.items():
+            arrays = dict(
+                ('column%d' % number, level[column].values)
+                for number, column in enumerate(level.columns))
+            arrays['columns'] = np.array(list(level.columns))
+            arrays['time'] = level.index.values.astype(
+                'datetime64[s]').astype(np.int64)
+            path = os.path.join(directory, name + ".npz")
+            with atomic.replacing(path, "wb") as level_fh:
+                np.savez_compressed(level_fh, **arrays)
+
+    def query(self, start=None, end=None, pixels=1600):
+        # type: (Any, Any, int) -> Tuple[str, pd.DataFrame]
+        """Return the rows to draw [`start`, `end`) `pixels` wide.
+
+        The finest level with at most `pixels` rows in the range is used.
+        If even the coarsest level has more, its rows are reduced with
+        `fto.downsample`, so at most a few rows per pixel are returned.
+        The peaks of the minimum and maximum columns are kept as well as
+        those of the means.
+
+        Args:
+            start: See `fto.partition.to_timestamp`. Default: the oldest
+            end: Exclusive, like `start`. Default: the newest
+            pixels: Width of the plot.
+
+        Returns:
+            The name of the level used and its rows in the range.
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        for name, level in self.levels.items():
+            rows = level_slice(level, start, end)
+            if len(rows) <= pixels:
+                return name, rows
+        return name, downsample.downsample_frame(
+            rows, pixels, [column for column in rows.columns
+                           if column in STAT_COLUMNS])
+
+
+def make_frame(times, columns):
+    # type: (np.ndarray, Dict[str, np.ndarray]) -> pd.DataFrame
+    """Build a level DataFrame from unix timestamps and columns."""
+    seconds = np.asarray(times, dtype=np.int64).astype('datetime64[s]')
+    index = pd.DatetimeIndex(seconds.astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def level_slice(level, start=None, end=None):
+    # type: (pd.DataFrame, Optional[int], Optional[int]) -> pd.DataFrame
+    """Return the rows of `level` in [`start`, `end`) by binary search."""
+    times = level.index.values.astype('datetime64[s]').astype(np.int64)
+    first = 0 if start is None else times.searchsorted(start)
+    last = len(times) if end is None else times.searchsorted(end)
+    return level.iloc[first:last]
+
+
+def frame_to_json(rows, columns=None):
+    # type: (pd.DataFrame, Optional[List[str]]) -> Dict[str, List[float]]
+    """Return the `columns` of `rows` as json lists for a bokeh data source.
+
+    Date is given in milliseconds since the epoch, as bokeh expects.
+    """
+    if columns is None:
+        columns = list(rows.columns)
+    dates = rows.index.values.astype('datetime64[ms]').astype(np.int64)
+    data = {'Date': dates.tolist()}
+    for column in columns:
+        data[column] = np.round(rows[column].values, 2).tolist()
+    return data
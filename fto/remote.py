@@ -0,0 +1,169 @@
+"""Download a growing file over http, fetching only what changed.
+
+The csv only ever grows at the end, so once a copy has been downloaded:
+
+- A conditional request with its ETag is answered with 304 Not Modified
+  while the csv is unchanged, without a body.
+- Otherwise a Range request for the bytes from just before the end of the
+  copy returns the appended rows. The bytes before the end of the copy are
+  compared with what the server sent to detect a rewritten csv, which is
+  then downloaded again.
+
+`fetch_tail` sends these requests, and `RemoteFile` keeps a copy in memory
+up to date with them. `fto.load_dataframe` keeps a RemoteFile for each of
+the `MAX_REMOTE_FILES` urls read most recently in the process, and `fto.incremental` keeps the ETag in its
+sidecar cache between processes. `python -m fto serve` answers both kinds
+of request.
+"""
+
+import collections
+import re
+import threading
+
+# pylint: disable=unused-import
+from typing import Any, Dict, Optional  # NOQA
+import requests
+
+from .scrape_fto import DEFAULT_TIMEOUT
+
+
+# Bytes before the end of the copy which must be unchanged to append a tail
+ANCHOR_SIZE = 256
+
+# Copies kept by read(), the least recently read url is dropped first
+MAX_REMOTE_FILES = 16
+
+CONTENT_RANGE_PATTERN = re.compile(r"^\s*bytes\s+(\d+)-")
+
+# Url -> RemoteFile of read(), least recently read first
+_remote_files = collections.OrderedDict()  # type: Dict[str, RemoteFile]
+_remote_files_lock = threading.Lock()
+
+
+def read(url, session=None):
+    # type: (str, Optional[requests.Session]) -> bytes
+    """Return the content at `url`, downloading only what changed since
+    the last read of `url` in this process.
+
+    Raises:
+        requests.RequestException if the content could not be fetched.
+    """
+    with _remote_files_lock:
+        remote_file = _remote_files.pop(url, None)
+        if remote_file is None:
+            remote_file = RemoteFile(url)
+        _remote_files[url] = remote_file
+        while len(_remote_files) > MAX_REMOTE_FILES:
+            _remote_files.popitem(last=False)
+    return remote_file.read(session)
+
+
+# pylint: disable=too-few-public-methods
+class Tail(object):
+    """A response of `fetch_tail`.
+
+    Attributes:
+        data: The bytes received.
+        from_start: True if `data` starts at byte 0 rather than at the
+            requested start, because the server ignored the range or the
+            content became shorter than the start.
+        not_modified: True if the content still has the ETag sent, in
+            which case `data` is empty.
+        etag: The ETag of the whole content, if the server sent one.
+    """
+    def __init__(self, data, from_start, not_modified=False, etag=None):
+        # type: (bytes, bool, bool, Optional[str]) -> None
+        self.data = data
+        self.from_start = from_start
+        self.not_modified = not_modified
+        self.etag = etag
+
+
+def fetch_tail(url,                     # type: str
+               start=0,                 # type: int
+               etag=None,               # type: Optional[str]
+               session=None,            # type: Optional[requests.Session]
+               timeout=DEFAULT_TIMEOUT  # type: Any
+               ):  # pylint: disable=bad-continuation
+    # type: (...) -> Tail
+    """GET `url` from byte `start`, unless it still has `etag`.
+
+    A partial response which does not start at `start` according to its
+    Content-Range is not trusted, and the whole content is downloaded.
+
+    Args:
+        timeout: Timeout of each request in seconds, a single number or
+            a (connect, read) tuple like `fto.scrape_fto.FetchPolicy`.
+
+    Raises:
+        requests.RequestException if the request failed or timed out.
+    """
+    getter = session if session is not None else requests
+    headers = {}
+    if start:
+        headers["Range"] = "bytes=%d-" % start
+    if etag:
+        headers["If-None-Match"] = etag
+    response = getter.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and etag:
+        return Tail(b"", False, True, response.headers.get("ETag", etag))
+    if response.status_code == 206:
+        if content_range_start(response) == start:
+            return Tail(response.content, False,
+                        etag=response.headers.get("ETag"))
+        response = getter.get(url, timeout=timeout)
+    elif response.status_code == 416:
+        # Shorter than `start`, so it was truncated
+        response = getter.get(url, timeout=timeout)
+    # Otherwise the server ignored the range
+    response.raise_for_status()
+    return Tail(response.content, True, etag=response.headers.get("ETag"))
+
+
+def content_range_start(response):
+    # type: (Any) -> Optional[int]
+    """Return the first byte of a 206 `response`, or None if unknown."""
+    match = CONTENT_RANGE_PATTERN.match(
+        response.headers.get("Content-Range", ""))
+    return None if match is None else int(match.group(1))
+
+
+class RemoteFile(object):
+    """A copy of the content at `url`, refreshed by `read`.
+
+    Args:
+        timeout: Timeout of each request, see `fetch_tail`.
+    """
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        # type: (str, Any) -> None
+        self.url = url
+        self.timeout = timeout
+        self.content = None  # type: Optional[bytes]
+        self.etag = None  # type: Optional[str]
+        self._lock = threading.Lock()
+
+    def read(self, session=None):
+        # type: (Optional[requests.Session]) -> bytes
+        """Bring the copy up to date and return it."""
+        with self._lock:
+            if self.content is None:
+                tail = fetch_tail(self.url, session=session,
+                                  timeout=self.timeout)
+                self.content = tail.data
+            else:
+                start = max(len(self.content) - ANCHOR_SIZE, 0)
+                tail = fetch_tail(self.url, start, self.etag, session,
+                                  self.timeout)
+                if tail.not_modified:
+                    pass
+                elif tail.from_start:
+                    self.content = tail.data
+                elif tail.data.startswith(self.content[start:]):
+                    self.content = self.content[:start] + tail.data
+                else:
+                    # Rewritten rather than appended to
+                    tail = fetch_tail(self.url, session=session,
+                                      timeout=self.timeout)
+                    self.content = tail.data
+            self.etag = tail.etag
+            return self.content
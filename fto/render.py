@@ -0,0 +1,188 @@
+"""Cached and incremental rendering of the fto graph.
+
+Rendering the graph of `fto_graph.generate_figure` is slow, mostly
+because of the size of the figure. Two things avoid doing it when it is
+not needed:
+
+- `RenderCache` stores rendered files under a hash of the data and the
+  render options, so rendering unchanged data copies the stored file.
+- `FigureRenderer` keeps its figure between renders and only replaces
+  the line data and limits, as after each append in the daemon.
+"""
+
+import hashlib
+import logging
+import os
+
+# pylint: disable=unused-import
+from typing import Any, Optional  # NOQA
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from . import atomic
+from . import fto_graph
+from . import metrics
+
+
+# Change when generate_figure draws something different for the same data
+RENDER_VERSION = 2
+
+# Rendered files kept by default in a RenderCache
+MAX_ENTRIES = 64
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    # type: () -> str
+    """Return the render cache directory in the user cache directory."""
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME",
+                       os.path.join(os.path.expanduser("~"), ".cache")),
+        "fto", "renders")
+
+
+def render_key(df, output_filename, dpi=None):
+    # type: (pd.DataFrame, str, Optional[float]) -> str
+    """Return a hash of the data of `df` and the render options.
+
+    The options are the output format, the dpi and the matplotlib
+    settings, which include the style.
+    """
+    settings = dict(matplotlib.rcParams, **fto_graph.FIGURE_RC)
+    digest = hashlib.sha1()
+    digest.update(repr((
+        RENDER_VERSION, matplotlib.__version__,
+        os.path.splitext(output_filename)[1].lower(), dpi,
+        sorted((key, repr(value)) for key, value in settings.items()),
+        list(df.columns))).encode("utf-8"))
+    digest.update(np.ascontiguousarray(df.index.values).tobytes())
+    for column in df.columns:
+        values = np.ascontiguousarray(df[column].values)
+        digest.update(str(values.dtype).encode("utf-8"))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+class RenderCache(object):
+    """A directory of rendered files named by their render_key.
+
+    Args:
+        cache_dir: Where to keep the files. Default: see default_cache_dir
+        max_entries: The least recently used files above this many are
+            removed. Default: `MAX_ENTRIES`
+    """
+    def __init__(self, cache_dir=None, max_entries=MAX_ENTRIES):
+        # type: (Optional[str], int) -> None
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key, output_filename):
+        # type: (str, str) -> str
+        """Return where the file of `key` is kept."""
+        return os.path.join(
+            self.cache_dir, key + os.path.splitext(output_filename)[1])
+
+    def fetch(self, key, output_filename):
+        # type: (str, str) -> bool
+        """Copy the stored file of `key` to `output_filename`.
+
+        Returns:
+            False if there is no stored file for `key`.
+        """
+        cached_path = self.path(key, output_filename)
+        try:
+            atomic.copy_file(cached_path, output_filename)
+            # Mark as recently used
+            os.utime(cached_path, None)
+        except (OSError, IOError):
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, output_filename):
+        # type: (str, str) -> None
+        """Keep a copy of the rendered `output_filename` under `key`."""
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            atomic.copy_file(output_filename, self.path(key, output_filename))
+            self.evict()
+        except (OSError, IOError) as e:
+            log.warning("Could not write render cache %s: %s",
+                        self.cache_dir, e)
+
+    def evict(self):
+        # type: () -> None
+        """Remove the least recently used files above `max_entries`."""
+        paths = [os.path.join(self.cache_dir, name)
+                 for name in os.listdir(self.cache_dir)
+                 if not name.endswith(atomic.TEMP_SUFFIX)]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            os.remove(path)
+
+
+class FigureRenderer(object):
+    """Renders fto DataFrames to files, reusing work between renders.
+
+    The figure is built on the first render and later renders only
+    replace its data with fto_graph.update_figure. Rendering the same data
+    again is skipped, or served from `cache` if given.
+
+    Args:
+        cache: Optional RenderCache shared with other renderers/processes.
+        dpi: Resolution to save with. Default: matplotlib's savefig.dpi
+    """
+    def __init__(self, cache=None, dpi=None):
+        # type: (Optional[RenderCache], Optional[float]) -> None
+        self.cache = cache
+        self.dpi = dpi
+        self.figure = None  # type: Optional[Any]
+        self.columns = None  # type: Optional[list]
+        self.last_key = None  # type: Optional[str]
+
+    def render(self, df, output_filename):
+        # type: (pd.DataFrame, str) -> bool
+        """Render `df` to `output_filename`.
+
+        Returns:
+            False if the file was already up to date or copied from the
+            cache, True if it was drawn.
+        """
+        df = fto_graph.as_dataframe(df)
+        key = render_key(df, output_filename, self.dpi)
+        if key == self.last_key and os.path.exists(output_filename):
+            return False
+        if self.cache is not None and self.cache.fetch(key, output_filename):
+            log.debug("Render cache hit for %s", output_filename)
+            self.last_key = key
+            return False
+        if self.figure is None or list(df.columns) != self.columns:
+            self.close()
+            self.figure = fto_graph.generate_figure(df)
+            self.columns = list(df.columns)
+        else:
+            fto_graph.update_figure(self.figure, df)
+        kwargs = {} if self.dpi is None else {'dpi': self.dpi}
+        with metrics.span("fto_graph.savefig"):
+            self.figure.savefig(output_filename, **kwargs)
+        self.last_key = key
+        if self.cache is not None:
+            self.cache.store(key, output_filename)
+        return True
+
+    def close(self):
+        # type: () -> None
+        """Release the figure."""
+        if self.figure is not None:
+            fto_graph.plt.close(self.figure)
+        self.figure = None
+        self.columns = None
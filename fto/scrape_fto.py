@@ -3,22 +3,73 @@
 
 
 import argparse
-import time
+import collections
+import hashlib
+import logging
+import math
 import re
+import sys
+import threading
+import time
+from concurrent.futures import (ThreadPoolExecutor, as_completed,
+                                wait as wait_futures)
 
 
 # pylint: disable=unused-import
-from typing import Any, Iterable, Union # NOQA
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union # NOQA
 from bs4 import BeautifulSoup
 import requests
+import requests.adapters
+
+from . import metrics
+from .timeformat import TIME_FORMATS, format_time
+
+# (connect, read) timeout in seconds applied to every page request
+DEFAULT_TIMEOUT = (3.05, 27)
+
+# Responses with these statuses are retried like connection errors
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Latencies needed before hedging by percentile instead of `hedge_after`
+MIN_HEDGE_SAMPLES = 20
+
+# Patterns for pulling values straight out of the raw page bytes.
+# The signup values live in the element following their description text.
+POPULATION_PATTERN = re.compile(br"Population:\s*([0-9][0-9,]*)")
+SIGNUP_PATTERN = re.compile(
+    br"(Current size of birth queue|Number of pregnant)[^<]*"
+    br"(?:<[^>]*>\s*)+([0-9][0-9,]*)")
+BIRTH_QUEUE_KEY = b"Current size of birth queue"
+PREGNANT_MOTHERS_KEY = b"Number of pregnant"
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class FetchError(Error):
+    """Error when a page could not be fetched within the retry budget."""
+    pass
 
 
 def main():
     """Apply cli-arguments to program."""
     # type: () -> None
     vargs = parse_args()
-    for line in run(**vargs):
-        print(line)
+    verbose = vargs.pop('verbose')
+    logging.basicConfig(level=logging.DEBUG if verbose else logging.WARNING)
+    if verbose:
+        metrics.enable()
+    try:
+        for line in run(**vargs):
+            print(line)
+    except Error as e:
+        log.error("Could not scrape fto: %s", str(e))
+        sys.exit(1)
 
 
 def parse_args():
@@ -27,54 +78,487 @@ def parse_args():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('--header', dest="header_enabled",
                         action='store_true', default=False)
+    parser.add_argument('--resolution', dest="time_resolution",
+                        choices=sorted(TIME_FORMATS), default='hour',
+                        help="precision of the timestamp. Default: hour")
+    add_policy_args(parser)
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
     vargs = vars(parser.parse_args())
+    vargs['policy'] = policy_from_args(vargs)
     vargs['output_csv'] = True
     return vargs
 
 
-def run(header_enabled=False,
-        base_url="http://www.faerytaleonline.com",
-        output_csv=False):
-    # type: (bool, str, bool) -> Iterable[Union[List[str], str]]
+def add_policy_args(parser):
+    # type: (argparse.ArgumentParser) -> None
+    """Add the FetchPolicy options to `parser`."""
+    parser.add_argument(
+        '--connect-timeout', type=float, default=DEFAULT_TIMEOUT[0],
+        help="seconds to wait for a connection. Default: %(default)s")
+    parser.add_argument(
+        '--read-timeout', type=float, default=DEFAULT_TIMEOUT[1],
+        help="seconds to wait for a response. Default: %(default)s")
+    parser.add_argument(
+        '--retries', type=int, default=3,
+        help="retries per page with exponential backoff. Default: 3")
+    parser.add_argument(
+        '--hedge-after', type=float, default=None,
+        help="send a second request if the first has not answered "
+             "after this many seconds")
+    parser.add_argument(
+        '--hedge-percentile', type=float, default=None,
+        help="send a second request after this percentile of recent "
+             "latencies. Only useful for long running processes")
+
+
+def policy_from_args(vargs):
+    # type: (dict[str, Any]) -> FetchPolicy
+    """Pop the options added by add_policy_args and build a FetchPolicy."""
+    return FetchPolicy(
+        timeout=(vargs.pop('connect_timeout'), vargs.pop('read_timeout')),
+        retries=vargs.pop('retries'),
+        hedge_after=vargs.pop('hedge_after'),
+        hedge_percentile=vargs.pop('hedge_percentile'))
+
+
+def run(header_enabled=False,                      # type: bool
+        base_url="http://www.faerytaleonline.com",  # type: str
+        output_csv=False,                          # type: bool
+        session=None,                              # type: Optional[requests.Session]
+        policy=None,                               # type: Optional[FetchPolicy]
+        time_resolution='hour',                    # type: str
+        cache=None,                                # type: Optional[PageCache]
+        records=None                               # type: Optional[List[FetchRecord]]
+        ):  # pylint: disable=bad-continuation
+    # type: (...) -> Iterable[Union[List[str], str]]
     """Main entry point for scraping data.
 
+    Both pages are requested concurrently over a single pooled session.
+
     Args:
         header_enabled: if True, output headers for given data
         base_url: Url to website to parse
         output_csv: If true csv instead of list
+        session: A requests session to reuse across calls. If None, a
+            session is created for this call and closed afterwards.
+        policy: Timeouts, retries and hedging of each request. Reuse the
+            same policy between calls to hedge by observed latencies.
+            Default: FetchPolicy()
+        time_resolution: Precision of the timestamp, one of 'hour',
+            'minute' or 'second'. Default: 'hour'
+        cache: A PageCache kept between calls. Pages which have not
+            changed since the previous call are neither downloaded
+            again (if the server supports conditional requests) nor
+            parsed.
+        records: If given, a FetchRecord for each page is appended.
 
     Yields:
         The scraped data and optionally the header.
+
+    Raises:
+        FetchError if a page could not be fetched after all retries.
         """
-    main_page_soup = get_page_soup(base_url)
-    signup_page_soup = get_page_soup("{base_url}/signup.php"
-                                     .format(base_url=base_url))
-
-    # Parse and format the data
-    header = [
-        "Date", "Birth Queue", "Population",
-        "Pregnant Mothers"]  # type: Union[List[str], str]
-    data = [
-        csv_format_time(), get_population(main_page_soup),
-        get_birth_queue_size(signup_page_soup),
-        get_pregnant_mothers(signup_page_soup)]  # type: Union[List[str], str]
-
-    if output_csv:
-        header = ','.join(header)  # pylint: disable=redefined-variable-type
-        data = ','.join(data)  # pylint: disable=redefined-variable-type
+    pages = [
+        (base_url, extract_population),
+        ("{base_url}/signup.php".format(base_url=base_url),
+         extract_signup_values),
+    ]
+    # Timed before yielding, so that the caller's time is not included
+    with metrics.span("scrape_fto.run"):
+        population, (birth_queue_size, pregnant_mothers) = fetch_pages(
+            pages, session, policy, cache, records)
+
+        # Parse and format the data
+        header = [
+            "Date", "Birth Queue", "Population",
+            "Pregnant Mothers"]  # type: Union[List[str], str]
+        data = [
+            csv_format_time(time_resolution), population,
+            birth_queue_size, pregnant_mothers]  # type: Union[List[str], str]
+
+        if output_csv:
+            header = ','.join(header)  # pylint: disable=redefined-variable-type
+            data = ','.join(data)  # pylint: disable=redefined-variable-type
 
     if header_enabled:
         yield header
     yield data
 
 
-def get_page_soup(url):
-    # type: (str) -> BeautifulSoup
-    """Get html from url, parse it into beautiful soup data structure"""
-    page = requests.get(url)
-    content = page.content
-    soup = BeautifulSoup(content, "html.parser")
-    return soup
+def create_session(pool_size=2):
+    # type: (int) -> requests.Session
+    """Create a keep-alive session able to hold `pool_size` connections.
+
+    Hedged requests may hold a second connection per page, so the pool
+    is sized for twice `pool_size` requests.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=2 * pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_pages(pages,          # type: List[Tuple[str, Callable[[bytes], Any]]]
+                session=None,   # type: Optional[requests.Session]
+                policy=None,    # type: Optional[FetchPolicy]
+                cache=None,     # type: Optional[PageCache]
+                records=None    # type: Optional[List[FetchRecord]]
+                ):  # pylint: disable=bad-continuation
+    # type: (...) -> List[Any]
+    """Fetch every page concurrently and extract values from each.
+
+    Args:
+        pages: (url, extract) pairs. `extract` is called with the raw
+            content of the page at `url`.
+        session: Session shared by all requests. If None, a temporary
+            session is created and closed once all pages are fetched.
+        policy: Timeouts, retries and hedging. Default: FetchPolicy()
+        cache: Optional PageCache used for conditional requests.
+        records: If given, a FetchRecord for each page is appended.
+
+    Returns:
+        The extracted values of each page, in the same order as `pages`.
+    """
+    own_session = session is None
+    if own_session:
+        session = create_session(len(pages))
+    if policy is None:
+        policy = FetchPolicy()
+    try:
+        with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+            futures = [
+                executor.submit(fetch_values, url, extract, session,
+                                policy, cache, records)
+                for url, extract in pages]
+            return [future.result() for future in futures]
+    finally:
+        if own_session:
+            session.close()
+
+
+def fetch_values(url,            # type: str
+                 extract,        # type: Callable[[bytes], Any]
+                 session=None,   # type: Optional[requests.Session]
+                 policy=None,    # type: Optional[FetchPolicy]
+                 cache=None,     # type: Optional[PageCache]
+                 records=None    # type: Optional[List[FetchRecord]]
+                 ):  # pylint: disable=bad-continuation
+    # type: (...) -> Any
+    """Fetch the page at `url` and return `extract(content)`.
+
+    With a cache, the request is conditional and the previously
+    extracted values are returned when the page has not changed. The
+    extraction is timed apart from the request, as scrape_fto.extract.
+    """
+    headers = cache.conditional_headers(url, extract) if cache else None
+    page, record = request_page(url, session, policy, headers)
+    if records is not None:
+        records.append(record)
+    with metrics.span("scrape_fto.extract"):
+        if cache is None:
+            return extract(page.content)
+        return cache.resolve(url, page, extract)
+
+
+def request_page(url,           # type: str
+                 session=None,  # type: Optional[requests.Session]
+                 policy=None,   # type: Optional[FetchPolicy]
+                 headers=None   # type: Optional[Dict[str, str]]
+                 ):  # pylint: disable=bad-continuation
+    # type: (...) -> Tuple[requests.Response, FetchRecord]
+    """GET `url`, retrying with exponential backoff and hedging per `policy`.
+
+    Returns:
+        The response and a FetchRecord of how long it took.
+
+    Raises:
+        FetchError if every attempt failed.
+    """
+    if policy is None:
+        policy = FetchPolicy()
+    getter = session if session is not None else requests
+    start = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        attempt_start = time.time()
+        metrics.count("scrape_fto.requests")
+        try:
+            with metrics.span("scrape_fto.request_page"):
+                page, hedged = hedged_get(getter, url, policy, headers)
+            if page.status_code in RETRY_STATUSES:
+                page.raise_for_status()
+            break
+        except requests.RequestException as e:
+            if attempts > policy.retries:
+                raise FetchError("Could not fetch %s after %d attempts: %s"
+                                 % (url, attempts, e))
+            metrics.count("scrape_fto.retries")
+            delay = policy.backoff_delay(attempts)
+            log.warning("Attempt %d for %s failed, retrying in %.1fs: %s",
+                        attempts, url, delay, e)
+            time.sleep(delay)
+    policy.record_latency(time.time() - attempt_start)
+    record = FetchRecord(url, time.time() - start, attempts, hedged)
+    log.debug("Fetched %s in %.3fs after %d attempts%s", url,
+              record.latency, attempts, " (hedged)" if hedged else "")
+    return page, record
+
+
+def hedged_get(getter, url, policy, headers=None):
+    # type: (Any, str, FetchPolicy, Optional[Dict[str, str]]) -> Tuple[requests.Response, bool]
+    """Send a GET, and a second one if the first is slower than the
+    policy's hedge delay. The first successful response wins.
+
+    Returns:
+        The response and whether a hedged request was sent.
+    """
+    def send():
+        # type: () -> requests.Response
+        """Send a single GET request."""
+        return getter.get(url, timeout=policy.timeout, headers=headers)
+
+    delay = policy.hedge_delay()
+    if delay is None:
+        return send(), False
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        futures = [executor.submit(send)]
+        done, _ = wait_futures(futures, timeout=delay)
+        if not done:
+            log.debug("Hedging request to %s after %.3fs", url, delay)
+            metrics.count("scrape_fto.hedged_requests")
+            futures.append(executor.submit(send))
+        error = None  # type: Optional[Exception]
+        for future in as_completed(futures):
+            try:
+                return future.result(), len(futures) > 1
+            except requests.RequestException as e:
+                error = e
+        raise error
+    finally:
+        # Do not wait for the losing request
+        executor.shutdown(wait=False)
+
+
+def fetch_page(url, session=None, policy=None):
+    # type: (str, Optional[requests.Session], Optional[FetchPolicy]) -> bytes
+    """Get the raw html content from url."""
+    return request_page(url, session, policy)[0].content
+
+
+@metrics.timed("scrape_fto.parse_soup")
+def parse_soup(content):
+    # type: (bytes) -> BeautifulSoup
+    """Parse html content into beautiful soup data structure"""
+    return BeautifulSoup(content, "html.parser")
+
+
+@metrics.timed("scrape_fto.get_page_soup")
+def get_page_soup(url,           # type: str
+                  session=None,  # type: Optional[requests.Session]
+                  policy=None,   # type: Optional[FetchPolicy]
+                  cache=None     # type: Optional[PageCache]
+                  ):  # pylint: disable=bad-continuation
+    # type: (...) -> BeautifulSoup
+    """Get html from url, parse it into beautiful soup data structure
+
+    If `cache` is given and the page is unchanged, the soup parsed on the
+    previous call is returned.
+    """
+    return fetch_values(url, parse_soup, session, policy, cache)
+
+
+class FetchPolicy(object):
+    """Timeouts, retries and hedging applied to each page request.
+
+    Args:
+        timeout: Per-request timeout in seconds, either a single number
+            or a (connect, read) tuple.
+        retries: Additional attempts after a failed request.
+        backoff: Seconds before the first retry, doubled for each
+            further retry up to `backoff_max`.
+        backoff_max: Longest wait between two attempts.
+        hedge_after: Send a second request if the first has not answered
+            after this many seconds. None disables fixed hedging.
+        hedge_percentile: Send a second request after this percentile
+            (0-100) of recent latencies, once `MIN_HEDGE_SAMPLES` have
+            been recorded. Takes precedence over `hedge_after`.
+        history: Number of recent latencies kept.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=3, backoff=1.0,
+                 backoff_max=30.0, hedge_after=None, hedge_percentile=None,
+                 history=200):
+        # type: (Any, int, float, float, Optional[float], Optional[float], int) -> None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.latencies = collections.deque(maxlen=history)  # type: collections.deque
+        self._lock = threading.Lock()
+
+    def backoff_delay(self, attempt):
+        # type: (int) -> float
+        """Seconds to wait after failed attempt number `attempt`."""
+        return min(self.backoff * 2 ** (attempt - 1), self.backoff_max)
+
+    def record_latency(self, latency):
+        # type: (float) -> None
+        """Remember the latency of a successful request."""
+        with self._lock:
+            self.latencies.append(latency)
+
+    def hedge_delay(self):
+        # type: () -> Optional[float]
+        """Seconds to wait before hedging or None to never hedge."""
+        if self.hedge_percentile is not None:
+            with self._lock:
+                latencies = sorted(self.latencies)
+            if len(latencies) >= MIN_HEDGE_SAMPLES:
+                rank = int(math.ceil(
+                    self.hedge_percentile / 100.0 * len(latencies)))
+                return latencies[min(max(rank, 1), len(latencies)) - 1]
+        return self.hedge_after
+
+
+# pylint: disable=too-few-public-methods
+class FetchRecord(object):
+    """How a single page was fetched.
+
+    Attributes:
+        url(str): The requested url.
+        latency(float): Seconds from the first attempt to the response,
+            including retries and backoff.
+        attempts(int): Number of attempts, 1 if the first succeeded.
+        hedged(bool): Whether a hedged request was sent on the final attempt.
+    """
+    def __init__(self, url, latency, attempts, hedged):
+        # type: (str, float, int, bool) -> None
+        self.url = url
+        self.latency = latency
+        self.attempts = attempts
+        self.hedged = hedged
+
+
+class PageCache(object):
+    """Remembers validators, content hashes and extracted values per url.
+
+    Entries are keyed by url and extract function, so the same page may be
+    cached both as soup and as extracted values.
+
+    A page is a cache hit when the server answers a conditional request
+    with 304 Not Modified, or when the downloaded content hashes to the
+    same digest as last time. Hits reuse the values extracted previously.
+
+    Attributes:
+        hits(int): Number of fetches answered from the cache.
+        misses(int): Number of fetches which had to be extracted.
+    """
+    def __init__(self):
+        # type: () -> None
+        self.entries = {}  # type: Dict[Tuple[str, Callable], CacheEntry]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def conditional_headers(self, url, extract):
+        # type: (str, Callable[[bytes], Any]) -> Dict[str, str]
+        """Return the If-None-Match/If-Modified-Since headers for `url`."""
+        headers = {}
+        with self._lock:
+            entry = self.entries.get((url, extract))
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def resolve(self, url, response, extract):
+        # type: (str, requests.Response, Callable[[bytes], Any]) -> Any
+        """Return the values for `response`, extracting only on a miss."""
+        with self._lock:
+            entry = self.entries.get((url, extract))
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if entry is not None and response.status_code == 304:
+            # A 304 may omit the validators, keep the ones we sent
+            digest = entry.digest
+            etag = etag or entry.etag
+            last_modified = last_modified or entry.last_modified
+        else:
+            digest = hashlib.sha1(response.content).hexdigest()
+        if entry is not None and entry.digest == digest:
+            values = entry.values
+            hit = True
+        else:
+            values = extract(response.content)
+            hit = False
+        metrics.count("scrape_fto.page_cache_hits" if hit
+                      else "scrape_fto.page_cache_misses")
+        with self._lock:
+            self.entries[(url, extract)] = CacheEntry(
+                etag=etag,
+                last_modified=last_modified,
+                digest=digest,
+                values=values)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return values
+
+
+# pylint: disable=too-few-public-methods
+class CacheEntry(object):
+    """Cached state of a single page."""
+    def __init__(self, etag, last_modified, digest, values):
+        # type: (Optional[str], Optional[str], str, Any) -> None
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.values = values
+
+
+def extract_population(content):
+    # type: (bytes) -> str
+    """Returns population size string from raw main page html.
+
+    Falls back to parsing the whole page with beautiful soup if the
+    markup no longer matches `POPULATION_PATTERN`.
+    """
+    match = POPULATION_PATTERN.search(content)
+    if match is None:
+        log.debug("Population pattern not found, falling back to soup")
+        return get_population(parse_soup(content))
+    return match.group(1).decode("ascii")
+
+
+def extract_signup_values(content):
+    # type: (bytes) -> Tuple[str, str]
+    """Returns birth queue size and pregnant mothers from raw signup html.
+
+    Both values are collected in a single scan which stops as soon as
+    they have been found. Falls back to beautiful soup if either value
+    is missing.
+
+    Returns:
+        A (birth queue size, pregnant mothers) tuple of strings.
+    """
+    found = {}  # type: Dict[bytes, str]
+    for match in SIGNUP_PATTERN.finditer(content):
+        found.setdefault(match.group(1), match.group(2).decode("ascii"))
+        if len(found) == 2:
+            return found[BIRTH_QUEUE_KEY], found[PREGNANT_MOTHERS_KEY]
+    log.debug("Signup pattern not found, falling back to soup")
+    soup = parse_soup(content)
+    return get_birth_queue_size(soup), get_pregnant_mothers(soup)
 
 
 def get_population(soup):
@@ -105,10 +589,15 @@ def get_pregnant_mothers(soup):
     return pregnant_mothers
 
 
-def csv_format_time():
-    # type: () -> str
-    """Get time in correct format for google docs"""
-    return time.strftime("%m/%d/%y-%H", time.gmtime())
+def csv_format_time(resolution='hour'):
+    # type: (str) -> str
+    """Get time in correct format for google docs
+
+    Args:
+        resolution: 'hour' for the original `MM/DD/YY-HH` format, or
+            'minute'/'second' to append `:MM`/`:MM:SS` for finer sampling.
+    """
+    return format_time(resolution=resolution)
 
 if __name__ == "__main__":
     main()
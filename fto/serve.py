@@ -0,0 +1,600 @@
+#!/usr/bin/env python
+"""Serve the csv, window csvs, graph and web page of a directory over http.
+
+    python -m fto serve /var/www/fto --port 8000
+
+Files with a suffix of `CONTENT_TYPES` are served, other files and hidden
+ones are not, so the sidecar caches and states next to the csv stay private.
+
+- Every response has a strong ETag, a hash of the content, and a
+  Last-Modified date, and conditional requests are answered with 304 Not
+  Modified.
+- Range requests are answered with 206 Partial Content, so a client which
+  already has the first bytes of a growing csv asks for `bytes=N-` and only
+  downloads the rows appended since.
+- Text files are sent compressed with brotli if the brotli package is
+  installed and the client accepts it, or else with gzip.
+- Files are kept in memory with their hash and compressed forms, up to
+  `--cache-size` bytes, and only read and compressed again once their size
+  or modification time changes.
+
+Requests are handled by asyncio on one thread, reading and compressing files
+is done in a thread pool.
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import email.utils
+import gzip
+import hashlib
+import http
+import logging
+import os
+import stat
+import sys
+from urllib.parse import unquote, urlsplit
+
+# pylint: disable=unused-import
+from typing import Any, Dict, List, Optional, Tuple  # NOQA
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import metrics
+
+
+DEFAULT_PORT = 8000
+
+# Suffix -> Content-Type of the files served
+CONTENT_TYPES = {
+    '.csv': 'text/csv; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain; charset=utf-8',
+}
+
+# Suffixes of the files worth compressing
+COMPRESSIBLE = frozenset(['.csv', '.html', '.json', '.svg', '.txt'])
+
+# Files smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+
+# Brotli's default of 11 takes seconds for a csv of a few MB
+BROTLI_QUALITY = 5
+
+# Content-Encoding -> function compressing bytes
+COMPRESSORS = collections.OrderedDict()  # type: Dict[str, Any]
+if brotli is not None:
+    COMPRESSORS['br'] = lambda content: brotli.compress(
+        content, quality=BROTLI_QUALITY)
+COMPRESSORS['gzip'] = lambda content: gzip.compress(
+    content, GZIP_LEVEL, mtime=0)
+
+# Encodings offered, most preferred first
+ENCODINGS = tuple(COMPRESSORS)
+
+# Bytes of files and their compressed forms kept in memory
+DEFAULT_CACHE_SIZE = 256 << 20
+
+# Longest request head accepted
+MAX_HEADER_SIZE = 64 << 10
+
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 60
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class RangeNotSatisfiableError(Error):
+    """Error when a requested range starts after the end of the file."""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    vargs = parse_args()
+    if vargs.pop('verbose'):
+        log.setLevel(logging.DEBUG)
+        metrics.enable()
+    if not os.path.isdir(vargs['root']):
+        log.error("%s is not a directory", vargs['root'])
+        sys.exit(1)
+    try:
+        run(**vargs)
+    except KeyboardInterrupt:
+        log.info("Stopped")
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='directory of the files to serve')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on. Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='port to listen on. Default: %d' % DEFAULT_PORT)
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+        help='bytes of files kept in memory. Default: %d' % DEFAULT_CACHE_SIZE)
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
+    return vars(parser.parse_args())
+
+
+def run(root, host='127.0.0.1', port=DEFAULT_PORT,
+        cache_size=DEFAULT_CACHE_SIZE):
+    # type: (str, str, int, int) -> None
+    """Serve the files of `root` until interrupted."""
+    server = ArtifactServer(root, ArtifactCache(cache_size))
+    asyncio.run(server.serve_forever(host, port))
+
+
+class Artifact(object):
+    """The content of a file and what is derived from it.
+
+    Args:
+        path: Path of the file.
+        signature: Size, modification time and inode of the file when
+            `content` was read.
+        content: The bytes of the file.
+    """
+    def __init__(self, path, signature, content):
+        # type: (str, Tuple[int, int, int], bytes) -> None
+        self.path = path
+        self.signature = signature
+        self.content = content
+        self.digest = hashlib.sha1(content).hexdigest()
+        self.last_modified = email.utils.formatdate(
+            signature[1] // 10 ** 9, usegmt=True)
+        self.content_type = CONTENT_TYPES[
+            os.path.splitext(path)[1].lower()]
+        # Encoding -> compressed content, None if it would not be smaller
+        self.encoded = {}  # type: Dict[str, Optional[bytes]]
+
+    @classmethod
+    def read(cls, path):
+        # type: (str) -> Artifact
+        """Read the file at `path`.
+
+        Only the bytes up to the size at the time of reading are kept, so
+        that a file being appended to is read again once it has grown.
+        """
+        with open(path, "rb") as artifact_fh:
+            file_stat = os.fstat(artifact_fh.fileno())
+            content = artifact_fh.read(file_stat.st_size)
+        return cls(path, signature(file_stat), content)
+
+    @property
+    def compressible(self):
+        # type: () -> bool
+        """Whether compressing the content is worth it."""
+        return (os.path.splitext(self.path)[1].lower() in COMPRESSIBLE and
+                len(self.content) >= MIN_COMPRESS_SIZE)
+
+    @property
+    def nbytes(self):
+        # type: () -> int
+        """Bytes held by the content and its compressed forms."""
+        return len(self.content) + sum(
+            len(encoded) for encoded in self.encoded.values() if encoded)
+
+    def etag(self, encoding=None):
+        # type: (Optional[str]) -> str
+        """Return the strong ETag of the content in `encoding`."""
+        if encoding is None:
+            return '"%s"' % self.digest
+        return '"%s-%s"' % (self.digest, encoding)
+
+    def etags(self):
+        # type: () -> List[str]
+        """Return the ETags of every encoding of the content."""
+        return [self.etag(encoding) for encoding in (None,) + ENCODINGS]
+
+    def encode(self, encoding):
+        # type: (str) -> Optional[bytes]
+        """Return the content compressed with `encoding`, compressing it
+        on first use, or None if that is not smaller."""
+        if encoding not in self.encoded:
+            encoded = COMPRESSORS[encoding](self.content)
+            self.encoded[encoding] = (
+                encoded if len(encoded) < len(self.content) else None)
+        return self.encoded[encoding]
+
+
+class ArtifactCache(object):
+    """Artifacts by path, evicting the least recently used beyond
+    `max_bytes`."""
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE):
+        # type: (int) -> None
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # type: Dict[str, Artifact]
+
+    def get(self, path, file_signature):
+        # type: (str, Tuple[int, int, int]) -> Optional[Artifact]
+        """Return the artifact of `path` if it is still `file_signature`."""
+        artifact = self.entries.get(path)
+        if artifact is None or artifact.signature != file_signature:
+            return None
+        self.entries.move_to_end(path)
+        return artifact
+
+    def put(self, artifact):
+        # type: (Artifact) -> None
+        """Keep `artifact`, evicting others to stay under max_bytes."""
+        self.entries[artifact.path] = artifact
+        self.entries.move_to_end(artifact.path)
+        self.evict()
+
+    def evict(self):
+        # type: () -> None
+        """Drop the least recently used artifacts beyond max_bytes."""
+        total = sum(artifact.nbytes for artifact in self.entries.values())
+        while total > self.max_bytes and self.entries:
+            _, artifact = self.entries.popitem(last=False)
+            total -= artifact.nbytes
+
+
+class Response(object):
+    """Status, headers and body of a response."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self, status, headers=None, body=b""):
+        # type: (int, Optional[List[Tuple[str, str]]], bytes) -> None
+        self.status = status
+        self.headers = headers or []
+        self.body = body
+
+
+class ArtifactServer(object):
+    """Answers GET and HEAD requests for the files of `root`."""
+    def __init__(self, root, cache=None):
+        # type: (str, Optional[ArtifactCache]) -> None
+        self.root = os.path.abspath(root)
+        self.cache = cache if cache is not None else ArtifactCache()
+        # Path -> task reading it, shared by concurrent requests
+        self._loading = {}  # type: Dict[str, asyncio.Future]
+
+    async def serve_forever(self, host='127.0.0.1', port=DEFAULT_PORT):
+        # type: (str, int) -> None
+        """Listen on `host`:`port` and answer requests until cancelled."""
+        server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+        log.info("Serving %s on http://%s:%d/", self.root, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        # type: (asyncio.StreamReader, asyncio.StreamWriter) -> None
+        """Answer the requests of one connection until it is closed."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, Response(431), False)
+                    break
+                request = parse_request(head)
+                if request is None:
+                    await self.send(writer, Response(400), False)
+                    break
+                method, target, version, headers = request
+                # Request bodies are not read, so the connection cannot be
+                # reused after one
+                keep_alive = (version == "HTTP/1.1" and
+                              headers.get("connection", "").lower() != "close"
+                              and not has_body(headers))
+                response = await self.respond(method, target, headers)
+                log.debug("%s %s %d %d bytes", method, target,
+                          response.status, len(response.body))
+                await self.send(writer, response, keep_alive,
+                                method != "HEAD")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def send(writer, response, keep_alive, body=True):
+        # type: (asyncio.StreamWriter, Response, bool, bool) -> None
+        """Write `response` to the connection."""
+        lines = ["HTTP/1.1 %d %s" % (response.status,
+                                     http.HTTPStatus(response.status).phrase),
+                 "Date: %s" % email.utils.formatdate(usegmt=True),
+                 "Connection: %s" % ("keep-alive" if keep_alive else "close")]
+        lines.extend("%s: %s" % header for header in response.headers)
+        if response.status != 304:
+            lines.append("Content-Length: %d" % len(response.body))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body:
+            writer.write(response.body)
+        await writer.drain()
+
+    async def respond(self, method, target, headers):
+        # type: (str, str, Dict[str, str]) -> Response
+        """Return the response to a request."""
+        metrics.count("serve.requests")
+        if method not in ("GET", "HEAD"):
+            return Response(405, [("Allow", "GET, HEAD")])
+        path = self.resolve(target)
+        artifact = await self.artifact(path) if path is not None else None
+        if artifact is None:
+            return Response(404)
+        validators = [("ETag", artifact.etag()),
+                      ("Last-Modified", artifact.last_modified),
+                      ("Cache-Control", "no-cache"),
+                      ("Accept-Ranges", "bytes"),
+                      ("Vary", "Accept-Encoding")]
+        if is_not_modified(artifact, headers):
+            metrics.count("serve.not_modified")
+            etag = matching_etag(artifact, headers)
+            if etag is None:
+                # Matched by * or by date, name what a 200 would send
+                etag = artifact.etag(
+                    await self.response_encoding(artifact, headers))
+            validators[0] = ("ETag", etag)
+            return Response(304, validators)
+        size = len(artifact.content)
+        validators.append(("Content-Type", artifact.content_type))
+        if "range" in headers and if_range_matches(artifact, headers):
+            try:
+                byte_range = parse_range(headers["range"], size)
+            except RangeNotSatisfiableError:
+                return Response(416, [("Content-Range", "bytes */%d" % size)])
+            if byte_range is not None:
+                # Ranges are of the identity encoding
+                start, stop = byte_range
+                metrics.count("serve.partial")
+                return Response(206, validators + [
+                    ("Content-Range",
+                     "bytes %d-%d/%d" % (start, stop - 1, size))],
+                                artifact.content[start:stop])
+        encoding = await self.response_encoding(artifact, headers)
+        if encoding is not None:
+            validators[0] = ("ETag", artifact.etag(encoding))
+            return Response(200, validators + [
+                ("Content-Encoding", encoding)], artifact.encode(encoding))
+        return Response(200, validators, artifact.content)
+
+    async def response_encoding(self, artifact, headers):
+        # type: (Artifact, Dict[str, str]) -> Optional[str]
+        """Return the encoding a 200 response sends `artifact` in, or None
+        for the identity encoding, compressing it on first use."""
+        if not artifact.compressible:
+            return None
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            return None
+        encoded = await asyncio.get_event_loop().run_in_executor(
+            None, artifact.encode, encoding)
+        self.cache.evict()
+        return encoding if encoded is not None else None
+
+    def resolve(self, target):
+        # type: (str) -> Optional[str]
+        """Return the file path of a request target, or None if it is
+        not one which is served."""
+        parts = [part for part in unquote(urlsplit(target).path).split("/")
+                 if part]
+        if target.split("?")[0].endswith("/"):
+            parts.append("index.html")
+        if (not parts or any(part.startswith(".") or os.sep in part
+                             for part in parts) or
+                os.path.splitext(parts[-1])[1].lower() not in CONTENT_TYPES):
+            return None
+        return os.path.join(self.root, *parts)
+
+    async def artifact(self, path):
+        # type: (str) -> Optional[Artifact]
+        """Return the current Artifact of `path`, or None if it is not a
+        readable file."""
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        artifact = self.cache.get(path, signature(file_stat))
+        if artifact is not None:
+            return artifact
+        task = self._loading.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._load(path))
+            self._loading[path] = task
+        try:
+            return await task
+        except OSError as e:
+            log.warning("Could not read %s: %s", path, e)
+            return None
+        finally:
+            if self._loading.get(path) is task:
+                del self._loading[path]
+
+    async def _load(self, path):
+        # type: (str) -> Artifact
+        """Read `path` in the thread pool and cache it."""
+        metrics.count("serve.cache_misses")
+        artifact = await asyncio.get_event_loop().run_in_executor(
+            None, Artifact.read, path)
+        self.cache.put(artifact)
+        return artifact
+
+
+def signature(file_stat):
+    # type: (os.stat_result) -> Tuple[int, int, int]
+    """Return what changes when a file is replaced or appended to."""
+    return (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+
+
+def parse_request(head):
+    # type: (bytes) -> Optional[Tuple[str, str, str, Dict[str, str]]]
+    """Parse a request head into the method, target, version and headers.
+
+    Header names are lowercased. Returns None if `head` is malformed.
+    """
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        return None
+    if not version.startswith("HTTP/1."):
+        return None
+    headers = {}  # type: Dict[str, str]
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(":")
+        if not separator:
+            return None
+        name = name.strip().lower()
+        value = value.strip()
+        headers[name] = ("%s, %s" % (headers[name], value)
+                         if name in headers else value)
+    return method, target, version, headers
+
+
+def has_body(headers):
+    # type: (Dict[str, str]) -> bool
+    """Return True if the headers announce a request body."""
+    return ("transfer-encoding" in headers or
+            headers.get("content-length", "0").strip() not in ("", "0"))
+
+
+def is_not_modified(artifact, headers):
+    # type: (Artifact, Dict[str, str]) -> bool
+    """Return True if the client's copy, per the conditional headers of
+    the request, is current."""
+    if "if-none-match" in headers:
+        tags = none_match_tags(headers)
+        return "*" in tags or matching_etag(artifact, headers) is not None
+    if "if-modified-since" in headers:
+        since = parse_http_date(headers["if-modified-since"])
+        return (since is not None and
+                artifact.signature[1] // 10 ** 9 <= since)
+    return False
+
+
+def none_match_tags(headers):
+    # type: (Dict[str, str]) -> List[str]
+    """Return the ETags of If-None-Match, without weak prefixes."""
+    tags = [tag.strip() for tag in headers.get("if-none-match", "").split(",")]
+    # Weak comparison
+    return [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def matching_etag(artifact, headers):
+    # type: (Artifact, Dict[str, str]) -> Optional[str]
+    """Return the ETag of an encoding of `artifact` which If-None-Match
+    names, or None. Any encoding of the same content matches."""
+    etags = artifact.etags()
+    for tag in none_match_tags(headers):
+        if tag in etags:
+            return tag
+    return None
+
+
+def if_range_matches(artifact, headers):
+    # type: (Artifact, Dict[str, str]) -> bool
+    """Return True if a Range may be applied: there is no If-Range or it
+    strongly matches the content."""
+    if_range = headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == artifact.etag()
+    return if_range == artifact.last_modified
+
+
+def parse_range(header, size):
+    # type: (str, int) -> Optional[Tuple[int, int]]
+    """Return the [start, stop) bytes of a single range `header`.
+
+    Returns None for headers which are ignored: other units, several
+    ranges or malformed ones, which are answered with the whole file.
+
+    Raises:
+        RangeNotSatisfiableError if the range starts after the end.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first + last).isdigit():
+        return None
+    if not first:
+        # The last `last` bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiableError(header)
+        return max(size - int(last), 0), size
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if start >= size:
+        raise RangeNotSatisfiableError(header)
+    if stop <= start:
+        return None
+    return start, stop
+
+
+def choose_encoding(accept_encoding):
+    # type: (str) -> Optional[str]
+    """Return the most preferred of ENCODINGS the client accepts."""
+    accepted = {}  # type: Dict[str, float]
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def parse_http_date(text):
+    # type: (str) -> Optional[int]
+    """Return the unix time of a http date, or None if it is invalid.
+
+    Http dates are in GMT, dates without a timezone are taken as UTC
+    rather than local time.
+    """
+    try:
+        parsed = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+
+if __name__ == "__main__":
+    main()
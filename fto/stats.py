@@ -1,22 +1,94 @@
 """Generating Statistics from fto data.
 
-TODO
-    - group by day instead of month initially since months
-        do not have a uniform amount of time.i
+Monthly counts and averages are folded into a `StatsAccumulator` one
+sample at a time. The accumulator can be kept in a pickle between runs,
+and is otherwise kept in the process, so refreshing the statistics after
+new samples only processes those samples however long the history is.
+A kept state is only resumed if the data still holds the samples it
+folded, so a rewritten or truncated history is processed again.
+
+`rollup` counts births, deaths and pregnancies per period of any pandas
+frequency, such as days or weeks, in one vectorized pass.
 """
 
+import calendar
+import collections
 import datetime
+import logging
+import pickle
+import re
+import threading
+import warnings
 
 # pylint: disable=unused-import
-from typing import Tuple, Iterable, Iterator
+from typing import Any, Dict, List, Optional, Tuple, Iterable, Iterator  # NOQA
 import attr
+import numpy as np
 import pandas as pd
 
+from . import atomic
+from . import hourly
+from . import metrics
+
+
+# Suffix of the accumulator state kept next to a csv
+STATE_SUFFIX = ".ftostats"
+
+# Rollup label strftime formats by the name of the frequency offset
+LABEL_FORMATS = {
+    'h': "%B %d %Y %H:00",
+    'D': "%B %d %Y",
+    'W': "Week of %B %d %Y",
+    'MS': "%B %Y",
+    'ME': "%B %Y",
+    'QS': "%B %Y",
+    'YS': "%Y",
+    'YE': "%Y",
+}
+
+# Label strftime format of frequencies not in LABEL_FORMATS
+DEFAULT_LABEL_FORMAT = "%Y-%m-%d %H:%M"
+
+# strftime directive -> function of a DatetimeIndex returning its strings,
+# see format_dates
+DATE_FIELDS = {
+    'Y': lambda index: index.year.values.astype(str),
+    'y': lambda index: np.char.zfill((index.year.values % 100).astype(str), 2),
+    'm': lambda index: np.char.zfill(index.month.values.astype(str), 2),
+    'd': lambda index: np.char.zfill(index.day.values.astype(str), 2),
+    'H': lambda index: np.char.zfill(index.hour.values.astype(str), 2),
+    'M': lambda index: np.char.zfill(index.minute.values.astype(str), 2),
+    'B': lambda index: np.array(calendar.month_name)[index.month.values],
+    'b': lambda index: np.array(calendar.month_abbr)[index.month.values],
+    '%': lambda index: np.full(len(index), "%"),
+}
+
+ROLLUP_COLUMNS = ["Births", "Deaths", "Pregnancies"]
 
-def generate_monthly_dataframe(fto_df):
-    # type: (pd.DataFrame) -> pd.DataFrame
+# Days of the rolling windows of rolling_stats
+PROJECTION_WINDOWS = (7, 30, 90)
+
+SECONDS_PER_DAY = 86400
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+# State class -> the state last updated without a state path, see restore
+_process_states = {}  # type: Dict[type, PickledState]
+# Held while a state is restored and updated
+_states_lock = threading.Lock()
+
+
+@metrics.timed("stats.generate_monthly_dataframe")
+def generate_monthly_dataframe(fto_df, state_path=None):
+    # type: (pd.DataFrame, Optional[str]) -> pd.DataFrame
     """Generate monthly statistics from interval dataframe.
 
+    Args:
+        fto_df: fto interval data
+        state_path: Where to keep the accumulated statistics between runs,
+            see `accumulate`. Default: keep them in this process
+
     Returns:
 
         A dataframe with the following columns:
@@ -30,18 +102,88 @@ def generate_monthly_dataframe(fto_df):
 
         The exact number of births and deaths cannot be directly determined
         since a birth and a death can cancel out. The given data is the lower
-        bound.
+        bound. The first month is left out since it is only partly sampled.
+    """
+    return accumulate(fto_df, state_path).monthly_dataframe()
+
+
+@metrics.timed("stats.rollup")
+def rollup(fto_df, freq='D', label_format=None, drop_partial=True):
+    # type: (pd.DataFrame, str, Optional[str], bool) -> pd.DataFrame
+    """Count births, deaths and pregnancies per period of `freq`.
+
+    The deltas of all three counts are computed once and summed with a
+    single resample, and the labels are formatted for the whole index at
+    once.
+
+    Args:
+        fto_df: fto interval data, or `fto.hourly.HourlyArrays` whose
+            changes over gaps are spread over the missing hours, so that
+            counts may be fractional.
+        freq: A pandas frequency such as 'D', 'W', 'MS' or '6h'.
+        label_format: strftime format of the "Period" column. Default: from
+            `LABEL_FORMATS` by the kind of `freq`
+        drop_partial: Leave out the first period, which is only partly
+            sampled. Default: True
+
+    Returns:
+        A DataFrame indexed by the start of each period (the end for
+        frequencies anchored there, such as 'W') with the "Births",
+        "Deaths" and "Pregnancies" lower bounds, as in
+        generate_monthly_dataframe, and a "Period" label column. Periods
+        without samples count zero.
+    """
+    if isinstance(fto_df, hourly.HourlyArrays):
+        index = pd.DatetimeIndex(fto_df.times, name='Date')
+        population_delta = fto_df.spread_delta("Population")
+        mother_delta = fto_df.spread_delta("Pregnant Mothers")
+    else:
+        index = fto_df.index
+        population = fto_df["Population"].values.astype(np.int64)
+        mothers = fto_df["Pregnant Mothers"].values.astype(np.int64)
+        population_delta = np.diff(population, prepend=population[:1])
+        mother_delta = np.diff(mothers, prepend=mothers[:1])
+    deltas = pd.DataFrame(collections.OrderedDict([
+        ("Births", np.maximum(population_delta, 0)),
+        ("Deaths", np.maximum(-population_delta, 0)),
+        ("Pregnancies", np.maximum(mother_delta, 0)),
+    ]), index=index)
+    rolled = deltas.resample(freq).sum()
+    if drop_partial:
+        rolled = rolled.iloc[1:]
+    if label_format is None:
+        label_format = rollup_label_format(freq)
+    rolled.insert(0, "Period", format_dates(rolled.index, label_format))
+    return rolled
+
+
+def format_dates(index, date_format):
+    # type: (pd.DatetimeIndex, str) -> np.ndarray
+    """Format every date of `index` with the strftime `date_format`.
+
+    Each directive is formatted for the whole index at once with
+    `DATE_FIELDS`, which is much faster than strftime per date. Formats
+    with other directives fall back to `index.strftime`.
     """
-    population_delta = create_delta(fto_df["Population"])
-    mother_delta = create_delta(fto_df["Pregnant Mothers"])
-    deltas = (
-        (population_delta[population_delta > 0], "Births"),
-        (population_delta[population_delta < 0].abs(), "Deaths"),
-        (mother_delta[mother_delta > 0], "Pregnancies"),
-    )
-    monthly_series = (process_delta(*args) for args in deltas)
-    monthly_df = pd.concat(monthly_series, axis=1).reset_index()
-    return monthly_df
+    parts = re.split(r"%(.)", date_format)
+    # Directives are at the odd positions
+    if any(part not in DATE_FIELDS for part in parts[1::2]):
+        return np.asarray(index.strftime(date_format), dtype=object)
+    labels = np.full(len(index), parts[0], dtype=object)
+    for number, part in enumerate(parts[1:]):
+        if number % 2:
+            labels += part
+        else:
+            labels += DATE_FIELDS[part](index).astype(object)
+    return labels
+
+
+def rollup_label_format(freq):
+    # type: (str) -> str
+    """Return the label format of `freq` from `LABEL_FORMATS`."""
+    name = pd.tseries.frequencies.to_offset(freq).name
+    # Anchored offsets are named like W-SUN or YS-JAN
+    return LABEL_FORMATS.get(name.split("-")[0], DEFAULT_LABEL_FORMAT)
 
 
 def create_delta(series):
@@ -59,62 +201,465 @@ def create_delta(series):
     array([1, 1, -2])
     """
     dtype = series.dtype
+    if dtype.kind == 'u':
+        # Deltas of unsigned counts may be negative
+        dtype = np.dtype('int64')
     return (series - series.shift()).dropna().astype(dtype)
 
 
-def average_stats(fto_df, monthly_df):
-    # type: (pd.DataFrame, pd.DataFrame) -> Tuple[Record, ...]
+@metrics.timed("stats.average_stats")
+def average_stats(fto_df, monthly_df=None, state_path=None):
+    # type: (pd.DataFrame, Optional[pd.DataFrame], Optional[str]) -> Tuple[Record, ...]
     """Generate summary statistic records from fto data.
 
     Args:
         fto_df: fto interval data
-        monthly_df: fto monthly data derived from fto_df
+        monthly_df: Deprecated and ignored, the monthly counts are
+            accumulated from `fto_df`.
+        state_path: See generate_monthly_dataframe.
 
     Returns:
         A tuple of Record objects, denoting the name, value, and units
         of the summary metric.
     """
-    min_births = monthly_df["Births"]
-    min_pregnancies = monthly_df["Pregnancies"]
-    avg_births_per_month = min_births.mean()
-    interval_birth_queue = fto_df["Birth Queue"]
-    avg_birth_queue_size = interval_birth_queue.mean()
-    current_birth_queue_size = interval_birth_queue.iloc[-1]
-
-    avg_num_babies_per_pregnancy = (min_births / min_pregnancies).mean()
-    average_birth_queue_months = (avg_birth_queue_size / avg_births_per_month)
-    birth_queue_now = (current_birth_queue_size / avg_births_per_month)
-
-    return (
-        Record("Average Birth Queue Time",  # type: ignore
-               average_birth_queue_months,
-               "months"),
-
-        Record("Projected Birth Queue Time Entering Now",  # type: ignore
-               birth_queue_now,
-               "months"),
-
-        Record("Average Number of Babies per Pregnancy",  # type: ignore
-               avg_num_babies_per_pregnancy,
-               "babies"),
-    )
-
-
-def process_delta(delta, name):
-    # type: (pd.Series, str) -> pd.Series
-    """Take a delta of a column
+    if monthly_df is not None:
+        warnings.warn("average_stats ignores monthly_df, the monthly counts "
+                      "are accumulated from fto_df", DeprecationWarning,
+                      stacklevel=2)
+    return accumulate(fto_df, state_path).average_stats()
+
+
+@metrics.timed("stats.accumulate")
+def accumulate(fto_df, state_path=None):
+    # type: (pd.DataFrame, Optional[str]) -> StatsAccumulator
+    """Return the StatsAccumulator of `fto_df`.
+
+    The accumulator saved at `state_path`, or without it the one of the
+    last call in this process, is resumed if `fto_df` still holds the
+    samples it folded, see `restore`. Only the rows of `fto_df` after its
+    last sample are then folded in, and it is kept again.
+    """
+    with _states_lock:
+        accumulator = restore(StatsAccumulator, fto_df, state_path)
+        if accumulator is None:
+            accumulator = StatsAccumulator()
+        if accumulator.update(fto_df):
+            keep(accumulator, state_path)
+    return accumulator
+
+
+@metrics.timed("stats.rolling_stats")
+def rolling_stats(fto_df, windows=PROJECTION_WINDOWS, state_path=None):
+    # type: (pd.DataFrame, Iterable[int], Optional[str]) -> Tuple[Record, ...]
+    """Generate summary records over the last days of fto data.
+
+    Unlike average_stats, which averages the whole history, these follow
+    changes of the birth rate. For each window of `windows` days, the
+    records are the births per day, the babies per pregnancy and the
+    projected birth queue time of someone entering now.
+
+    Args:
+        fto_df: fto interval data
+        windows: Window lengths in days. Default: `PROJECTION_WINDOWS`
+        state_path: Where to keep the RollingWindows between runs, so that
+            only rows after the last run are processed. Default: keep
+            them in this process. See `accumulate`.
+
+    Returns:
+        A tuple of Record objects, three per window.
+    """
+    windows = tuple(windows)
+    with _states_lock:
+        rolling = restore(RollingWindows, fto_df, state_path)
+        if rolling is None or rolling.windows != windows:
+            rolling = RollingWindows(windows)
+        if rolling.update(fto_df):
+            keep(rolling, state_path)
+        return rolling.records()
+
+
+def default_state_path(csv_path):
+    # type: (str) -> str
+    """Return the accumulator state path kept next to `csv_path`."""
+    return csv_path + STATE_SUFFIX
+
+
+def restore(state_class, fto_df, state_path=None):
+    # type: (type, pd.DataFrame, Optional[str]) -> Optional[Any]
+    """Return the kept state of `state_class` which `fto_df` continues.
+
+    The state is loaded from `state_path`, or without it is the one last
+    kept in this process.
+
+    Returns:
+        None if there is no state, or if `fto_df` no longer holds the
+        samples it folded, see `PickledState.follows`.
+    """
+    if state_path is None:
+        state = _process_states.get(state_class)
+    else:
+        state = state_class.load(state_path)
+    if state is not None and not state.follows(fto_df):
+        log.info("Statistics state %s does not match the data, recomputing",
+                 state_path or "of this process")
+        return None
+    return state
+
+
+def keep(state, state_path=None):
+    # type: (PickledState, Optional[str]) -> None
+    """Save `state` at `state_path`, or without it keep it in this process."""
+    if state_path is None:
+        _process_states[type(state)] = state
+    else:
+        state.save(state_path)
+
+
+class PickledState(object):
+    """Samples folded so far, which are kept in a pickle between runs.
+
+    Attributes:
+        first: The first folded sample, see StatsAccumulator.last, or
+            None before the first.
+        last: The last folded sample, or None before the first.
+        count: The number of folded samples.
+    """
+    # Defaults of states pickled before these were kept
+    first = None  # type: Optional[Tuple[int, int, int, int]]
+    last = None  # type: Optional[Tuple[int, int, int, int]]
+    count = 0
+
+    def follows(self, fto_df):
+        # type: (pd.DataFrame) -> bool
+        """Return True if `fto_df` starts with the folded samples.
+
+        The first and last folded samples and the number of rows up to the
+        last are compared, which is enough to notice a history which was
+        rewritten, truncated or had rows removed since.
+        """
+        if self.last is None:
+            return True
+        if self.first is None:
+            return False
+        times = fto_df.index.values.astype('datetime64[s]').astype(np.int64)
+        end = times.searchsorted(self.last[0], side='right')
+        if end != self.count:
+            return False
+        return (sample_at(fto_df, times, 0) == self.first and
+                sample_at(fto_df, times, end - 1) == self.last)
+
+    def fold(self, samples):
+        # type: (Dict[str, np.ndarray]) -> None
+        """Record `samples` of new_samples as folded."""
+        if self.first is None:
+            self.first = first_sample(samples)
+        self.last = last_sample(samples)
+        self.count += len(samples['time'])
+
+    @classmethod
+    def load(cls, path):
+        # type: (str) -> Optional[Any]
+        """Load the state saved at `path`, or None if there is none."""
+        try:
+            with open(path, "rb") as state_fh:
+                state = pickle.load(state_fh)
+        except (OSError, IOError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError) as e:
+            log.debug("No usable statistics state at %s: %s", path, e)
+            return None
+        return state if isinstance(state, cls) else None
+
+    def save(self, path):
+        # type: (str) -> None
+        """Atomically replace the state at `path` with this one."""
+        try:
+            with atomic.replacing(path, "wb") as state_fh:
+                pickle.dump(self, state_fh, pickle.HIGHEST_PROTOCOL)
+        except (OSError, IOError) as e:
+            log.warning("Could not write statistics state %s: %s", path, e)
+
+
+def new_samples(fto_df, last=None):
+    # type: (pd.DataFrame, Optional[Tuple[int, int, int, int]]) -> Optional[Dict[str, np.ndarray]]
+    """Return the rows of `fto_df` after the sample `last` as int64 arrays.
+
+    Args:
+        fto_df: fto interval data
+        last: A sample as (unix time, population, pregnant mothers, birth
+            queue), see last_sample. Default: every row is new
+
+    Returns:
+        None if there are no new rows, otherwise a dict of the "time",
+        "population", "mothers" and "queue" of the new rows, and the
+        "population_delta" and "mother_delta" from the previous row. The
+        first row is compared with `last`, or has no change without it.
+    """
+    times = fto_df.index.values.astype('datetime64[s]').astype(np.int64)
+    if last is not None:
+        first = times.searchsorted(last[0], side='right')
+        times, fto_df = times[first:], fto_df.iloc[first:]
+    if not len(times):  # pylint: disable=len-as-condition
+        return None
+    samples = {
+        'time': times,
+        'population': fto_df["Population"].values.astype(np.int64),
+        'mothers': fto_df["Pregnant Mothers"].values.astype(np.int64),
+        'queue': fto_df["Birth Queue"].values.astype(np.int64),
+    }
+    if last is None:
+        previous = (samples['population'][:1], samples['mothers'][:1])
+    else:
+        previous = (last[1:2], last[2:3])
+    samples['population_delta'] = np.diff(samples['population'],
+                                          prepend=previous[0])
+    samples['mother_delta'] = np.diff(samples['mothers'], prepend=previous[1])
+    return samples
+
+
+def first_sample(samples):
+    # type: (Dict[str, np.ndarray]) -> Tuple[int, int, int, int]
+    """Return the first of new_samples like last_sample."""
+    return tuple(int(samples[key][0])  # type: ignore
+                 for key in ('time', 'population', 'mothers', 'queue'))
+
+
+def last_sample(samples):
+    # type: (Dict[str, np.ndarray]) -> Tuple[int, int, int, int]
+    """Return the last of new_samples as (time, population, mothers, queue)."""
+    return tuple(int(samples[key][-1])  # type: ignore
+                 for key in ('time', 'population', 'mothers', 'queue'))
+
+
+def sample_at(fto_df, times, position):
+    # type: (pd.DataFrame, np.ndarray, int) -> Optional[Tuple[int, int, int, int]]
+    """Return row `position` of `fto_df` like last_sample, or None.
+
+    Args:
+        times: The unix times of the index of `fto_df`.
+    """
+    if not 0 <= position < len(times):
+        return None
+    row = fto_df.iloc[position]
+    return (int(times[position]), int(row["Population"]),
+            int(row["Pregnant Mothers"]), int(row["Birth Queue"]))
+
+
+class StatsAccumulator(PickledState):
+    """Monthly birth, death and pregnancy counts and running means.
+
+    `update` folds new samples into per month counters, so each sample is
+    looked at once. The monthly counts and summary records are answered
+    from the counters alone.
+
+    Months are numbered as months since January 1970.
+
+    Attributes:
+        last: The last folded sample as (unix time, population, pregnant
+            mothers, birth queue), or None before the first. See
+            PickledState for the other folded samples.
+        first_month: Month of the first sample, which is left out of the
+            monthly counts since it is only partly sampled.
+        months: Month -> [births, deaths, pregnancies].
+        queue_sum: Sum of the birth queue over all samples.
+        queue_count: Number of samples.
+    """
+    def __init__(self):
+        # type: () -> None
+        self.first = None  # type: Optional[Tuple[int, int, int, int]]
+        self.last = None  # type: Optional[Tuple[int, int, int, int]]
+        self.count = 0
+        self.first_month = None  # type: Optional[int]
+        self.months = {}  # type: Dict[int, List[int]]
+        self.queue_sum = 0
+        self.queue_count = 0
+
+    def update(self, fto_df):
+        # type: (pd.DataFrame) -> int
+        """Fold the rows of `fto_df` after the last folded sample.
+
+        Returns:
+            The number of rows folded.
+        """
+        samples = new_samples(fto_df, self.last)
+        if samples is None:
+            return 0
+        months = samples['time'].astype('datetime64[s]').astype(
+            'datetime64[M]').astype(np.int64)
+        if self.last is None:
+            self.first_month = int(months[0])
+        population_delta = samples['population_delta']
+        counts = np.stack([
+            np.maximum(population_delta, 0),
+            np.maximum(-population_delta, 0),
+            np.maximum(samples['mother_delta'], 0),
+        ])
+        starts = np.flatnonzero(np.diff(months, prepend=months[0] - 1))
+        sums = np.add.reduceat(counts, starts, axis=1)
+        for month, month_sums in zip(months[starts].tolist(), sums.T.tolist()):
+            totals = self.months.setdefault(month, [0, 0, 0])
+            for number, value in enumerate(month_sums):
+                totals[number] += value
+        self.queue_sum += int(samples['queue'].sum())
+        self.queue_count += len(samples['queue'])
+        self.fold(samples)
+        return len(months)
+
+    def complete_months(self):
+        # type: () -> List[int]
+        """Return the months with counts, without the first month."""
+        return sorted(month for month in self.months
+                      if month != self.first_month)
+
+    def monthly_dataframe(self):
+        # type: () -> pd.DataFrame
+        """Return the monthly counts, see generate_monthly_dataframe."""
+        months = self.complete_months()
+        counts = np.array([self.months[month] for month in months],
+                          dtype=np.int64).reshape(-1, 3)
+        return pd.DataFrame(collections.OrderedDict([
+            ("Month", [pretty_month((1970 + month // 12, month % 12 + 1))
+                       for month in months]),
+            ("Births", counts[:, 0]),
+            ("Deaths", counts[:, 1]),
+            ("Pregnancies", counts[:, 2]),
+        ]))
+
+    def average_stats(self):
+        # type: () -> Tuple[Record, ...]
+        """Return the summary records, see average_stats."""
+        counts = np.array([self.months[month]
+                           for month in self.complete_months()],
+                          dtype=np.float64).reshape(-1, 3)
+        births, pregnancies = counts[:, 0], counts[:, 2]
+        avg_births_per_month = births.mean() if len(births) else np.nan
+        avg_birth_queue_size = (self.queue_sum / float(self.queue_count)
+                                if self.queue_count else np.nan)
+        current_birth_queue_size = (
+            self.last[3] if self.last is not None else np.nan)
+        # Months without pregnancies have no babies per pregnancy
+        with_pregnancies = pregnancies > 0
+        avg_num_babies_per_pregnancy = (
+            (births[with_pregnancies] / pregnancies[with_pregnancies]).mean()
+            if with_pregnancies.any() else np.nan)
+        average_birth_queue_months = (avg_birth_queue_size /
+                                      avg_births_per_month)
+        birth_queue_now = (current_birth_queue_size / avg_births_per_month)
+
+        return (
+            Record("Average Birth Queue Time",  # type: ignore
+                   average_birth_queue_months,
+                   "months"),
+
+            Record("Projected Birth Queue Time Entering Now",  # type: ignore
+                   birth_queue_now,
+                   "months"),
+
+            Record("Average Number of Babies per Pregnancy",  # type: ignore
+                   avg_num_babies_per_pregnancy,
+                   "babies"),
+        )
+
+
+class RollingWindows(PickledState):
+    """Births and pregnancies of the last days, kept up to date by `update`.
+
+    Only the samples within the longest window are kept. Window sums are
+    taken from cumulative sums of those samples, and the records of each
+    window are cached until more rows arrive.
+
+    Args:
+        windows: Window lengths in days.
+
+    Attributes:
+        last: The last sample, see StatsAccumulator and PickledState.
+        first_time: Unix time of the first sample, which bounds the windows
+            of a short history.
+        times: Unix times of the kept samples.
+        births: Population increase at each kept sample.
+        pregnancies: Pregnant mothers increase at each kept sample.
     """
-    delta_per_month_gb = pd.groupby(
-        delta, by=[delta.index.year, delta.index.month]
-    )
-    # Drop the first month
-    # Shifts turn dtype into floating point, return to int
-    delta_per_month = delta_per_month_gb.sum().iloc[1:]
-    delta_per_month.index.name = "Month"
-    delta_per_month.index = delta_per_month.index.to_series().apply(
-        pretty_month)
-    delta_per_month.name = name
-    return delta_per_month
+    def __init__(self, windows=PROJECTION_WINDOWS):
+        # type: (Iterable[int]) -> None
+        self.windows = tuple(windows)
+        self.first = None  # type: Optional[Tuple[int, int, int, int]]
+        self.last = None  # type: Optional[Tuple[int, int, int, int]]
+        self.count = 0
+        self.first_time = None  # type: Optional[int]
+        self.times = np.empty(0, dtype=np.int64)
+        self.births = np.empty(0, dtype=np.int64)
+        self.pregnancies = np.empty(0, dtype=np.int64)
+        self.cache = {}  # type: Dict[int, Tuple[Record, ...]]
+
+    def update(self, fto_df):
+        # type: (pd.DataFrame) -> int
+        """Add the rows of `fto_df` after the last sample.
+
+        Returns:
+            The number of rows added.
+        """
+        samples = new_samples(fto_df, self.last)
+        if samples is None:
+            return 0
+        if self.first_time is None:
+            self.first_time = int(samples['time'][0])
+        self.fold(samples)
+        horizon = self.last[0] - max(self.windows) * SECONDS_PER_DAY
+        times = np.concatenate([self.times, samples['time']])
+        keep = times.searchsorted(horizon, side='right')
+        self.times = times[keep:]
+        self.births = np.concatenate([
+            self.births, np.maximum(samples['population_delta'], 0)])[keep:]
+        self.pregnancies = np.concatenate([
+            self.pregnancies, np.maximum(samples['mother_delta'], 0)])[keep:]
+        self.cache = {}
+        return len(samples['time'])
+
+    def records(self):
+        # type: () -> Tuple[Record, ...]
+        """Return the records of every window, see rolling_stats."""
+        if self.last is None:
+            return ()
+        missing = [days for days in self.windows if days not in self.cache]
+        if missing:
+            self.cache.update(zip(missing, self.compute(missing)))
+        return tuple(record for days in self.windows
+                     for record in self.cache[days])
+
+    def compute(self, windows):
+        # type: (List[int]) -> List[Tuple[Record, ...]]
+        """Compute the records of `windows` in one vectorized pass."""
+        days = np.array(windows, dtype=np.int64)
+        last_time, _, _, queue = self.last
+        starts = self.times.searchsorted(
+            last_time - days * SECONDS_PER_DAY, side='right')
+        births_sum = np.concatenate([[0], np.cumsum(self.births)])
+        pregnancies_sum = np.concatenate([[0], np.cumsum(self.pregnancies)])
+        births = (births_sum[-1] - births_sum[starts]).astype(np.float64)
+        pregnancies = (pregnancies_sum[-1] -
+                       pregnancies_sum[starts]).astype(np.float64)
+        # A history shorter than a window only covers part of it
+        spans = np.minimum(days, (last_time - self.first_time) /
+                           float(SECONDS_PER_DAY))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            births_per_day = np.where(spans > 0, births / spans, np.nan)
+            babies_per_pregnancy = np.where(
+                pregnancies > 0, births / pregnancies, np.nan)
+            queue_days = np.where(
+                births_per_day > 0, queue / births_per_day, np.nan)
+        return [
+            (Record("Births per Day, Last %d Days" % window,  # type: ignore
+                    births_per_day[number],
+                    "births/day"),
+
+             Record("Babies per Pregnancy, Last %d Days" % window,  # type: ignore
+                    babies_per_pregnancy[number],
+                    "babies"),
+
+             Record("Projected Birth Queue Time Entering Now, "  # type: ignore
+                    "Last %d Days" % window,
+                    queue_days[number],
+                    "days"))
+            for number, window in enumerate(windows)]
 
 
 def pretty_month(row):
@@ -0,0 +1,87 @@
+"""Timestamp formats used in the fto statistics csv.
+
+The original format is accurate to the hour. Finer sampling stores
+minutes or seconds as extra colon separated fields, which keeps the
+rows sortable and the leading `MM/DD/YY-HH` prefix unchanged.
+"""
+
+import calendar
+import time
+
+# pylint: disable=unused-import
+from typing import Iterable, Optional  # NOQA
+
+
+# Resolution name -> strftime format
+TIME_FORMATS = {
+    'hour': '%m/%d/%y-%H',
+    'minute': '%m/%d/%y-%H:%M',
+    'second': '%m/%d/%y-%H:%M:%S',
+}
+
+# Length of a formatted timestamp -> strftime format
+TIME_FORMATS_BY_LENGTH = dict(
+    (len(time.strftime(fmt, time.gmtime(0))), fmt)
+    for fmt in TIME_FORMATS.values())
+
+# Resolution name -> seconds per step
+RESOLUTION_SECONDS = {
+    'hour': 3600,
+    'minute': 60,
+    'second': 1,
+}
+
+
+def format_time(timestamp=None, resolution='hour'):
+    # type: (Optional[float], str) -> str
+    """Format a UTC unix timestamp for the csv.
+
+    Args:
+        timestamp: Seconds since the epoch. Default: now
+        resolution: One of the keys of `TIME_FORMATS`. Default: 'hour'
+
+    Raises:
+        ValueError if `resolution` is unknown.
+    """
+    try:
+        fmt = TIME_FORMATS[resolution]
+    except KeyError:
+        raise ValueError("Unknown time resolution %r, expected one of %s"
+                         % (resolution, ", ".join(sorted(TIME_FORMATS))))
+    return time.strftime(fmt, time.gmtime(timestamp))
+
+
+def parse_time(text):
+    # type: (str) -> int
+    """Parse a csv timestamp of any resolution into a UTC unix timestamp.
+
+    Raises:
+        ValueError if `text` is not a csv timestamp.
+    """
+    try:
+        fmt = TIME_FORMATS_BY_LENGTH[len(text)]
+    except KeyError:
+        raise ValueError("Unrecognized timestamp %r" % text)
+    return calendar.timegm(time.strptime(text, fmt))
+
+
+def resolution_of(timestamps):
+    # type: (Iterable[int]) -> str
+    """Return the coarsest resolution which represents every timestamp."""
+    resolution = 'hour'
+    for timestamp in timestamps:
+        if timestamp % RESOLUTION_SECONDS['minute']:
+            return 'second'
+        if timestamp % RESOLUTION_SECONDS['hour']:
+            resolution = 'minute'
+    return resolution
+
+
+def resolution_for_interval(interval):
+    # type: (float) -> str
+    """Return the coarsest resolution which distinguishes samples taken
+    every `interval` seconds."""
+    for resolution in ('hour', 'minute', 'second'):
+        if interval >= RESOLUTION_SECONDS[resolution]:
+            return resolution
+    return 'second'
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+"""Write the most recent rows of a fto statistics csv to shorter csvs.
+
+This replaces truncate_csv.sh. Rows are ordered by time, so the start of
+each window is found by a binary search over byte offsets of the full csv
+instead of scanning every line. The tail from the earliest window start
+is then copied in bulk, once, into every window csv.
+
+Windows are written as e.g. `7d` (the last 7 days), `6m` (the current
+month and the 5 before it, like truncate_csv.sh) or `1y` (12 months).
+"""
+
+import argparse
+import calendar
+import contextlib
+import os
+import re
+import time
+
+# pylint: disable=unused-import
+from typing import Any, Dict, IO, Iterable, List, Optional, Tuple  # NOQA
+
+from . import atomic
+from .timeformat import parse_time
+
+
+# Window unit -> name used in default output file names
+UNIT_NAMES = {
+    'h': 'hour',
+    'd': 'day',
+    'm': 'month',
+    'y': 'year',
+}
+
+# Bytes copied per read when writing the windows
+CHUNK_SIZE = 1 << 20
+
+
+class Error(Exception):
+    """All errors in this module inherit from this class."""
+    pass
+
+
+class InvalidWindowError(Error):
+    """Error when a window specification cannot be parsed."""
+    pass
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    vargs = parse_args()
+    counts = run(**vargs)
+    for output, count in sorted(counts.items()):
+        print("%s => %s (%d rows)" % (vargs['full_csv'], output, count))
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('full_csv', help='time ordered csv with a header')
+    parser.add_argument(
+        'windows', nargs='*', metavar='SPEC[=PATH]', default=['6m'],
+        help='window such as 7d, 6m or 1y, optionally with the output '
+             'path. Default output: <full_csv>_<n><unit>s.csv. '
+             'Default: 6m')
+    return vars(parser.parse_args())
+
+
+def run(full_csv, windows=('6m',)):
+    # type: (str, Iterable[str]) -> Dict[str, int]
+    """Write each window of `full_csv` given as `SPEC[=PATH]` strings.
+
+    Returns:
+        The number of rows written to each output path.
+    """
+    outputs = []
+    for window in windows:
+        spec, _, path = window.partition("=")
+        outputs.append((spec, path or default_window_path(full_csv, spec)))
+    return write_windows(full_csv, outputs)
+
+
+def parse_window(spec):
+    # type: (str) -> Tuple[int, str]
+    """Parse a window like '7d' into (7, 'd').
+
+    Raises:
+        InvalidWindowError if `spec` is not <count><unit>.
+    """
+    match = re.match(r"^(\d+)([%s])$" % "".join(UNIT_NAMES), spec.strip())
+    if match is None:
+        raise InvalidWindowError(
+            "Invalid window %r, expected <count><%s>"
+            % (spec, "|".join(sorted(UNIT_NAMES))))
+    return int(match.group(1)), match.group(2)
+
+
+def default_window_path(full_csv, spec):
+    # type: (str, str) -> str
+    """Return `<full_csv>_<n><unit>s.csv`, e.g. `stats_6months.csv`."""
+    count, unit = parse_window(spec)
+    name = UNIT_NAMES[unit] + ("s" if count != 1 else "")
+    return "%s_%d%s.csv" % (os.path.splitext(full_csv)[0], count, name)
+
+
+def window_start(spec, now=None):
+    # type: (str, Optional[float]) -> int
+    """Return the unix timestamp of the first second within the window.
+
+    Hour and day windows reach back exactly that long from `now`. Month
+    and year windows start at the beginning of a month: `6m` keeps the
+    current month and the 5 months before it.
+    """
+    count, unit = parse_window(spec)
+    if now is None:
+        now = time.time()
+    if unit == 'h':
+        return int(now) - count * 3600
+    if unit == 'd':
+        return int(now) - count * 86400
+    months = count if unit == 'm' else 12 * count
+    current = time.gmtime(now)
+    month_index = 12 * current.tm_year + current.tm_mon - 1 - (months - 1)
+    year, month = divmod(month_index, 12)
+    return calendar.timegm((year, month + 1, 1, 0, 0, 0))
+
+
+def window_bounds(spec, now=None):
+    # type: (str, Optional[float]) -> Tuple[Optional[int], Optional[int]]
+    """Return the [start, end) unix timestamps of a window or period.
+
+    Besides the windows of window_start, `spec` may be `all`, a year such
+    as `2017` or a month such as `2017-03`. None stands for no bound.
+
+    Raises:
+        InvalidWindowError if `spec` is none of these.
+    """
+    if spec == 'all':
+        return None, None
+    match = re.match(r"^(\d{4})(?:-(\d{2}))?$", spec.strip())
+    if match is None:
+        return window_start(spec, now), None
+    year = int(match.group(1))
+    if match.group(2) is None:
+        return (calendar.timegm((year, 1, 1, 0, 0, 0)),
+                calendar.timegm((year + 1, 1, 1, 0, 0, 0)))
+    month = int(match.group(2))
+    if not 1 <= month <= 12:
+        raise InvalidWindowError("Invalid month in %r" % spec)
+    next_year, next_month = divmod(12 * year + month, 12)
+    return (calendar.timegm((year, month, 1, 0, 0, 0)),
+            calendar.timegm((next_year, next_month + 1, 1, 0, 0, 0)))
+
+
+def write_windows(full_csv, outputs, now=None):
+    # type: (str, Iterable[Tuple[str, str]], Optional[float]) -> Dict[str, int]
+    """Write several windows of `full_csv` in one pass.
+
+    Args:
+        full_csv: Path to the full, time ordered csv with a header line.
+        outputs: (window spec, output path) pairs. Outputs are replaced
+            atomically.
+        now: Unix timestamp the windows end at. Default: now
+
+    Returns:
+        The number of rows written to each output path.
+    """
+    with open(full_csv, "rb") as full_fh:
+        header = full_fh.readline()
+        data_start = full_fh.tell()
+        full_fh.seek(0, os.SEEK_END)
+        size = full_fh.tell()
+        offsets = [
+            (find_offset(full_fh, window_start(spec, now), data_start, size),
+             path)
+            for spec, path in outputs]
+        if not offsets:
+            return {}
+        counts = dict((path, 0) for _, path in offsets)
+        with contextlib.ExitStack() as stack:
+            # Each window replaces its file once all of them are written
+            handles = dict((path, stack.enter_context(
+                atomic.replacing(path, "wb"))) for path in counts)
+            for handle in handles.values():
+                handle.write(header)
+            position = min(offset for offset, _ in offsets)
+            full_fh.seek(position)
+            while position < size:
+                chunk = full_fh.read(min(CHUNK_SIZE, size - position))
+                if not chunk:
+                    break
+                for offset, path in offsets:
+                    part = chunk[max(offset - position, 0):]
+                    if part:
+                        handles[path].write(part)
+                        counts[path] += part.count(b"\n")
+                position += len(chunk)
+    return counts
+
+
+def find_offset(full_fh, start, data_start, size):
+    # type: (IO[bytes], int, int, int) -> int
+    """Binary search for the first row at or after timestamp `start`.
+
+    Args:
+        full_fh: The full csv opened in binary mode.
+        start: Unix timestamp of the window start.
+        data_start: Offset of the first row, after the header.
+        size: Size of the csv.
+
+    Returns:
+        The byte offset of the first row in the window, or `size` if
+        every row is older.
+    """
+    low, high = data_start, size
+    while low < high:
+        middle = (low + high) // 2
+        line_offset = line_start_after(full_fh, middle, data_start)
+        if line_offset >= size or row_time(full_fh, line_offset) >= start:
+            high = middle
+        else:
+            low = middle + 1
+    return line_start_after(full_fh, low, data_start)
+
+
+def line_start_after(full_fh, offset, data_start):
+    # type: (IO[bytes], int, int) -> int
+    """Return the offset of the first line starting at or after `offset`."""
+    if offset <= data_start:
+        return data_start
+    full_fh.seek(offset - 1)
+    full_fh.readline()
+    return full_fh.tell()
+
+
+def row_time(full_fh, offset):
+    # type: (IO[bytes], int) -> float
+    """Return the timestamp of the row at `offset`.
+
+    Rows which cannot be parsed sort before every window.
+    """
+    full_fh.seek(offset)
+    date = full_fh.readline().split(b",", 1)[0].strip()
+    try:
+        return parse_time(date.decode("ascii"))
+    except (ValueError, UnicodeDecodeError):
+        return float("-inf")
+
+
+def write_month_window(full_csv, short_csv, limit=6, now=None):
+    # type: (str, str, int, Optional[float]) -> int
+    """Write the header and the rows of the last `limit` months.
+
+    Rows are kept from the beginning of the `limit`-th month before the
+    current month (UTC), matching truncate_csv.sh.
+
+    Returns:
+        The number of data rows written.
+    """
+    return write_windows(full_csv, [("%dm" % limit, short_csv)],
+                         now)[short_csv]
+
+
+if __name__ == "__main__":
+    main()
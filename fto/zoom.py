@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Serve the interactive graph, loading detail as the user zooms.
+
+The page only embeds an overview of the whole history, taken from the
+coarsest level of a `fto.pyramid.Pyramid` which fits the plot width. When
+the visible x range changes, the page requests the rows of that range
+from the `/data` endpoint, which answers from the finest pyramid level
+with no more rows than the plot is wide. The page and every answer stay
+the same size however long the history is. Each line is drawn over a
+band from the minimum to the maximum of its level, so that the peaks
+within a coarse bin stay visible.
+
+    python -m fto zoom fto-stats.csv --pyramid fto-stats.pyramid
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+# pylint: disable=unused-import
+from typing import Any, Dict, Optional  # NOQA
+
+from . import metrics
+from . import pyramid
+
+
+DEFAULT_PORT = 8050
+
+# Width of the plots in fto_web
+PLOT_WIDTH = 1600
+
+# Largest `pixels` a client may ask for
+MAX_PIXELS = 8 * PLOT_WIDTH
+
+# Opacity of the bands between the minimum and maximum of each column
+BAND_ALPHA = 0.2
+
+# Requests the rows of the visible range, and as much again on either
+# side so that panning a little does not show an empty plot. Formatted
+# with the number of pixels to ask for.
+ZOOM_CODE = """
+    var range = cb_obj;
+    clearTimeout(window.ftoZoomTimer);
+    window.ftoZoomTimer = setTimeout(function() {
+        var span = range.end - range.start;
+        var url = "data?start=" + Math.floor(range.start - span) +
+            "&end=" + Math.ceil(range.end + span) + "&pixels=%d";
+        var request = new XMLHttpRequest();
+        request.open("GET", url);
+        request.onload = function() {
+            if (request.status === 200) {
+                source.data = JSON.parse(request.responseText);
+            }
+        };
+        request.send();
+    }, 150);
+"""
+
+# pylint: disable=invalid-name
+log = logging.getLogger(__name__)
+
+
+def main():
+    # type: () -> None
+    """Cli interface to this module"""
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    vargs = parse_args()
+    if vargs.pop('verbose'):
+        log.setLevel(logging.DEBUG)
+        metrics.enable()
+    server = run(**vargs)
+    log.info("Serving %s on http://%s:%d/", vargs['source'],
+             *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Stopped")
+    finally:
+        server.server_close()
+
+
+def parse_args():
+    # type: () -> dict[str, Any]
+    """Parse program arguments. Return dict of arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'source', help='csv, binary or partitioned store to serve')
+    parser.add_argument(
+        '--pyramid', dest='pyramid_dir', default=None,
+        help='directory to save the pyramid levels in, reused while it is '
+             'newer than the source')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on. Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='port to listen on. Default: %d' % DEFAULT_PORT)
+    parser.add_argument(
+        '--verbose', help='Turn debug output on.', action='store_true')
+    return vars(parser.parse_args())
+
+
+def run(source, pyramid_dir=None, host='127.0.0.1', port=DEFAULT_PORT):
+    # type: (str, Optional[str], str, int) -> ZoomServer
+    """Build or load the pyramid of `source` and return a bound server.
+
+    Call `serve_forever()` on the result to handle requests.
+    """
+    return ZoomServer((host, port), load_pyramid(source, pyramid_dir))
+
+
+def load_pyramid(source, pyramid_dir=None):
+    # type: (str, Optional[str]) -> pyramid.Pyramid
+    """Load the pyramid of `source` from `pyramid_dir` or build it.
+
+    A pyramid is built from `fto.load_dataframe(source)` when there is no
+    saved one which is newer than `source`, and then saved if
+    `pyramid_dir` is given.
+    """
+    if pyramid_dir is not None and is_fresh(pyramid_dir, source):
+        log.debug("Loading pyramid from %s", pyramid_dir)
+        return pyramid.Pyramid.load(pyramid_dir)
+    # Imported here so that a saved pyramid is served without matplotlib
+    from . import fto_graph
+    levels = pyramid.Pyramid.from_dataframe(fto_graph.load_dataframe(source))
+    if pyramid_dir is not None:
+        levels.save(pyramid_dir)
+    return levels
+
+
+def is_fresh(pyramid_dir, source):
+    # type: (str, str) -> bool
+    """Return True if every level in `pyramid_dir` is newer than `source`."""
+    try:
+        source_time = os.path.getmtime(source)
+        return all(
+            os.path.getmtime(os.path.join(pyramid_dir, name + ".npz")) >=
+            source_time for name in pyramid.LEVELS)
+    except (OSError, IOError):
+        return False
+
+
+def create_page(levels, width=PLOT_WIDTH):
+    # type: (pyramid.Pyramid, int) -> str
+    """Return the html of the fto_web layout over the overview of `levels`.
+
+    The y ranges cover the minimum and maximum of the whole history, so
+    that they stay put while the lines are replaced with finer levels.
+    Each line gets a band between the minimum and maximum columns of the
+    data source.
+    """
+    # Imported here so that the data endpoint does not need bokeh
+    import bokeh.embed
+    import bokeh.models
+    import bokeh.palettes
+    import bokeh.resources
+    from . import fto_web
+    _, overview = levels.query(pixels=width)
+    layout = fto_web.run(overview[pyramid.COLUMNS], method=None, lean=True)
+    _, top_fig, mother_fig = layout.children
+    source = layout.select_one({'type': bokeh.models.ColumnDataSource})
+    for column in pyramid.STAT_COLUMNS:
+        if column not in pyramid.COLUMNS:
+            source.add(fto_web.compact_array(overview[column].values), column)
+    coarsest = list(levels.levels.values())[-1]
+    # pylint: disable=no-member
+    pop_color, birth_color, mother_color = bokeh.palettes.Set1_3
+    plots = (
+        (top_fig, 'default', 'Birth Queue', birth_color),
+        (top_fig, 'population', 'Population', pop_color),
+        (mother_fig, 'default', 'Pregnant Mothers', mother_color),
+    )
+    for fig, range_name, column, color in plots:
+        lower = pyramid.stat_column(column, 'min')
+        upper = pyramid.stat_column(column, 'max')
+        y_range = (fig.y_range if range_name == 'default' else
+                   fig.extra_y_ranges[range_name])
+        if column != 'Pregnant Mothers':
+            y_range.start = coarsest[lower].min()
+        y_range.end = coarsest[upper].max()
+        fig.add_layout(bokeh.models.Band(
+            base='Date', lower=lower, upper=upper, source=source,
+            y_range_name=range_name, level='underlay', fill_color=color,
+            fill_alpha=BAND_ALPHA, line_color=None))
+    callback = bokeh.models.CustomJS(args={'source': source},
+                                     code=ZOOM_CODE % (3 * width))
+    mother_fig.x_range.js_on_change('start', callback)
+    mother_fig.x_range.js_on_change('end', callback)
+    return bokeh.embed.file_html(layout, bokeh.resources.CDN,
+                                 "FTO Hourly Statistics")
+
+
+class ZoomServer(ThreadingMixIn, HTTPServer):
+    """Serves the zoomable page of a pyramid and its `/data` endpoint."""
+    daemon_threads = True
+
+    def __init__(self, server_address, levels):
+        # type: (Any, pyramid.Pyramid) -> None
+        HTTPServer.__init__(self, server_address, ZoomHandler)
+        self.levels = levels
+        self._page = None  # type: Optional[str]
+
+    def page(self):
+        # type: () -> str
+        """Return the html page, created on first use."""
+        if self._page is None:
+            self._page = create_page(self.levels)
+        return self._page
+
+    def data(self, query):
+        # type: (Dict[str, list]) -> Dict[str, Any]
+        """Answer a `/data` query of start and end ms and pixels.
+
+        The answer holds the minimum, maximum and mean of every column.
+
+        Raises:
+            ValueError if a parameter is not a finite number or `pixels`
+            is below 1.
+        """
+        def number(name):
+            # type: (str) -> Optional[float]
+            """Return the query parameter `name` as a float or None."""
+            values = query.get(name)
+            if not values:
+                return None
+            value = float(values[0])
+            if not math.isfinite(value):
+                raise ValueError("%s must be a finite number" % name)
+            return value
+        start, end, pixels = number('start'), number('end'), number('pixels')
+        if pixels is None:
+            pixels = PLOT_WIDTH
+        elif pixels < 1:
+            raise ValueError("pixels must be at least 1")
+        pixels = int(min(pixels, MAX_PIXELS))
+        level, rows = self.levels.query(
+            None if start is None else start / 1000.0,
+            None if end is None else end / 1000.0, pixels)
+        log.debug("Answered %s to %s with %d %s rows", start, end,
+                  len(rows), level)
+        return pyramid.frame_to_json(rows, pyramid.STAT_COLUMNS)
+
+
+class ZoomHandler(BaseHTTPRequestHandler):
+    """Routes `/` to the page and `/data` to the pyramid."""
+    def do_GET(self):  # pylint: disable=invalid-name
+        # type: () -> None
+        """Handle a GET request."""
+        url = urlparse(self.path)
+        if url.path == "/":
+            try:
+                page = self.server.page()
+            except ImportError as e:
+                self.send_error(500, "The page needs bokeh: %s" % e)
+                return
+            self.send_body(page.encode("utf-8"), "text/html; charset=utf-8")
+        elif url.path == "/data":
+            try:
+                data = self.server.data(parse_qs(url.query))
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            self.send_body(json.dumps(data).encode("utf-8"),
+                           "application/json")
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type):
+        # type: (bytes, str) -> None
+        """Send a 200 response with `body`."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        # type: (str, *Any) -> None
+        log.debug(format, *args)
+
+
+if __name__ == "__main__":
+    main()
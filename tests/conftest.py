@@ -0,0 +1,55 @@
+"""Fixtures shared by the fto tests.
+
+Each test is marked with the request whose behavior it covers, either
+per test or for a whole module with `pytestmark`:
+
+    @pytest.mark.request("user-010")
+"""
+
+import datetime
+
+import numpy as np
+import pytest
+
+
+HEADER = "Date,Population,Birth Queue,Pregnant Mothers\n"
+
+START = datetime.datetime(2016, 2, 15)
+
+
+def pytest_configure(config):
+    """Register the request marker."""
+    config.addinivalue_line(
+        "markers", "request(request_id): the backlog request a test covers")
+
+
+def make_rows(hours, start=START, seed=0, mothers_min=2, step=1):
+    """Return `hours` rows of (datetime, population, queue, mothers), one
+    every `step` hours, with populations changing both ways."""
+    random = np.random.RandomState(seed)
+    population = 300 + np.cumsum(random.randint(-2, 3, hours))
+    queue = 150 + np.cumsum(random.randint(-1, 2, hours))
+    mothers = mothers_min + random.randint(0, 4, hours)
+    return [(start + datetime.timedelta(hours=step * number),
+             int(population[number]), int(queue[number]),
+             int(mothers[number]))
+            for number in range(hours)]
+
+
+def format_rows(rows, header=True):
+    """Return the csv text of `rows`."""
+    return (HEADER if header else "") + "".join(
+        "%s,%d,%d,%d\n" % (date.strftime("%m/%d/%y-%H"), population, queue,
+                           mothers)
+        for date, population, queue, mothers in rows)
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """Return a function writing rows to a csv in tmp_path, returning its
+    path."""
+    def write(rows, name="fto-stats.csv", header=True):
+        path = tmp_path / name
+        path.write_text(format_rows(rows, header))
+        return str(path)
+    return write
@@ -0,0 +1,72 @@
+"""Tests of the memory mapped binary store."""
+
+import numpy as np
+import pytest
+
+from fto import binstore
+from fto import fto_graph
+
+from conftest import make_rows
+
+
+pytestmark = pytest.mark.request("user-007")
+
+
+def test_round_trip_through_csv(write_csv, tmp_path):
+    source = write_csv(make_rows(100))
+    store = str(tmp_path / "fto.bin")
+    assert binstore.csv_to_binary(source, store) == 100
+    assert binstore.is_binary_store(store)
+    copy = str(tmp_path / "copy.csv")
+    assert binstore.binary_to_csv(store, copy) == 100
+    assert open(copy).read() == open(source).read()
+
+
+def test_load_matches_csv(write_csv, tmp_path):
+    source = write_csv(make_rows(100, mothers_min=1))
+    store = str(tmp_path / "fto.bin")
+    binstore.csv_to_binary(source, store)
+    from_csv = fto_graph.load_dataframe(source)
+    from_store = fto_graph.load_dataframe(store)
+    assert (from_csv.index == from_store.index).all()
+    assert (from_csv.values == from_store.values).all()
+    assert list(from_store.dtypes) == [np.dtype(np.uint32)] * 3
+
+
+def test_counts_are_views_on_the_mapping(write_csv, tmp_path, monkeypatch):
+    store = str(tmp_path / "fto.bin")
+    binstore.csv_to_binary(write_csv(make_rows(10)), store)
+    mapped = []
+    open_memmap = binstore.open_memmap
+    monkeypatch.setattr(binstore, "open_memmap",
+                        lambda path: mapped.append(open_memmap(path)) or
+                        mapped[-1])
+    frame = binstore.load_dataframe(store)
+    for column in frame:
+        assert np.shares_memory(frame[column].values, mapped[0])
+
+
+def test_append_and_partial_record(tmp_path):
+    store = str(tmp_path / "fto.bin")
+    binstore.append_csv_line(store, "02/15/16-08,311,152,3")
+    binstore.append_csv_line(store, "02/15/16-09,312,150,4\n")
+    with open(store, "ab") as store_fh:
+        # An interrupted append
+        store_fh.write(b"\x01\x02\x03")
+    frame = binstore.load_dataframe(store)
+    assert frame["Population"].tolist() == [311, 312]
+    assert frame["Birth Queue"].tolist() == [152, 150]
+    assert str(frame.index[-1]) == "2016-02-15 09:00:00"
+
+
+def test_empty_store(tmp_path):
+    store = str(tmp_path / "fto.bin")
+    binstore.append_records(store, np.empty(0, dtype=binstore.RECORD_DTYPE))
+    assert len(binstore.load_dataframe(store)) == 0
+
+
+def test_csv_is_not_a_store(write_csv):
+    source = write_csv(make_rows(2))
+    assert not binstore.is_binary_store(source)
+    with pytest.raises(binstore.InvalidStoreError):
+        binstore.open_memmap(source)
@@ -0,0 +1,67 @@
+"""Tests of the sampling daemon's argument parsing and output refresh."""
+
+import argparse
+import logging
+import os
+
+import pytest
+
+from fto import daemon
+from fto import incremental
+
+from conftest import make_rows
+
+
+pytestmark = pytest.mark.request("user-004")
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("90", 90), ("15m", 900), ("1.5h", 5400), ("1d", 86400)])
+def test_parse_interval(text, seconds):
+    assert daemon.parse_positive_interval(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["0", "0s", "0.0h", "-1", "soon"])
+def test_interval_must_be_above_zero(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        daemon.parse_positive_interval(text)
+
+
+def test_zero_jitter_is_allowed():
+    assert daemon.parse_interval("0") == 0
+
+
+def test_run_rejects_zero_interval(tmp_path):
+    with pytest.raises(ValueError):
+        daemon.run(str(tmp_path / "fto.csv"), interval=0, iterations=1)
+
+
+def test_window_errors_are_logged(write_csv, caplog):
+    source = write_csv(make_rows(48))
+    with caplog.at_level(logging.ERROR, logger=daemon.__name__):
+        daemon.refresh_outputs(source, windows=["7x"])
+    assert "Could not write windows" in caplog.text
+
+
+def test_unwritable_window_is_logged(write_csv, tmp_path, caplog):
+    source = write_csv(make_rows(48))
+    missing = str(tmp_path / "missing" / "window.csv")
+    with caplog.at_level(logging.ERROR, logger=daemon.__name__):
+        daemon.refresh_outputs(source, windows=["7d=" + missing])
+    assert "Could not write windows" in caplog.text
+
+
+def test_graph_loads_incrementally(write_csv, tmp_path):
+    source = write_csv(make_rows(48))
+    graph = str(tmp_path / "graph.png")
+    daemon.refresh_outputs(source, windows=[], graph_filename=graph)
+    assert os.path.getsize(graph) > 0
+    assert os.path.exists(incremental.default_cache_path(source))
+
+
+def test_unwritable_graph_is_logged(write_csv, tmp_path, caplog):
+    source = write_csv(make_rows(48))
+    graph = str(tmp_path / "missing" / "graph.png")
+    with caplog.at_level(logging.ERROR, logger=daemon.__name__):
+        daemon.refresh_outputs(source, windows=[], graph_filename=graph)
+    assert "Could not generate figure" in caplog.text
@@ -0,0 +1,71 @@
+"""Tests of the downsampling of graph lines."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fto import downsample
+
+
+pytestmark = pytest.mark.request("user-013")
+
+
+def series(count, seed=0):
+    random = np.random.RandomState(seed)
+    index = pd.date_range("2016-02-15", periods=count, freq="h")
+    return pd.Series(np.cumsum(random.randint(-5, 6, count)).astype(float),
+                     index=index)
+
+
+def test_minmax_keeps_the_extremes_of_every_pixel():
+    values = series(10000)
+    pixels = 100
+    kept = downsample.downsample_series(values, pixels, "minmax")
+    assert len(kept) <= 4 * pixels
+    assert kept.index[0] == values.index[0]
+    assert kept.index[-1] == values.index[-1]
+    assert kept.max() == values.max()
+    assert kept.min() == values.min()
+    # Each pixel column keeps its own extremes
+    bins = pd.cut(np.arange(len(values)), pixels, labels=False)
+    for column in (0, 37, 99):
+        part = values[bins == column]
+        assert part.max() in kept[part.index[0]:part.index[-1]].values
+        assert part.min() in kept[part.index[0]:part.index[-1]].values
+
+
+def test_lttb_picks_the_requested_points():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50.0)
+    picked = downsample.lttb_indices(x, y, 50)
+    assert len(picked) == 50
+    assert picked[0] == 0 and picked[-1] == 999
+    assert (np.diff(picked) > 0).all()
+
+
+def test_short_series_are_kept():
+    values = series(50)
+    assert len(downsample.downsample_series(values, 100)) == 50
+    frame = values.to_frame("Population")
+    assert downsample.downsample_frame(frame, 100) is frame
+
+
+def test_gaps_are_kept():
+    values = series(5000)
+    values.iloc[[100, 2500, 2501]] = np.nan
+    kept = downsample.downsample_series(values, 50)
+    assert kept.isna().sum() == 3
+
+
+def test_frame_rows_are_the_union_of_the_columns():
+    frame = pd.DataFrame({"a": series(5000, 1), "b": series(5000, 2)})
+    kept = downsample.downsample_frame(frame, 50)
+    assert kept["a"].max() == frame["a"].max()
+    assert kept["b"].min() == frame["b"].min()
+    assert kept.index.is_monotonic_increasing
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample.downsample_indices(series(10).index, np.zeros(10), 5,
+                                      "median")
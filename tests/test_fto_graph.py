@@ -0,0 +1,31 @@
+"""Tests of the fto-graph command line."""
+
+import sys
+
+import pytest
+
+from fto import fto_graph
+
+
+pytestmark = pytest.mark.request("user-014")
+
+
+def test_cancelled_batch_render_exits_cleanly(monkeypatch, capsys):
+    def cancel(*args, **kwargs):
+        raise KeyboardInterrupt()
+    monkeypatch.setattr(fto_graph, "render_batch", cancel)
+    monkeypatch.setattr(sys, "argv", [
+        "fto-graph.py", "fto.csv", "--render", "all=full.png"])
+    fto_graph.main()
+    assert capsys.readouterr().out == ""
+
+
+def test_batch_render_prints_each_output(monkeypatch, capsys):
+    monkeypatch.setattr(fto_graph, "render_batch",
+                        lambda *args: {"b.png": 2.0, "a.svg": 1.0})
+    monkeypatch.setattr(sys, "argv", [
+        "fto-graph.py", "fto.csv", "--render", "all=a.svg",
+        "--render", "6m=b.png"])
+    fto_graph.main()
+    assert capsys.readouterr().out == (
+        "fto.csv => a.svg (1.0s)\nfto.csv => b.png (2.0s)\n")
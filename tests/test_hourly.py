@@ -0,0 +1,106 @@
+"""Tests of the dense hourly arrays."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fto import hourly
+
+
+pytestmark = pytest.mark.request("user-021")
+
+
+@pytest.fixture
+def frame():
+    """Samples at hours 0, 1, 2 and 6 of 2016-02-15, missing 3 to 5."""
+    index = pd.DatetimeIndex(["2016-02-15 00:00", "2016-02-15 01:00",
+                              "2016-02-15 02:00", "2016-02-15 06:00"],
+                             name="Date")
+    return pd.DataFrame({"Population": [300, 302, 301, 309],
+                         "Birth Queue": [150, 150, 151, 149],
+                         "Pregnant Mothers": [3, 4, 4, 2]},
+                        index=index).astype(np.uint32)
+
+
+def test_grid_and_gaps(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    assert len(arrays) == 7
+    assert arrays.valid.tolist() == [True, True, True, False, False, False,
+                                     True]
+    start = arrays.start_hour
+    assert arrays.gaps.tolist() == [[start + 3, start + 6]]
+    assert arrays.value("Population", "2016-02-15 06:30") == 309
+    assert arrays.value("Population", "2016-02-15 04:00") is None
+    assert arrays.value("Population", "2016-02-16") is None
+    assert arrays["Population"].dtype == np.uint16
+
+
+def test_round_trip(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    back = arrays.to_dataframe()
+    assert (back.index == frame.index).all()
+    assert (back.values == frame.values).all()
+
+
+def test_gaps_are_marked(frame):
+    marked = hourly.HourlyArrays.from_dataframe(frame).to_dataframe(True)
+    assert len(marked) == 5
+    assert marked.loc["2016-02-15 03:00"].isna().all()
+
+
+def test_spread_delta(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    assert arrays.spread_delta("Population").tolist() == [
+        0, 2, -1, 2, 2, 2, 2]
+    change, hours = arrays.delta("Population")
+    assert change[6] == 8 and hours[6] == 4
+    assert np.isnan(change[4])
+
+
+def test_slices_share_the_arrays(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    part = arrays.slice("2016-02-15 02:00", "2016-02-15 05:00")
+    assert len(part) == 3
+    assert part.valid.tolist() == [True, False, False]
+    assert part.gaps.tolist() == [[arrays.start_hour + 3,
+                                   arrays.start_hour + 5]]
+    assert np.shares_memory(part["Population"], arrays["Population"])
+
+
+def test_later_samples_of_an_hour_win(frame):
+    extra = pd.DataFrame({"Population": [305], "Birth Queue": [1],
+                          "Pregnant Mothers": [1]},
+                         index=pd.DatetimeIndex(["2016-02-15 01:30"]))
+    arrays = hourly.HourlyArrays.from_dataframe(
+        pd.concat([frame, extra]).sort_index())
+    assert arrays.value("Population", "2016-02-15 01:00") == 305
+
+
+def test_unsorted_rows_are_sorted(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame.iloc[::-1])
+    assert arrays.valid.tolist() == hourly.HourlyArrays.from_dataframe(
+        frame).valid.tolist()
+    assert arrays.value("Population", "2016-02-15 06:00") == 309
+
+
+def test_marked_gaps_round_trip(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    back = hourly.HourlyArrays.from_dataframe(arrays.to_dataframe(True))
+    assert back.valid.tolist() == arrays.valid.tolist()
+    assert back["Population"].tolist() == arrays["Population"].tolist()
+    assert back["Population"].dtype == np.uint16
+
+
+@pytest.mark.parametrize("value", [-1, 1.5, "many"])
+def test_invalid_counts_are_rejected(frame, value):
+    frame = frame.astype(object)
+    frame.iloc[1, 0] = value
+    frame["Population"] = frame["Population"].infer_objects()
+    with pytest.raises(ValueError):
+        hourly.HourlyArrays.from_dataframe(frame)
+
+
+def test_valid_is_unpacked_once(frame):
+    arrays = hourly.HourlyArrays.from_dataframe(frame)
+    assert arrays.valid is arrays.valid
+    assert not arrays.valid.flags.writeable
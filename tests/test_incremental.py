@@ -0,0 +1,123 @@
+"""Tests of the incremental csv loader and its sidecar cache."""
+
+import os
+
+import numpy as np
+import pytest
+
+from fto import fto_graph
+from fto import incremental
+
+from conftest import format_rows, make_rows
+
+
+pytestmark = pytest.mark.request("user-008")
+
+
+def assert_same_frame(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    assert (actual.index == expected.index).all()
+    assert (actual.values == expected.values).all()
+    assert list(actual.dtypes) == list(expected.dtypes)
+
+
+def append_rows(path, rows):
+    with open(path, "a") as csv_fh:
+        csv_fh.write(format_rows(rows, header=False))
+
+
+def test_appended_rows_match_full_load(write_csv):
+    rows = make_rows(300)
+    path = write_csv(rows[:200])
+    first = incremental.load_dataframe(path)
+    assert os.path.exists(path + incremental.CACHE_SUFFIX)
+    assert_same_frame(first, fto_graph.load_dataframe(path))
+    append_rows(path, rows[200:])
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+
+
+def test_only_new_rows_are_parsed(write_csv, monkeypatch):
+    rows = make_rows(50)
+    path = write_csv(rows[:40])
+    incremental.load_dataframe(path)
+    append_rows(path, rows[40:])
+    # A full parse would go through read_csv_frame
+    monkeypatch.setattr(fto_graph, "read_csv_frame", None)
+    assert len(incremental.load_dataframe(path)) == 50
+
+
+def test_partial_last_line_is_left_for_later(write_csv):
+    rows = make_rows(10)
+    path = write_csv(rows[:9])
+    text = format_rows(rows[9:], header=False)
+    with open(path, "a") as csv_fh:
+        csv_fh.write(text[:5])
+    assert len(incremental.load_dataframe(path)) == 9
+    with open(path, "a") as csv_fh:
+        csv_fh.write(text[5:])
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+
+
+def test_rewritten_csv_is_parsed_again(write_csv):
+    path = write_csv(make_rows(100, seed=1))
+    incremental.load_dataframe(path)
+    # Same length, other content
+    write_csv(make_rows(100, seed=2))
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+    # Truncated
+    write_csv(make_rows(20, seed=3))
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+
+
+def test_correction_change_reparses_history(write_csv):
+    rows = make_rows(20, mothers_min=2)
+    path = write_csv(rows)
+    assert incremental.load_dataframe(path)["Pregnant Mothers"].min() == 2
+    date = rows[-1][0]
+    append_rows(path, [(date.replace(hour=(date.hour + 1) % 24), 1, 1, 1)])
+    loaded = incremental.load_dataframe(path)
+    assert_same_frame(loaded, fto_graph.load_dataframe(path))
+    assert loaded["Pregnant Mothers"].min() == 0
+
+
+@pytest.mark.parametrize("mothers_min, adjusted_min", [(1, 0), (2, 2)])
+def test_rows_appended_to_a_header_only_csv(write_csv, mothers_min,
+                                            adjusted_min):
+    path = write_csv([])
+    assert len(incremental.load_dataframe(path)) == 0
+    append_rows(path, make_rows(50, mothers_min=mothers_min))
+    loaded = incremental.load_dataframe(path)
+    assert_same_frame(loaded, fto_graph.load_dataframe(path))
+    assert loaded["Pregnant Mothers"].min() == adjusted_min
+    append_rows(path, make_rows(10, mothers_min=mothers_min))
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+
+
+def test_corrupt_cache_is_ignored(write_csv):
+    path = write_csv(make_rows(10))
+    with open(path + incremental.CACHE_SUFFIX, "wb") as cache_fh:
+        cache_fh.write(b"not a pickle")
+    assert_same_frame(incremental.load_dataframe(path),
+                      fto_graph.load_dataframe(path))
+
+
+def test_counts_are_uint32(write_csv):
+    frame = incremental.load_dataframe(write_csv(make_rows(5)))
+    assert list(frame.dtypes) == [np.dtype(np.uint32)] * 3
+
+
+def test_empty_csv_is_invalid(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("")
+    with pytest.raises(fto_graph.InvalidCSVError):
+        incremental.load_dataframe(str(path))
+
+
+def test_missing_csv(tmp_path):
+    with pytest.raises(fto_graph.CSVNotFoundError):
+        incremental.load_dataframe(str(tmp_path / "missing.csv"))
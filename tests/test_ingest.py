@@ -0,0 +1,97 @@
+"""Tests of the vectorized csv parser."""
+
+import numpy as np
+import pytest
+
+from fto import fto_graph
+from fto import ingest
+
+from conftest import HEADER, format_rows, make_rows
+
+
+pytestmark = pytest.mark.request("user-010")
+
+
+def test_matches_pandas_parser(write_csv):
+    path = write_csv(make_rows(500))
+    fast = ingest.read_csv(path)
+    slow = fto_graph.adjust_from_csv(fto_graph.read_csv_frame(path))
+    fast = fto_graph.adjust_pregnant_mothers(fast)
+    assert list(fast.columns) == list(slow.columns)
+    assert (fast.index == slow.index).all()
+    assert (fast.values == slow.values).all()
+    assert all(dtype == ingest.COUNT_DTYPE for dtype in fast.dtypes)
+
+
+def test_headerless_csv_uses_default_columns():
+    data = format_rows(make_rows(3), header=False).encode()
+    frame = ingest.parse_csv(data)
+    assert list(frame.columns) == ingest.DEFAULT_COLUMNS[1:]
+    assert len(frame) == 3
+
+
+def test_minute_and_second_resolution():
+    data = (HEADER + "02/15/16-08:30,1,2,3\n02/15/16-08:31:15,4,5,6\r\n"
+            ).encode()
+    frame = ingest.parse_csv(data)
+    assert list(frame.index.strftime("%Y-%m-%d %H:%M:%S")) == [
+        "2016-02-15 08:30:00", "2016-02-15 08:31:15"]
+    assert frame["Pregnant Mothers"].tolist() == [3, 6]
+
+
+def test_leap_day():
+    frame = ingest.parse_csv((HEADER + "02/29/16-23,1,2,3\n").encode())
+    assert frame.index[0].strftime("%Y-%m-%d %H") == "2016-02-29 23"
+
+
+@pytest.mark.parametrize("date", [
+    "13/01/16-00",  # month
+    "00/01/16-00",
+    "02/30/16-00",  # day beyond the month
+    "02/29/17-00",  # not a leap year
+    "04/31/16-00",
+    "01/00/16-00",
+    "01/01/16-24",  # hour
+    "01/01/16-23:60",  # minute
+    "01/01/16-23:59:60",  # second
+])
+def test_rejects_out_of_range_dates(date):
+    with pytest.raises(ingest.UnsupportedCSVError):
+        ingest.parse_csv((HEADER + "01/01/16-00,1,2,3\n%s,1,2,3\n" % date)
+                         .encode())
+
+
+def test_out_of_range_dates_fall_back_to_strict_parser(write_csv, tmp_path):
+    path = tmp_path / "invalid.csv"
+    path.write_text(HEADER + "02/30/16-00,1,2,3\n")
+    with pytest.raises(ValueError):
+        fto_graph.load_dataframe(str(path))
+
+
+@pytest.mark.parametrize("data", [
+    HEADER + "02/15/16-08,1,2\n",
+    HEADER + "02/15/16-08,1,2,3,4\n",
+    HEADER + "2016-02-15,1,2,3\n",
+    HEADER + "02/15/16-08,1,x,3\n",
+    HEADER,
+    "Date,Population,Birth Queue,Pregnant Mothers,Extra\n02/15/16-08,1,2,3,4\n",
+])
+def test_rejects_other_layouts(data):
+    with pytest.raises(ingest.UnsupportedCSVError):
+        ingest.parse_csv(data.encode())
+
+
+def test_counts_beyond_uint32_are_rejected():
+    with pytest.raises(ingest.UnsupportedCSVError):
+        ingest.parse_csv((HEADER + "02/15/16-08,%d,2,3\n" % (2 ** 32))
+                         .encode())
+
+
+def test_load_dataframe_uses_counts_in_file_order(write_csv):
+    rows = make_rows(5, mothers_min=1)
+    frame = fto_graph.load_dataframe(write_csv(rows))
+    assert frame["Population"].tolist() == [row[1] for row in rows]
+    assert frame["Birth Queue"].tolist() == [row[2] for row in rows]
+    # The off by one correction of the minimum of 1
+    assert frame["Pregnant Mothers"].tolist() == [row[3] - 1 for row in rows]
+    assert np.all(np.diff(frame.index.values).astype(np.int64) > 0)
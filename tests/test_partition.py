@@ -0,0 +1,140 @@
+"""Tests of the month partitioned store."""
+
+import os
+
+import numpy as np
+import pytest
+
+from fto import binstore
+from fto import fto_graph
+from fto import partition
+
+from conftest import make_rows
+
+
+pytestmark = pytest.mark.request("user-011")
+
+
+@pytest.fixture
+def store(write_csv, tmp_path):
+    """A store of 80 days of hourly rows from 2016-02-15."""
+    path = str(tmp_path / "store")
+    partition.csv_to_partitions(write_csv(make_rows(24 * 80)), path)
+    return path
+
+
+def test_one_partition_per_month(store):
+    assert sorted(name for name in os.listdir(store)
+                  if partition.PARTITION_PATTERN.match(name)) == [
+                      "2016-02.npz", "2016-03.npz", "2016-04.npz",
+                      "2016-05.npz"]
+
+
+def test_range_matches_csv(store, write_csv):
+    from_csv = fto_graph.load_dataframe(write_csv(make_rows(24 * 80)),
+                                        start="2016-03-10", end="2016-04-02")
+    from_store = partition.load_dataframe(store, "2016-03-10", "2016-04-02")
+    assert (from_store.index == from_csv.index).all()
+    assert (from_store.values == from_csv.values).all()
+    assert str(from_store.index[0]) == "2016-03-10 00:00:00"
+    assert str(from_store.index[-1]) == "2016-04-01 23:00:00"
+
+
+def test_only_overlapping_months_are_read(store, monkeypatch):
+    read = []
+    load = np.load
+    monkeypatch.setattr(np, "load",
+                        lambda path, *args, **kwargs:
+                        read.append(os.path.basename(path)) or
+                        load(path, *args, **kwargs))
+    partition.load_dataframe(store, "2016-03-10", "2016-03-20")
+    assert read == ["2016-03.npz"]
+
+
+def test_column_selection(store):
+    frame = partition.load_dataframe(store, columns=["Population"])
+    assert list(frame.columns) == ["Population"]
+    assert len(frame) == 24 * 80
+
+
+def test_writes_replace_rows_of_the_same_time(store):
+    time = partition.to_timestamp("2016-03-01 05:00")
+    partition.write_records(store, np.array(
+        [(time, 1, 2, 3), (time + 3600 * 24 * 365, 4, 5, 6)],
+        dtype=binstore.RECORD_DTYPE))
+    frame = partition.load_dataframe(store)
+    assert len(frame) == 24 * 80 + 1
+    assert frame.loc["2016-03-01 05:00"].tolist() == [1, 2, 3]
+    assert os.path.exists(os.path.join(store, "2017-03.npz"))
+
+
+def test_append_csv_line_creates_a_store(tmp_path):
+    path = str(tmp_path / "new") + os.sep
+    partition.append_csv_line(path, "02/15/16-08,311,152,3")
+    assert partition.is_partitioned_store(path)
+    assert partition.load_dataframe(path)["Population"].tolist() == [311]
+
+
+def test_only_stores_are_stores(store, tmp_path, write_csv):
+    assert partition.is_partitioned_store(store)
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "notes.txt").write_text("")
+    assert not partition.is_partitioned_store(str(other))
+    assert not partition.is_partitioned_store(write_csv(make_rows(2)))
+    with pytest.raises(fto_graph.CSVNotReadError):
+        fto_graph.load_dataframe(str(other))
+
+
+def test_correction_is_decided_by_the_whole_store(write_csv, tmp_path):
+    rows = make_rows(24 * 80, mothers_min=2)
+    # A single off by one count in the first month
+    rows[3] = rows[3][:3] + (1,)
+    source = write_csv(rows)
+    path = str(tmp_path / "store")
+    partition.csv_to_partitions(source, path)
+    from_csv = fto_graph.load_dataframe(source, start="2016-04-01")
+    from_store = fto_graph.load_dataframe(path, start="2016-04-01")
+    assert from_store["Pregnant Mothers"].min() == 1
+    assert (from_store.values == from_csv.values).all()
+
+
+def test_correction_of_stores_without_metadata(write_csv, tmp_path):
+    rows = make_rows(24 * 40, mothers_min=1)
+    path = str(tmp_path / "store")
+    partition.csv_to_partitions(write_csv(rows), path)
+    os.remove(os.path.join(path, partition.METADATA_NAME))
+    assert partition.pregnant_mothers_min(path) == 1
+    assert partition.read_metadata(path) == {"pregnant_mothers_min": 1}
+
+
+def test_csv_round_trip(store, write_csv, tmp_path):
+    output = str(tmp_path / "out.csv")
+    count = partition.partitions_to_csv(store, output, start="2016-03-01",
+                                        end="2016-03-02")
+    assert count == 24
+    assert open(output).read().splitlines()[1].startswith("03/01/16-00,")
+
+
+@pytest.mark.parametrize("kind", ["csv", "bin", "store"])
+def test_load_dataframe_columns(kind, write_csv, tmp_path):
+    source = write_csv(make_rows(24 * 40, mothers_min=1))
+    path = {"csv": source,
+            "bin": str(tmp_path / "fto.bin"),
+            "store": str(tmp_path / "store")}[kind]
+    if kind == "bin":
+        binstore.csv_to_binary(source, path)
+    elif kind == "store":
+        partition.csv_to_partitions(source, path)
+    full = fto_graph.load_dataframe(source, start="2016-03-01")
+    frame = fto_graph.load_dataframe(path, start="2016-03-01",
+                                     columns=["Pregnant Mothers",
+                                              "Population"])
+    assert list(frame.columns) == ["Pregnant Mothers", "Population"]
+    assert (frame.values == full[["Pregnant Mothers", "Population"]].values
+            ).all()
+    # Without Pregnant Mothers there is nothing to correct
+    frame = fto_graph.load_dataframe(path, columns=["Birth Queue"])
+    assert list(frame.columns) == ["Birth Queue"]
+    with pytest.raises(ValueError):
+        fto_graph.load_dataframe(path, columns=["Deaths"])
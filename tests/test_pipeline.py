@@ -0,0 +1,131 @@
+"""Tests of the single process pipeline."""
+
+import json
+import os
+import threading
+
+import pytest
+
+from fto import pipeline
+
+from conftest import make_rows
+
+
+pytestmark = pytest.mark.request("user-024")
+
+
+def statuses(results):
+    return [(result.name, result.status) for result in results]
+
+
+def test_stages_get_the_values_of_their_requirements():
+    results = pipeline.run_stages([
+        pipeline.Stage("a", lambda: 2),
+        pipeline.Stage("b", lambda: 3),
+        pipeline.Stage("c", lambda a, b: a * b, ("a", "b")),
+        pipeline.Stage("d", lambda c: c + 1, ("c",)),
+    ])
+    assert statuses(results) == [(name, pipeline.OK) for name in "abcd"]
+    assert [result.value for result in results] == [2, 3, 6, 7]
+
+
+def test_stages_run_after_their_requirements():
+    order = []
+    lock = threading.Lock()
+
+    def step(name):
+        def func(*_):
+            with lock:
+                order.append(name)
+        return func
+    pipeline.run_stages([
+        pipeline.Stage("scrape", step("scrape")),
+        pipeline.Stage("append", step("append"), ("scrape",)),
+        pipeline.Stage("import", step("import")),
+        pipeline.Stage("load", step("load"), ("append", "import")),
+        pipeline.Stage("stats", step("stats"), ("load",)),
+        pipeline.Stage("graph", step("graph"), ("load",)),
+    ])
+    for before, after in [("scrape", "append"), ("append", "load"),
+                          ("import", "load"), ("load", "stats"),
+                          ("load", "graph")]:
+        assert order.index(before) < order.index(after)
+
+
+def test_failures_skip_the_stages_which_need_them():
+    def fail():
+        raise RuntimeError("no connection")
+    results = pipeline.run_stages([
+        pipeline.Stage("scrape", fail),
+        pipeline.Stage("append", lambda line: line, ("scrape",)),
+        pipeline.Stage("window", lambda _: None, ("append",)),
+        pipeline.Stage("import", lambda: None),
+    ])
+    assert statuses(results) == [
+        ("scrape", pipeline.FAILED), ("append", pipeline.SKIPPED),
+        ("window", pipeline.SKIPPED), ("import", pipeline.OK)]
+    assert results[0].error == "RuntimeError: no connection"
+    assert results[1].error == "scrape did not succeed"
+
+
+def test_unknown_requirements():
+    with pytest.raises(pipeline.UnknownStageError):
+        pipeline.run_stages([
+            pipeline.Stage("load", lambda _: None, ("append",)),
+            pipeline.Stage("append", lambda: None),
+        ])
+
+
+def test_window_stage_only_for_csvs(tmp_path):
+    def names(output):
+        return [stage.name for stage in pipeline.stages(output)]
+    assert "window" in names(str(tmp_path / "fto-stats.csv"))
+    assert "window" not in names(str(tmp_path / "fto-stats.bin"))
+    assert "window" not in names(str(tmp_path / "store") + os.sep)
+    assert "load" not in names(str(tmp_path / "fto-stats.csv"))
+
+
+def test_run(write_csv, tmp_path, monkeypatch):
+    output_csv = write_csv(make_rows(24 * 40))
+    monkeypatch.setattr(pipeline, "scrape",
+                        lambda *args: "03/26/16-00,400,100,5")
+    stats_filename = str(tmp_path / "stats.json")
+    graph_filename = str(tmp_path / "graph.png")
+    results = pipeline.run(output_csv, windows=["7d"],
+                           graph_filename=graph_filename,
+                           stats_filename=stats_filename)
+    assert all(result.status == pipeline.OK for result in results)
+    assert open(output_csv).read().endswith("03/26/16-00,400,100,5\n")
+    assert os.path.getsize(graph_filename) > 0
+    assert os.path.exists(str(tmp_path / "fto-stats_7days.csv"))
+    records = json.load(open(stats_filename))
+    assert "Births per Day, Last 7 Days" in [
+        record["name"] for record in records]
+
+
+@pytest.mark.parametrize("options", [
+    {}, {"web_method": "lttb", "web_lean": True}, {"web_method": None}])
+def test_web_stage_gets_the_page_options(tmp_path, monkeypatch, options):
+    calls = []
+    monkeypatch.setattr(pipeline, "write_web_page",
+                        lambda *args: calls.append(args))
+    web_filename = str(tmp_path / "fto.html")
+    web, = [stage for stage in pipeline.stages(
+        str(tmp_path / "fto-stats.csv"), web_filename=web_filename,
+        **options) if stage.name == "web"]
+    web.func("frame")
+    assert calls == [("frame", web_filename,
+                      options.get("web_method", "minmax"),
+                      options.get("web_lean", False))]
+
+
+def test_statistics_without_data_are_null(write_csv, tmp_path):
+    from fto import fto_graph
+    output_csv = write_csv(make_rows(2))
+    stats_filename = str(tmp_path / "stats.json")
+    pipeline.write_stats(fto_graph.load_dataframe(output_csv),
+                         stats_filename, output_csv)
+    text = open(stats_filename).read()
+    assert "NaN" not in text
+    values = [record["value"] for record in json.loads(text)]
+    assert None in values
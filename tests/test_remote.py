@@ -0,0 +1,140 @@
+"""Tests of the conditional range downloads of csv urls."""
+
+import hashlib
+
+import pytest
+import requests
+
+from fto import remote
+
+
+pytestmark = pytest.mark.request("user-025")
+
+URL = "http://example.invalid/fto-stats.csv"
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError("%d" % self.status_code)
+
+
+class FakeSession(object):
+    """Answers like `python -m fto serve` for one growing file."""
+    def __init__(self, content, ranges=True):
+        self.content = content
+        self.ranges = ranges
+        self.requests = []
+        self.timeouts = []
+
+    @property
+    def etag(self):
+        return '"%s"' % hashlib.sha1(self.content).hexdigest()
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers)
+        self.timeouts.append(kwargs.get("timeout"))
+        validators = {"ETag": self.etag}
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304, headers=validators)
+        if self.ranges and "Range" in headers:
+            start = int(headers["Range"][len("bytes="):-1])
+            if start >= len(self.content):
+                return FakeResponse(416)
+            validators["Content-Range"] = "bytes %d-%d/%d" % (
+                start, len(self.content) - 1, len(self.content))
+            return FakeResponse(206, self.content[start:], validators)
+        return FakeResponse(200, self.content, validators)
+
+
+def test_tail_and_not_modified():
+    session = FakeSession(b"0123456789")
+    tail = remote.fetch_tail(URL, 4, session=session)
+    assert (tail.data, tail.from_start) == (b"456789", False)
+    tail = remote.fetch_tail(URL, 4, tail.etag, session)
+    assert tail.not_modified and tail.data == b""
+
+
+def test_range_beyond_the_end_downloads_everything():
+    session = FakeSession(b"0123")
+    tail = remote.fetch_tail(URL, 10, session=session)
+    assert (tail.data, tail.from_start) == (b"0123", True)
+    assert "Range" not in session.requests[-1]
+
+
+def test_ignored_range():
+    session = FakeSession(b"0123456789", ranges=False)
+    tail = remote.fetch_tail(URL, 4, session=session)
+    assert (tail.data, tail.from_start) == (b"0123456789", True)
+
+
+def test_requests_time_out():
+    session = FakeSession(b"0123456789")
+    remote.fetch_tail(URL, 4, session=session)
+    remote.fetch_tail(URL, 20, session=session, timeout=5)
+    assert session.timeouts == [remote.DEFAULT_TIMEOUT, 5, 5]
+
+
+@pytest.mark.parametrize("content_range", [None, "bytes 0-9/10", "junk"])
+def test_partial_response_from_elsewhere_downloads_everything(content_range):
+    class Misplaced(FakeSession):
+        def get(self, url, headers=None, **kwargs):
+            response = super(Misplaced, self).get(url, headers, **kwargs)
+            if response.status_code == 206:
+                del response.headers["Content-Range"]
+                if content_range is not None:
+                    response.headers["Content-Range"] = content_range
+            return response
+    session = Misplaced(b"0123456789")
+    tail = remote.fetch_tail(URL, 4, session=session)
+    assert (tail.data, tail.from_start) == (b"0123456789", True)
+    assert "Range" not in session.requests[-1]
+
+
+def test_read_keeps_a_bounded_number_of_copies(monkeypatch):
+    monkeypatch.setattr(remote, "_remote_files", type(remote._remote_files)())
+    session = FakeSession(b"0123")
+    urls = ["%s?%d" % (URL, number)
+            for number in range(remote.MAX_REMOTE_FILES + 5)]
+    for url in urls:
+        assert remote.read(url, session) == b"0123"
+    assert list(remote._remote_files) == urls[-remote.MAX_REMOTE_FILES:]
+    remote.read(urls[-remote.MAX_REMOTE_FILES], session)
+    assert list(remote._remote_files)[-1] == urls[-remote.MAX_REMOTE_FILES]
+
+
+def test_errors_raise():
+    class Failing(FakeSession):
+        def get(self, url, headers=None, **kwargs):
+            return FakeResponse(500)
+    with pytest.raises(requests.HTTPError):
+        remote.fetch_tail(URL, session=Failing(b""))
+
+
+def test_remote_file_downloads_only_appended_bytes():
+    content = b"".join(b"row %04d\n" % number for number in range(100))
+    session = FakeSession(content)
+    remote_file = remote.RemoteFile(URL)
+    assert remote_file.read(session) == content
+    assert remote_file.read(session) == content
+    assert "If-None-Match" in session.requests[-1]
+    session.content += b"row 0100\n"
+    assert remote_file.read(session) == session.content
+    assert session.requests[-1]["Range"] == "bytes=%d-" % (
+        len(content) - remote.ANCHOR_SIZE)
+
+
+def test_remote_file_notices_rewrites():
+    session = FakeSession(b"a" * 1000)
+    remote_file = remote.RemoteFile(URL)
+    remote_file.read(session)
+    session.content = b"b" * 2000
+    assert remote_file.read(session) == session.content
+    session.content = b"c" * 10
+    assert remote_file.read(session) == session.content
@@ -0,0 +1,46 @@
+"""Tests of the spans recorded while scraping."""
+
+import pytest
+
+from fto import metrics
+from fto import scrape_fto
+
+
+pytestmark = pytest.mark.request("user-023")
+
+URL = "http://example.invalid/"
+
+
+class FakeResponse(object):
+    status_code = 200
+    headers = {}
+    content = b"Population: 1,234"
+
+
+class FakeSession(object):
+    def get(self, url, headers=None, **kwargs):
+        return FakeResponse()
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.enable()
+    yield registry
+    metrics.disable()
+
+
+@pytest.mark.parametrize("cache", [None, scrape_fto.PageCache()])
+def test_extraction_has_its_own_span(registry, cache):
+    values = scrape_fto.fetch_values(
+        URL, scrape_fto.extract_population, FakeSession(), cache=cache)
+    assert values == "1,234"
+    assert registry.spans["scrape_fto.extract"].calls == 1
+    assert registry.spans["scrape_fto.request_page"].calls == 1
+
+
+def test_failed_extraction_is_recorded(registry):
+    def extract(content):
+        raise ValueError(content)
+    with pytest.raises(ValueError):
+        scrape_fto.fetch_values(URL, extract, FakeSession())
+    assert registry.spans["scrape_fto.extract"].errors == 1
@@ -0,0 +1,218 @@
+"""Tests of the artifact server."""
+
+import asyncio
+import gzip
+import time
+
+import pytest
+
+from fto import serve
+
+
+pytestmark = pytest.mark.request("user-025")
+
+CSV = ("Date,Population,Birth Queue,Pregnant Mothers\n" +
+       "".join("02/%02d/16-%02d,%d,150,3\n" % (day, hour, 300 + hour)
+               for day in range(1, 29) for hour in range(24))).encode()
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "fto-stats.csv").write_bytes(CSV)
+    (tmp_path / "small.json").write_bytes(b"[]")
+    (tmp_path / ".hidden.csv").write_bytes(b"secret")
+    (tmp_path / "fto-stats.csv.ftocache").write_bytes(b"private")
+    return serve.ArtifactServer(str(tmp_path))
+
+
+def request(server, target, method="GET", **headers):
+    response = asyncio.run(server.respond(
+        method, target,
+        dict((name.replace("_", "-").lower(), value)
+             for name, value in headers.items())))
+    return response.status, dict(response.headers), response.body
+
+
+def test_get(server):
+    status, headers, body = request(server, "/fto-stats.csv")
+    assert status == 200
+    assert body == CSV
+    assert headers["Content-Type"].startswith("text/csv")
+    assert headers["ETag"].startswith('"')
+    assert "Content-Encoding" not in headers
+
+
+def test_if_none_match(server):
+    _, headers, _ = request(server, "/fto-stats.csv")
+    status, not_modified, body = request(server, "/fto-stats.csv",
+                                         If_None_Match=headers["ETag"])
+    assert status == 304
+    assert body == b""
+    assert not_modified["ETag"] == headers["ETag"]
+    status, _, _ = request(server, "/fto-stats.csv",
+                           If_None_Match='"other"')
+    assert status == 200
+
+
+def test_changed_file_gets_a_new_etag(server, tmp_path):
+    _, headers, _ = request(server, "/fto-stats.csv")
+    with open(str(tmp_path / "fto-stats.csv"), "ab") as csv_fh:
+        csv_fh.write(b"03/01/16-00,1,2,3\n")
+    status, changed, body = request(server, "/fto-stats.csv",
+                                    If_None_Match=headers["ETag"])
+    assert status == 200
+    assert changed["ETag"] != headers["ETag"]
+    assert body.endswith(b"03/01/16-00,1,2,3\n")
+
+
+def test_if_modified_since(server):
+    _, headers, _ = request(server, "/fto-stats.csv")
+    status, _, _ = request(server, "/fto-stats.csv",
+                           If_Modified_Since=headers["Last-Modified"])
+    assert status == 304
+    status, _, _ = request(server, "/fto-stats.csv",
+                           If_Modified_Since="Mon, 01 Jan 2001 00:00:00 GMT")
+    assert status == 200
+
+
+def test_range(server):
+    status, headers, body = request(server, "/fto-stats.csv",
+                                    Range="bytes=100-")
+    assert status == 206
+    assert body == CSV[100:]
+    assert headers["Content-Range"] == "bytes 100-%d/%d" % (len(CSV) - 1,
+                                                            len(CSV))
+    status, headers, body = request(server, "/fto-stats.csv",
+                                    Range="bytes=-10")
+    assert status == 206 and body == CSV[-10:]
+    status, headers, body = request(server, "/fto-stats.csv",
+                                    Range="bytes=5-9")
+    assert status == 206 and body == CSV[5:10]
+
+
+def test_range_not_satisfiable(server):
+    status, headers, _ = request(server, "/fto-stats.csv",
+                                 Range="bytes=%d-" % len(CSV))
+    assert status == 416
+    assert headers["Content-Range"] == "bytes */%d" % len(CSV)
+
+
+def test_ignored_ranges(server):
+    for header in ("bytes=0-1,5-6", "lines=1-2", "bytes=x-"):
+        status, _, body = request(server, "/fto-stats.csv", Range=header)
+        assert status == 200 and body == CSV
+
+
+def test_if_range(server):
+    _, headers, _ = request(server, "/fto-stats.csv")
+    status, _, body = request(server, "/fto-stats.csv", Range="bytes=100-",
+                              If_Range=headers["ETag"])
+    assert status == 206 and body == CSV[100:]
+    status, _, body = request(server, "/fto-stats.csv", Range="bytes=100-",
+                              If_Range='"stale"')
+    assert status == 200 and body == CSV
+
+
+def test_gzip(server):
+    status, headers, body = request(server, "/fto-stats.csv",
+                                    Accept_Encoding="gzip, deflate")
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == CSV
+    _, identity, _ = request(server, "/fto-stats.csv")
+    assert headers["ETag"] != identity["ETag"]
+
+
+def test_not_modified_names_the_matched_encoding(server):
+    _, gzipped, _ = request(server, "/fto-stats.csv", Accept_Encoding="gzip")
+    status, headers, _ = request(server, "/fto-stats.csv",
+                                 Accept_Encoding="gzip",
+                                 If_None_Match='"other", ' + gzipped["ETag"])
+    assert status == 304
+    assert headers["ETag"] == gzipped["ETag"]
+    status, headers, _ = request(server, "/fto-stats.csv",
+                                 Accept_Encoding="gzip", If_None_Match="*")
+    assert status == 304
+    assert headers["ETag"] == gzipped["ETag"]
+
+
+def test_not_modified_since_names_the_encoding_sent(server):
+    _, gzipped, _ = request(server, "/fto-stats.csv", Accept_Encoding="gzip")
+    status, headers, _ = request(server, "/fto-stats.csv",
+                                 Accept_Encoding="gzip",
+                                 If_Modified_Since=gzipped["Last-Modified"])
+    assert status == 304
+    assert headers["ETag"] == gzipped["ETag"]
+
+
+@pytest.mark.parametrize("text", [
+    "Sun, 06 Nov 1994 08:49:37 GMT",
+    "Sun, 06 Nov 1994 08:49:37 -0000",
+    "Sunday, 06-Nov-94 08:49:37 GMT",
+    "Sun Nov  6 08:49:37 1994",
+])
+def test_http_dates_are_utc(text, monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    if hasattr(time, "tzset"):
+        time.tzset()
+    try:
+        assert serve.parse_http_date(text) == 784111777
+    finally:
+        monkeypatch.undo()
+        if hasattr(time, "tzset"):
+            time.tzset()
+
+
+def test_small_files_are_not_compressed(server):
+    _, headers, body = request(server, "/small.json", Accept_Encoding="gzip")
+    assert "Content-Encoding" not in headers
+    assert body == b"[]"
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", serve.ENCODINGS[0]),
+    ("gzip;q=0.5, br;q=0", "gzip"),
+])
+def test_choose_encoding(header, encoding):
+    assert serve.choose_encoding(header) == encoding
+
+
+@pytest.mark.parametrize("target", [
+    "/.hidden.csv", "/fto-stats.csv.ftocache", "/../etc/passwd.csv",
+    "/%2e%2e/fto-stats.csv", "/missing.csv", "/"])
+def test_not_served(server, target):
+    assert request(server, target)[0] == 404
+
+
+def test_methods(server):
+    assert request(server, "/fto-stats.csv", method="POST")[0] == 405
+    status, _, _ = request(server, "/fto-stats.csv", method="HEAD")
+    assert status == 200
+
+
+def test_connection(server):
+    async def exchange():
+        listener = await asyncio.start_server(server.handle_connection,
+                                              "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /small.json HTTP/1.1\r\nHost: x\r\n\r\n"
+                     b"HEAD /small.json HTTP/1.1\r\nHost: x\r\n"
+                     b"Connection: close\r\n\r\n")
+        data = await reader.read()
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return data
+    data = asyncio.run(exchange())
+    first, second = data.split(b"HTTP/1.1 ")[1:]
+    assert first.startswith(b"200 OK")
+    assert first.endswith(b"\r\n\r\n[]")
+    assert b"Connection: keep-alive" in first
+    assert second.startswith(b"200 OK")
+    assert second.endswith(b"\r\n\r\n")
+    assert b"Connection: close" in second
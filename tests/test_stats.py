@@ -0,0 +1,191 @@
+"""Tests of the statistics."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fto import fto_graph
+from fto import stats
+
+from conftest import make_rows
+
+
+def load(write_csv, rows):
+    return fto_graph.load_dataframe(write_csv(rows))
+
+
+def manual_monthly(fto_df):
+    """The monthly counts computed row by row."""
+    population = fto_df["Population"].values.astype(np.int64)
+    mothers = fto_df["Pregnant Mothers"].values.astype(np.int64)
+    months = fto_df.index.to_period("M")
+    counts = {}
+    for number in range(1, len(fto_df)):
+        births = max(population[number] - population[number - 1], 0)
+        deaths = max(population[number - 1] - population[number], 0)
+        pregnancies = max(mothers[number] - mothers[number - 1], 0)
+        totals = counts.setdefault(months[number], [0, 0, 0])
+        totals[0] += births
+        totals[1] += deaths
+        totals[2] += pregnancies
+    del counts[months[0]]
+    return counts
+
+
+@pytest.mark.request("user-018")
+def test_monthly_counts(write_csv):
+    fto_df = load(write_csv, make_rows(24 * 100))
+    monthly = stats.generate_monthly_dataframe(fto_df)
+    expected = manual_monthly(fto_df)
+    assert monthly["Month"].tolist() == [
+        period.strftime("%B %Y") for period in sorted(expected)]
+    assert monthly[["Births", "Deaths", "Pregnancies"]].values.tolist() == [
+        expected[period] for period in sorted(expected)]
+
+
+@pytest.mark.request("user-018")
+def test_saved_state_matches_a_full_pass(write_csv, tmp_path):
+    rows = make_rows(24 * 100)
+    state_path = str(tmp_path / "fto.ftostats")
+    stats.accumulate(load(write_csv, rows[:1000]), state_path)
+    full = load(write_csv, rows)
+    resumed = stats.average_stats(full, state_path=state_path)
+    fresh = stats.average_stats(full)
+    assert [record.name for record in resumed] == [
+        record.name for record in fresh]
+    np.testing.assert_allclose([record.value for record in resumed],
+                               [record.value for record in fresh])
+    assert (stats.generate_monthly_dataframe(full, state_path).values ==
+            stats.generate_monthly_dataframe(full).values).all()
+
+
+@pytest.mark.request("user-018")
+def test_statistics_without_complete_months_are_nan(write_csv):
+    records = stats.average_stats(load(write_csv, make_rows(3)))
+    assert all(np.isnan(record.value) for record in records)
+
+
+@pytest.mark.request("user-019")
+def test_daily_rollup_matches_row_by_row_sums(write_csv):
+    fto_df = load(write_csv, make_rows(24 * 10))
+    daily = stats.rollup(fto_df, "D")
+    deltas = fto_df["Population"].astype(np.int64).diff().fillna(0)
+    births = deltas.clip(lower=0).groupby(fto_df.index.floor("D")).sum()
+    # The first day is only partly sampled
+    assert daily.index.tolist() == births.index[1:].tolist()
+    assert daily["Births"].tolist() == births.iloc[1:].tolist()
+    assert daily["Period"].iloc[0] == "February 16 2016"
+
+
+@pytest.mark.request("user-019")
+def test_monthly_rollup_matches_monthly_dataframe(write_csv):
+    fto_df = load(write_csv, make_rows(24 * 100))
+    monthly = stats.rollup(fto_df, "MS")
+    expected = stats.generate_monthly_dataframe(fto_df)
+    assert monthly["Period"].tolist() == expected["Month"].tolist()
+    assert (monthly[stats.ROLLUP_COLUMNS].values ==
+            expected[stats.ROLLUP_COLUMNS].values).all()
+
+
+@pytest.mark.request("user-019")
+def test_rollup_of_empty_periods(write_csv):
+    fto_df = load(write_csv, make_rows(3, step=30))
+    daily = stats.rollup(fto_df, "D", drop_partial=False)
+    assert len(daily) == 3
+    assert daily["Births"].iloc[1] == 0
+
+
+@pytest.mark.request("user-020")
+def test_rolling_windows_of_a_constant_birth_rate():
+    index = pd.date_range("2016-01-01", periods=24 * 100, freq="h")
+    # Two births a day, one pregnancy every other day
+    fto_df = pd.DataFrame({
+        "Population": 1000 + np.arange(len(index)) // 12,
+        "Birth Queue": np.full(len(index), 60),
+        "Pregnant Mothers": np.arange(len(index)) // 48,
+    }, index=index)
+    records = dict((record.name, record.value)
+                   for record in stats.rolling_stats(fto_df))
+    assert records["Births per Day, Last 7 Days"] == pytest.approx(2)
+    assert records["Births per Day, Last 90 Days"] == pytest.approx(2)
+    assert records["Babies per Pregnancy, Last 30 Days"] == pytest.approx(4)
+    assert records["Projected Birth Queue Time Entering Now, Last 7 Days"] \
+        == pytest.approx(30)
+
+
+@pytest.mark.request("user-020")
+def test_rolling_state_matches_a_full_pass(write_csv, tmp_path):
+    rows = make_rows(24 * 120)
+    state_path = str(tmp_path / "fto.ftorolling")
+    for stop in (500, 2000, len(rows)):
+        resumed = stats.rolling_stats(load(write_csv, rows[:stop]),
+                                      state_path=state_path)
+    fresh = stats.rolling_stats(load(write_csv, rows))
+    np.testing.assert_allclose([record.value for record in resumed],
+                               [record.value for record in fresh])
+
+
+@pytest.mark.request("user-020")
+def test_short_history_covers_part_of_the_window():
+    index = pd.date_range("2016-01-01", periods=24 * 3 + 1, freq="h")
+    fto_df = pd.DataFrame({
+        "Population": 1000 + np.arange(len(index)) // 6,
+        "Birth Queue": np.full(len(index), 10),
+        "Pregnant Mothers": np.zeros(len(index), dtype=int),
+    }, index=index)
+    records = dict((record.name, record.value)
+                   for record in stats.rolling_stats(fto_df, windows=(30,)))
+    assert records["Births per Day, Last 30 Days"] == pytest.approx(4)
+    assert np.isnan(records["Babies per Pregnancy, Last 30 Days"])
+
+
+@pytest.mark.request("user-018")
+def test_monthly_df_is_deprecated(write_csv):
+    fto_df = load(write_csv, make_rows(24 * 40))
+    monthly = stats.generate_monthly_dataframe(fto_df)
+    with pytest.warns(DeprecationWarning):
+        records = stats.average_stats(fto_df, monthly)
+    assert records == stats.average_stats(fto_df)
+
+
+@pytest.mark.request("user-018")
+def test_process_state_only_folds_new_rows(write_csv, monkeypatch):
+    monkeypatch.setattr(stats, "_process_states", {})
+    folded = []
+    new_samples = stats.new_samples
+
+    def recording_new_samples(fto_df, last=None):
+        samples = new_samples(fto_df, last)
+        folded.append(0 if samples is None else len(samples['time']))
+        return samples
+    monkeypatch.setattr(stats, "new_samples", recording_new_samples)
+    rows = make_rows(24 * 40)
+    stats.generate_monthly_dataframe(load(write_csv, rows[:500]))
+    full = load(write_csv, rows)
+    resumed = stats.average_stats(full)
+    assert folded == [500, len(rows) - 500]
+    monkeypatch.setattr(stats, "_process_states", {})
+    assert resumed == stats.average_stats(full)
+
+
+@pytest.mark.request("user-018")
+@pytest.mark.parametrize("change", ["truncate", "rewrite", "drop"])
+def test_state_of_another_history_is_recomputed(write_csv, tmp_path, change):
+    rows = make_rows(24 * 100)
+    state_path = str(tmp_path / "fto.ftostats")
+    stats.accumulate(load(write_csv, rows), state_path)
+    if change == "truncate":
+        rows = rows[:1000]
+    elif change == "rewrite":
+        rows = make_rows(24 * 100, seed=1)
+    else:
+        rows = rows[:1000] + rows[1001:]
+    fto_df = load(write_csv, rows)
+    fresh = stats.StatsAccumulator()
+    fresh.update(fto_df)
+    assert (stats.generate_monthly_dataframe(fto_df, state_path).values ==
+            fresh.monthly_dataframe().values).all()
+    np.testing.assert_allclose(
+        [record.value for record in stats.average_stats(
+            fto_df, state_path=state_path)],
+        [record.value for record in fresh.average_stats()])
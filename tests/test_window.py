@@ -0,0 +1,81 @@
+"""Tests of the window csv writer."""
+
+import calendar
+
+import pytest
+
+from fto import window
+
+from conftest import HEADER, format_rows, make_rows
+
+
+pytestmark = pytest.mark.request("user-009")
+
+# 2016-03-10 12:00 UTC, within the rows of make_rows(24 * 60)
+NOW = calendar.timegm((2016, 3, 10, 12, 0, 0))
+
+
+def rows_from(rows, start):
+    return [row for row in rows if calendar.timegm(row[0].timetuple()) >= start]
+
+
+def test_windows_hold_the_rows_after_their_start(write_csv, tmp_path):
+    rows = make_rows(24 * 60)
+    source = write_csv(rows)
+    outputs = [(spec, str(tmp_path / ("%s.csv" % spec)))
+               for spec in ("12h", "7d", "1m", "1y")]
+    counts = window.write_windows(source, outputs, now=NOW)
+    for spec, path in outputs:
+        expected = rows_from(rows, window.window_start(spec, NOW))
+        assert open(path).read() == format_rows(expected)
+        assert counts[path] == len(expected)
+
+
+def test_month_windows_start_at_the_first_of_a_month():
+    assert window.window_start("1m", NOW) == calendar.timegm(
+        (2016, 3, 1, 0, 0, 0))
+    assert window.window_start("6m", NOW) == calendar.timegm(
+        (2015, 10, 1, 0, 0, 0))
+    assert window.window_start("1y", NOW) == calendar.timegm(
+        (2015, 4, 1, 0, 0, 0))
+    assert window.window_start("7d", NOW) == NOW - 7 * 86400
+
+
+def test_window_after_the_last_row_is_empty(write_csv, tmp_path):
+    source = write_csv(make_rows(10))
+    output = str(tmp_path / "out.csv")
+    counts = window.write_windows(source, [("1h", output)], now=NOW)
+    assert counts[output] == 0
+    assert open(output).read() == HEADER
+
+
+def test_window_before_the_first_row_is_everything(write_csv, tmp_path):
+    source = write_csv(make_rows(10))
+    output = str(tmp_path / "out.csv")
+    window.write_windows(source, [("5y", output)], now=NOW)
+    assert open(output).read() == open(source).read()
+
+
+def test_default_window_path():
+    assert (window.default_window_path("/www/fto-stats.csv", "6m") ==
+            "/www/fto-stats_6months.csv")
+    assert (window.default_window_path("/www/fto-stats.csv", "1d") ==
+            "/www/fto-stats_1day.csv")
+
+
+@pytest.mark.parametrize("spec", ["", "6", "m", "6w", "-1d", "1.5d"])
+def test_invalid_windows(spec):
+    with pytest.raises(window.InvalidWindowError):
+        window.parse_window(spec)
+
+
+def test_window_bounds_of_periods():
+    assert window.window_bounds("all") == (None, None)
+    assert window.window_bounds("2017") == (
+        calendar.timegm((2017, 1, 1, 0, 0, 0)),
+        calendar.timegm((2018, 1, 1, 0, 0, 0)))
+    assert window.window_bounds("2017-12") == (
+        calendar.timegm((2017, 12, 1, 0, 0, 0)),
+        calendar.timegm((2018, 1, 1, 0, 0, 0)))
+    with pytest.raises(window.InvalidWindowError):
+        window.window_bounds("2017-13")
@@ -0,0 +1,62 @@
+"""Tests of the pyramid levels and the zoom data endpoint."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fto import pyramid
+from fto import zoom
+
+from conftest import make_rows
+
+
+pytestmark = pytest.mark.request("user-016")
+
+
+@pytest.fixture(scope="module")
+def levels():
+    rows = make_rows(24 * 400)
+    fto_df = pd.DataFrame(
+        [row[1:] for row in rows], columns=pyramid.COLUMNS,
+        index=pd.DatetimeIndex([row[0] for row in rows], name="Date"))
+    return pyramid.Pyramid.from_dataframe(fto_df)
+
+
+@pytest.fixture
+def server(levels):
+    server = zoom.ZoomServer(("127.0.0.1", 0), levels)
+    yield server
+    server.server_close()
+
+
+def test_data_has_the_envelope_of_each_column(server):
+    data = server.data({"pixels": ["100"]})
+    assert sorted(data) == sorted(["Date"] + pyramid.STAT_COLUMNS)
+    for column in pyramid.COLUMNS:
+        low = np.array(data[pyramid.stat_column(column, "min")])
+        high = np.array(data[pyramid.stat_column(column, "max")])
+        mean = np.array(data[column])
+        assert len(low) == len(high) == len(mean) == len(data["Date"])
+        assert (low <= mean).all() and (mean <= high).all()
+
+
+def test_downsampled_level_keeps_the_extremes(levels):
+    name, rows = levels.query(pixels=10)
+    coarsest = levels.levels[name]
+    assert len(rows) < len(coarsest)
+    for column in pyramid.COLUMNS:
+        low = pyramid.stat_column(column, "min")
+        high = pyramid.stat_column(column, "max")
+        assert rows[low].min() == coarsest[low].min()
+        assert rows[high].max() == coarsest[high].max()
+
+
+@pytest.mark.parametrize("pixels", ["-5", "0", "nan", "inf"])
+def test_invalid_pixels_are_rejected(server, pixels):
+    with pytest.raises(ValueError):
+        server.data({"pixels": [pixels]})
+
+
+def test_pixels_are_capped(server):
+    data = server.data({"pixels": [str(10 * zoom.MAX_PIXELS)]})
+    assert len(data["Date"]) <= zoom.MAX_PIXELS